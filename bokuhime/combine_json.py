@@ -1,109 +1,117 @@
 import os
 import re
+import sys
 import json
+import time
+import hashlib
 import argparse
-import textwrap
-
-# Regex for original Japanese MSG blocks (with \r\n and indentation)
-MSG_JP_RX = re.compile(
-    r'(?P<prefix>\s*--\s*)?MSG\(\[\[\\r\\n'
-    r'(?P<body>.*?)'
-    r'\\r\\n\s*(?:(?P=prefix))?\]\]\)',
-    re.DOTALL
-)
-# Regex for translated MSG blocks (no enforced \r\n or indentation)
-MSG_EN_RX = re.compile(
-    r'MSG\(\[\[(.*?)\]\]\)', re.DOTALL
-)
-
-def extract_msg_blocks_jp(text):
-    return [m for m in MSG_JP_RX.finditer(text)]
-
-def extract_msg_blocks_en(text):
-    return [m for m in MSG_EN_RX.finditer(text)]
+from typing import NamedTuple
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))  # project root, for `common`
+from common.luascan import scan, split_speaker_note  # type: ignore
+from common.splice import splice  # type: ignore
+from bokuhime.wordwrap import count_lines  # type: ignore
+
+def combine_block(orig, trans_body):
+    r"""Bilingual body for one MSG block: English line(s), then the Japanese.
+
+    *orig* is the original :class:`MsgBlock`, *trans_body* its translation.
+    The speaker header goes on its own line without the pose label, even
+    when the translation carries the original one (restored by ``expand``):
+
+    >>> orig = scan("MSG([[\r\n【エリカ】真剣\r\n「待っててね……姉さん」\r\n]])")[0]
+    >>> combine_block(orig, "\r\n【Erika】真剣\r\n “Wait for me... Sister.”\r\n")
+    '\r\n【Erika】\r\n“Wait for me... Sister.”\r\n「待っててね……姉さん」'
+    """
+    o_content = orig.body
+    t_content = trans_body.strip()
+
+    # Collapse extra newlines.
+    t_content = re.sub(r'\r\n+', '\r\n', t_content).strip()
+    o_content = re.sub(r'\r\n+', '\r\n', o_content).strip()
+
+    # Get the indentation from the original.
+    match = re.match(r'^(\s*)', o_content)
+    indent = match.group(1) if match else ''
+
+    # Process English: collapse all whitespace so that it becomes one continuous line.
+    english_line = " ".join(t_content.split())
+    # Drop the speaker's pose label ("【Erika】真剣 …"): it's an author note
+    # that belongs to the header line, which is moved out of the English.
+    speaker = orig.speaker
+    note = split_speaker_note(speaker)[1].strip() if speaker is not None else ""
+    if note:
+        english_line = re.sub(r'^(【.*?】)\s*' + re.escape(note) + r'\s*', r'\1', english_line, count=1)
+    # Measure how many lines it occupies with the game's own WordWrap (the
+    # leading 【...】 goes to the name plate, not the message box).
+    en_line_count = count_lines(re.sub(r'^【.*?】', '', english_line, count=1))
+
+    # Process Japanese: split into nonblank lines.
+    raw_jp_lines = [line for line in o_content.splitlines() if line.strip()]
+    jp_lines = []
+    if raw_jp_lines:
+        # Check if the first non-blank line is the speaker header 【...】
+        if speaker is not None and raw_jp_lines[0].strip() == speaker.text.strip():
+            # If it does, exclude this line
+            jp_lines = raw_jp_lines[1:]
+        else:
+            jp_lines = raw_jp_lines
+    # If raw_jp_lines was empty, jp_lines remains empty.
+    
+    jp_line_count = len(jp_lines)
+
+    # If the total measured lines exceed 4 and Japanese has more than one line,
+    # or if jp_lines is empty, collapse Japanese lines or set to empty.
+    if not jp_lines:
+        jp_block = ""
+    elif (en_line_count + jp_line_count > 4) and (jp_line_count > 1):
+        jp_block = indent + " ".join(line.strip() for line in jp_lines)
+    else:
+        # Lines in jp_lines are from o_content.splitlines() (o_content was stripped),
+        # so they already have their correct relative indentation.
+        jp_block = "\r\n".join(jp_lines)
+
+    # Do not insert newlines in the English translation output.
+    en_block = indent + english_line
+
+    # Adjust English: wrap the first 【...】 with \r\n around it.
+    en_block = re.sub(r'^( *)(【.*?】)', r'\1\r\n\2\r\n', en_block, count=1)
+    # Adjust Japanese: The removal of 【...】 lines is now handled above by filtering jp_lines.
+    # jp_block = re.sub(r'^( *)【.*?】', r'\1', jp_block, count=1) # This line is removed.
+
+    # Combine the two parts with exactly one newline between.
+    if en_block and jp_block:
+        combined = en_block.rstrip() + '\r\n' + jp_block.lstrip()
+    else:
+        combined = en_block or jp_block
+
+    return combined
+
 
 def combine_msgs(orig_text, trans_text):
-    orig_blocks = extract_msg_blocks_jp(orig_text)
-    trans_blocks = extract_msg_blocks_en(trans_text)
-    if not orig_blocks:
-        orig_blocks = extract_msg_blocks_en(orig_text)
-    if not trans_blocks:
-        trans_blocks = extract_msg_blocks_en(trans_text)
+    orig_blocks = scan(orig_text)
+    trans_blocks = scan(trans_text)
     if len(orig_blocks) != len(trans_blocks):
         raise ValueError(f"MSG block count mismatch: {len(orig_blocks)} original vs {len(trans_blocks)} translated.")
+    return splice(orig_text, ((orig.span, combine_block(orig, trans.body)) for orig, trans in zip(orig_blocks, trans_blocks)))
 
-    new_text = orig_text
-    offset = 0
-    for orig, trans in zip(orig_blocks, trans_blocks):
-        try:
-            o_start, o_end = orig.span('body')
-            o_content = orig.group('body')
-        except IndexError:
-            o_start, o_end = orig.span(1)
-            o_content = orig.group(1)
-        t_content = trans.group(1).strip()
-
-        # Collapse extra newlines.
-        t_content = re.sub(r'\r\n+', '\r\n', t_content).strip()
-        o_content = re.sub(r'\r\n+', '\r\n', o_content).strip()
-
-        # Get the indentation from the original.
-        match = re.match(r'^(\s*)', o_content)
-        indent = match.group(1) if match else ''
-
-        # Process English: collapse all whitespace so that it becomes one continuous line.
-        english_line = " ".join(t_content.split())
-        # Use textwrap to measure how many lines it would occupy at 70 characters.
-        en_wrapped = textwrap.wrap(english_line, width=70)
-        en_line_count = len(en_wrapped)
-
-        # Process Japanese: split into nonblank lines.
-        raw_jp_lines = [line for line in o_content.splitlines() if line.strip()]
-        jp_lines = []
-        if raw_jp_lines:
-            # Check if the first non-blank line (stripped) starts with 【...】
-            first_line_stripped_content = raw_jp_lines[0].strip()
-            if re.match(r'^【.*?】', first_line_stripped_content):
-                # If it does, exclude this line
-                jp_lines = raw_jp_lines[1:]
-            else:
-                jp_lines = raw_jp_lines
-        # If raw_jp_lines was empty, jp_lines remains empty.
-        
-        jp_line_count = len(jp_lines)
-
-        # If the total measured lines exceed 4 and Japanese has more than one line,
-        # or if jp_lines is empty, collapse Japanese lines or set to empty.
-        if not jp_lines:
-            jp_block = ""
-        elif (en_line_count + jp_line_count > 4) and (jp_line_count > 1):
-            jp_block = indent + " ".join(line.strip() for line in jp_lines)
-        else:
-            # Lines in jp_lines are from o_content.splitlines() (o_content was stripped),
-            # so they already have their correct relative indentation.
-            jp_block = "\r\n".join(jp_lines)
-
-        # Do not insert newlines in the English translation output.
-        en_block = indent + english_line
+class CombineReport(NamedTuple):
+    """Outcome of combining one Export/Translated pair."""
+    name: str
+    status: str          # "combined" | "skipped" | "error"
+    blocks: int = 0
+    seconds: float = 0.0
+    error: str = ""
 
-        # Adjust English: wrap the first 【...】 with \r\n around it.
-        en_block = re.sub(r'^( *)(【.*?】)', r'\1\r\n\2\r\n', en_block, count=1)
-        # Adjust Japanese: The removal of 【...】 lines is now handled above by filtering jp_lines.
-        # jp_block = re.sub(r'^( *)【.*?】', r'\1', jp_block, count=1) # This line is removed.
 
-        # Combine the two parts with exactly one newline between.
-        if en_block and jp_block:
-            combined = en_block.rstrip() + '\r\n' + jp_block.lstrip()
-        else:
-            combined = en_block or jp_block
+# per output dir: code version + name → input stamps (no .json suffix, so
+# tools that glob *.json in Combined/ skip it)
+STATE_FILE = ".combine_state"
 
-        new_o_start = o_start + offset
-        new_o_end = o_end + offset
-        new_text = new_text[:new_o_start] + combined + new_text[new_o_end:]
-        offset += len(combined) - (o_end - o_start)
-    return new_text
 
 def combine_json(orig_path, trans_path, out_path):
+    """Combine one file pair; returns the number of MSG blocks written."""
     with open(orig_path, encoding="utf-8") as f:
         orig = json.load(f)
     with open(trans_path, encoding="utf-8") as f:
@@ -115,7 +123,100 @@ def combine_json(orig_path, trans_path, out_path):
     out["Text"] = combined_text
     with open(out_path, "w", encoding="utf-8") as f:
         json.dump(out, f, ensure_ascii=False, indent=2)
-    print(f"Combined: {out_path}")
+    return combined_text.count("MSG([[")
+
+
+def _stamp(path):
+    st = os.stat(path)
+    return [st.st_mtime_ns, st.st_size]
+
+
+def _code_version():
+    """Hash of the modules that shape the output (this one, the scanner,
+    splice and WordWrap), so changing any of them recombines every pair."""
+    h = hashlib.sha256()
+    for fn in (combine_block, scan, splice, count_lines):
+        with open(sys.modules[fn.__module__].__file__, "rb") as f:
+            h.update(f.read())
+    return h.hexdigest()[:16]
+
+
+def _combine_pair(job):
+    """Process‑pool worker: ``(name, orig, trans, out)`` → CombineReport."""
+    name, orig_path, trans_path, out_path = job
+    t0 = time.perf_counter()
+    try:
+        n = combine_json(orig_path, trans_path, out_path)
+    except Exception as exc:  # reported, not raised – one bad file must not stop the rest
+        return CombineReport(name, "error", seconds=time.perf_counter() - t0, error=f"{type(exc).__name__}: {exc}")
+    return CombineReport(name, "combined", n, time.perf_counter() - t0)
+
+
+def combine_all(orig_dir, trans_dir, out_dir, *, workers=None, force=False):
+    """Combine every ``*.json`` present in both *orig_dir* and *trans_dir*.
+
+    Pairs whose inputs (mtime + size) and combining code are unchanged since
+    the last run and whose output still exists are skipped unless *force*
+    is set.  The rest
+    are spread over a process pool of *workers* processes (``1`` runs
+    in‑process).  Returns one :class:`CombineReport` per pair, sorted by name.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    state_path = os.path.join(out_dir, STATE_FILE)
+    version = _code_version()
+    try:
+        with open(state_path, encoding="utf-8") as f:
+            saved = json.load(f)
+    except (OSError, ValueError):
+        saved = {}
+    state = saved.get("files", {}) if saved.get("version") == version else {}
+
+    reports, jobs, stamps = [], [], {}
+    for fn in sorted(os.listdir(orig_dir)):
+        if not fn.lower().endswith(".json"):
+            continue
+        orig_path = os.path.join(orig_dir, fn)
+        trans_path = os.path.join(trans_dir, fn)
+        out_path = os.path.join(out_dir, fn)
+        if not (os.path.isfile(orig_path) and os.path.isfile(trans_path)):
+            continue
+        stamps[fn] = _stamp(orig_path) + _stamp(trans_path)
+        if not force and state.get(fn) == stamps[fn] and os.path.isfile(out_path):
+            reports.append(CombineReport(fn, "skipped"))
+            continue
+        jobs.append((fn, orig_path, trans_path, out_path))
+
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(jobs) < 2:
+        done = [_combine_pair(job) for job in jobs]
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+
+        with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as pool:
+            done = list(pool.map(_combine_pair, jobs, chunksize=max(1, len(jobs) // (workers * 4))))
+
+    for rep in done:
+        if rep.status == "combined":
+            state[rep.name] = stamps[rep.name]
+        else:
+            state.pop(rep.name, None)
+    tmp = state_path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"version": version, "files": state}, f, indent=1, sort_keys=True)
+    os.replace(tmp, state_path)
+    return sorted(reports + done)
+
+
+def print_reports(reports, *, verbose=False):
+    """Failures (and with *verbose* every combined file), then a one‑line summary."""
+    for rep in reports:
+        if rep.status == "combined" and verbose:
+            print(f"Combined: {rep.name} ({rep.blocks} blocks, {rep.seconds * 1000:.0f} ms)")
+        elif rep.status == "error":
+            print(f"Failed:   {rep.name} – {rep.error}")
+    counts = {s: sum(r.status == s for r in reports) for s in ("combined", "skipped", "error")}
+    print(f"{counts['combined']} combined, {counts['skipped']} unchanged, {counts['error']} failed")
+
 
 def main():
     parser = argparse.ArgumentParser()
@@ -123,18 +224,15 @@ def main():
     parser.add_argument("--trans", help="Translated JSON file or directory")
     parser.add_argument("--out", help="Output file or directory")
     parser.add_argument("--all", action="store_true", help="Process all files in directory")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes for --all (default: CPU count)")
+    parser.add_argument("--force", action="store_true", help="Recombine pairs whose inputs are unchanged")
     args = parser.parse_args()
 
     if args.all:
-        for fn in os.listdir(args.orig):
-            if fn.lower().endswith(".json"):
-                orig_path = os.path.join(args.orig, fn)
-                trans_path = os.path.join(args.trans, fn)
-                out_path = os.path.join(args.out, fn)
-                if os.path.isfile(orig_path) and os.path.isfile(trans_path):
-                    combine_json(orig_path, trans_path, out_path)
+        print_reports(combine_all(args.orig, args.trans, args.out, workers=args.workers, force=args.force), verbose=True)
     else:
-        combine_json(args.orig, args.trans, args.out)
+        n = combine_json(args.orig, args.trans, args.out)
+        print(f"Combined: {args.out} ({n} blocks)")
 
 if __name__ == "__main__":
     main()
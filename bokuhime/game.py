@@ -1,15 +1,54 @@
-import os, json, re, asyncio, logging
-from typing import List, Tuple
+import os, json, re, logging, hashlib
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Tuple
 
 # Import utility helpers from the shared `common` package
 from common.io import read_file, write_file  # type: ignore
-from common.gpt import translate_blocks_async  # type: ignore
+from common.compact import Compacted, check_markup, compact, expand, savings  # type: ignore
+from common.glossary import Glossary, name_aliases, parse_glossary, parse_people  # type: ignore
+from common.journal import BlockJournal  # type: ignore
+from common.luascan import scan  # type: ignore
+from common.pipeline import Pipeline  # type: ignore
+from common.splice import splice  # type: ignore
+from common.store import CorpusStore  # type: ignore
+from common.manifest import Manifest, prompt_hash  # type: ignore
+from common.memory import TranslationMemory  # type: ignore
+from common.metrics import metrics  # type: ignore
+from common.ratelimit import estimate_tokens  # type: ignore
+from bokuhime.combine_json import combine_block  # type: ignore
+from bokuhime.remove_speaker_notes import strip_notes  # type: ignore
 
 # ─────────────────────────  CONSTANTS  ────────────────────────────
 MODEL = "gpt-4.1-mini"
+# Tried in order when MODEL keeps failing on a batch; off unless set, e.g.
+# GPT_FALLBACK_MODELS=gpt-4o-mini,gpt-4.1 (cheapest first – every switch is
+# logged and priced in the run summary).
+FALLBACK_MODELS = [m.strip() for m in os.getenv("GPT_FALLBACK_MODELS", "").split(",") if m.strip()]
 EXPORT_DIR = os.path.join(os.path.dirname(__file__), "Export")
 TRANSL_DIR = os.path.join(os.path.dirname(__file__), "Translated")
+COMBINED_DIR = os.path.join(os.path.dirname(__file__), "Combined")
+TM_PATH = os.path.join(os.path.dirname(__file__), "translation_memory.sqlite")
+JOURNAL_PATH = os.path.join(os.path.dirname(__file__), "translation_journal.jsonl")
+MANIFEST_PATH = os.path.join(os.path.dirname(__file__), "manifest.json")
+STORE_PATH = os.path.join(os.path.dirname(__file__), "corpus.sqlite")
+RUNS_PATH = os.path.join(os.path.dirname(__file__), "runs.jsonl")  # one metrics record per run
+BATCH_PATH = os.path.join(os.path.dirname(__file__), "pending_batch.json")  # Batch API job being waited on
 os.makedirs(TRANSL_DIR, exist_ok=True)
+# Translated example blocks sent after the system prompt (0 = none).  They are
+# the same for every file, so they lengthen the cacheable prompt prefix.
+FEW_SHOT = int(os.getenv("GPT_FEW_SHOT", "0"))
+# Notes for the files of one episode ("EP03", "EP_BAD", …; see ``_episode``),
+# sent after the few‑shot examples.  Files with notes are scheduled together.
+EPISODE_CONTEXT: Dict[str, str] = {}
+
+# Files written for each translated export, all from one pass over its blocks:
+# variant → (output dir, stages).  Stages run in the order cleanup → combine →
+# notes; drop a stage or a whole variant to turn it off.  "translated" is the
+# canonical output the manifest and journal refer to.
+OUTPUTS = {
+    "translated": (TRANSL_DIR, ("cleanup",)),
+    "combined": (COMBINED_DIR, ("cleanup", "combine", "notes")),
+}
 
 SYSTEM_PROMPT = """
 You are the dedicated English translator for the visual-novel “Bokuhime Project.”  
@@ -79,25 +118,189 @@ If an unlisted proper noun appears, keep it in romaji.
 """
 
 
-# ───────────────────────  TAG PROTECTION  ─────────────────────────
-_tag_re = re.compile(r"<[^>]+>")
+# Canonical spellings from the prompt, plus given names / surnames on their own.
+GLOSSARY = parse_glossary(SYSTEM_PROMPT)
+GLOSSARY.update(name_aliases(GLOSSARY))
+# Times a block can be queued for re‑translation by ``check`` before it is
+# left as it is (the check can be wrong, and every re‑queue costs a request).
+MAX_REQUEUES = 2
+
+
+# ─────────────────────  TRANSLATION MEMORY  ───────────────────────
+# Set by :func:`read_only` – the state below is then opened without writing.
+_READ_ONLY = False
+_memory: TranslationMemory | None = None
+
+def translation_memory() -> TranslationMemory:
+    """Open (once) the on‑disk translation memory shared by all files."""
+    global _memory
+    if _memory is None:
+        _memory = TranslationMemory(TM_PATH, read_only=_READ_ONLY)
+    return _memory
+
+_journal: BlockJournal | None = None
+
+def block_journal() -> BlockJournal:
+    """Open (once) the checkpoint journal of blocks translated so far."""
+    global _journal
+    if _journal is None:
+        _journal = BlockJournal(JOURNAL_PATH, read_only=_READ_ONLY)
+    return _journal
+
+_manifest: Manifest | None = None
+
+def translation_manifest() -> Manifest:
+    """Load (once) the manifest of source/prompt hashes behind ``Translated/``."""
+    global _manifest
+    if _manifest is None:
+        _manifest = Manifest(MANIFEST_PATH, read_only=_READ_ONLY)
+    return _manifest
+
+_store: CorpusStore | None = None
+
+def corpus_store() -> CorpusStore:
+    """Open (once) the block index of ``Export/`` / ``Translated/`` / ``Combined/``."""
+    global _store
+    if _store is None:
+        _store = CorpusStore(STORE_PATH, read_only=_READ_ONLY)
+    return _store
+
+
+def _translated_from(rel: str) -> list[str] | None:
+    """Source hash behind each block of ``Translated/<rel>`` according to the manifest."""
+    entry = translation_manifest().files.get(rel)
+    if entry is None:
+        return None
+    return entry.get("blocks", []) if entry.get("prompt") == _prompt_id() else []
+
+
+def index_corpus() -> CorpusStore:
+    """Bring :func:`corpus_store` up to date with the files on disk (only changed files are read)."""
+    store = corpus_store()
+    manifest_stamp = os.stat(MANIFEST_PATH).st_mtime_ns if os.path.isfile(MANIFEST_PATH) else 0
+    store.ingest(
+        EXPORT_DIR,
+        translated_dir=TRANSL_DIR,
+        combined_dir=COMBINED_DIR,
+        protect=lambda text: _protect(text)[0],
+        translated_from=_translated_from,
+        provenance=f"{_prompt_id()}:{manifest_stamp}",
+    )
+    return store
+
+def relocate(export_dir: str, work_dir: str) -> None:
+    """Read sources from *export_dir* and keep all outputs and state under *work_dir*.
+
+    Used by ``common.benchmark`` so that a run never touches the real tree.
+    """
+    global EXPORT_DIR, TRANSL_DIR, COMBINED_DIR, TM_PATH, JOURNAL_PATH, MANIFEST_PATH, STORE_PATH, RUNS_PATH, BATCH_PATH, OUTPUTS
+    global _few_shot
+    moved = {d: os.path.join(work_dir, os.path.basename(d)) for d, _stages in OUTPUTS.values()}
+    OUTPUTS = {v: (moved[d], stages) for v, (d, stages) in OUTPUTS.items()}
+    EXPORT_DIR = export_dir
+    TRANSL_DIR = moved.get(TRANSL_DIR, os.path.join(work_dir, "Translated"))
+    COMBINED_DIR = moved.get(COMBINED_DIR, os.path.join(work_dir, "Combined"))
+    TM_PATH = os.path.join(work_dir, os.path.basename(TM_PATH))
+    JOURNAL_PATH = os.path.join(work_dir, os.path.basename(JOURNAL_PATH))
+    MANIFEST_PATH = os.path.join(work_dir, os.path.basename(MANIFEST_PATH))
+    STORE_PATH = os.path.join(work_dir, os.path.basename(STORE_PATH))
+    RUNS_PATH = os.path.join(work_dir, os.path.basename(RUNS_PATH))
+    BATCH_PATH = os.path.join(work_dir, os.path.basename(BATCH_PATH))
+    os.makedirs(TRANSL_DIR, exist_ok=True)
+    _close_state()
+    _few_shot = None
+
+def _close_state() -> None:
+    """Close the opened state so the accessors above open it afresh."""
+    global _memory, _journal, _manifest, _store
+    for db in (_memory, _journal, _store):
+        if db is not None:
+            db.close()
+    _memory = _journal = _manifest = _store = None
+
+@contextmanager
+def read_only() -> Iterator[None]:
+    """Dry run: open the memory and journal read‑only (missing ones as empty)
+    and work on copies of the manifest and corpus index that are never saved."""
+    global _READ_ONLY
+    _close_state()
+    _READ_ONLY = True
+    try:
+        yield
+    finally:
+        _close_state()
+        _READ_ONLY = False
+
+def _prompt_id() -> str:
+    return prompt_hash(SYSTEM_PROMPT, MODEL)
+
+
+# ─────────────────────  SHARED PROMPT CONTEXT  ────────────────────
+_EPISODE_RX = re.compile(r"^(EP\d+|EP_[A-Z]+|[A-Za-z]+)")
+_few_shot: str | None = None
+
+def _episode(rel: str) -> str:
+    m = _EPISODE_RX.match(os.path.basename(rel))
+    return m.group(1) if m else ""
+
+
+def _few_shot_examples() -> str:
+    """``FEW_SHOT`` translated blocks from the corpus as one JSON example (built once).
+
+    The pick only depends on hashes of the blocks' text, so it stays the same
+    from file to file and run to run while the corpus does.
+    """
+    global _few_shot
+    if _few_shot is None:
+        _few_shot = ""
+        if FEW_SHOT > 0:
+            candidates = sorted(
+                (b for b in index_corpus().translated()
+                 if b.protected and b.translation and 20 <= len(b.protected) <= 200),
+                key=lambda b: hashlib.sha1(b.protected.encode("utf-8")).hexdigest(),
+            )
+            pairs = {b.protected: _protect(b.translation)[0] for b in candidates[:FEW_SHOT]}
+            if pairs:
+                example = json.dumps(pairs, ensure_ascii=False, indent=0)
+                _few_shot = "Examples of earlier translations (source → translation):\n" + example
+    return _few_shot
+
+
+def prompt_context(rel: str) -> str | None:
+    """Text sent after the system prompt for *rel*: most widely shared part first."""
+    parts = [_few_shot_examples()]
+    episode = _episode(rel)
+    if EPISODE_CONTEXT.get(episode):
+        parts.append(f"Notes for episode {episode}:\n{EPISODE_CONTEXT[episode]}")
+    return "\n\n".join(p for p in parts if p) or None
+
+
+def prefix_group(rel: str) -> str:
+    """Scheduling group of *rel*: files with the same prompt prefix run together."""
+    episode = _episode(rel)
+    return episode if EPISODE_CONTEXT.get(episode) else ""
 
+# ───────────────────────  TAG PROTECTION  ─────────────────────────
+@metrics.timed("protect")
 def _protect(text: str):
-    """Replace markup tags with placeholders so GPT won't touch them."""
-    tag_map: dict[str, str] = {}
-    def repl(m: re.Match[str]) -> str:
-        tag = m.group(0)
-        key = f"<TAG{len(tag_map)}>"
-        tag_map[key] = tag
-        return key
-    safe = _tag_re.sub(repl, text)
-    return safe, tag_map
+    """Compact a block for the prompt so GPT won't touch markup.
+
+    Tag runs become ``<TAGn>``, speaker headers just ``【name】`` and other
+    line breaks a space (see :mod:`common.compact`).
+    """
+    return compact(text)
 
-def _restore(text: str, tag_map: dict):
-    """Restore placeholders back to original markup tags."""
-    for k, v in tag_map.items():
-        text = text.replace(k, v)
-    return text
+@metrics.timed("restore")
+def _restore(text: str, meta: Compacted):
+    """Restore tags, speaker headers and edge whitespace in a translated block."""
+    return expand(text, meta)
+
+# tokens saved by compaction: rel path → (estimated tokens as is, compacted)
+_compaction: dict[str, tuple[int, int]] = {}
+
+def compaction_savings() -> tuple[int, int]:
+    """Estimated prompt tokens of the blocks sent this run ``(as is, compacted)``."""
+    return sum(b for b, _a in _compaction.values()), sum(a for _b, a in _compaction.values())
 
 # ───────────────────  NEWLINE CLEAN‑UP  ──────────────────────────
 _speaker_re = re.compile(r"(\r\n)(\s*【[^】]+】[^\r\n]*)(\r\n)")
@@ -136,71 +339,403 @@ def _cleanup_newlines(s: str) -> str:
     return result
 
 # ─────────────────────  MSG BLOCK HANDLING  ──────────────────────
-_msg_re = re.compile(r"MSG\(\[\[([\s\S]*?)\]\]\)")
-
 def _extract_blocks(lua_text: str):
     """Return message blocks and their spans inside the Lua script."""
-    blocks: List[str] = []
-    spans: List[Tuple[int, int]] = []
-    for m in _msg_re.finditer(lua_text):
-        blocks.append(m.group(1))
-        spans.append((m.start(1), m.end(1)))
+    msgs = scan(lua_text)
+    blocks: List[str] = [m.body for m in msgs]
+    spans: List[Tuple[int, int]] = [m.span for m in msgs]
     return blocks, spans
 
-# ─────────────────────  FILE PROCESSORS  ─────────────────────────
-async def process_file_async(path: str, dest_path: str | None = None, *, debug: bool = False):
-    """Translate all MSG() blocks in a single exported JSON file asynchronously."""
-    if dest_path is None:
-        rel = os.path.relpath(path, EXPORT_DIR)
-        dest_path = os.path.join(TRANSL_DIR, rel)
+# ─────────────────────  GLOSSARY CHECK  ──────────────────────────
+_glossary: Glossary | None = None
+
+def glossary() -> Glossary:
+    """Build (once) the matcher for :data:`GLOSSARY`."""
+    global _glossary
+    if _glossary is None:
+        _glossary = Glossary(GLOSSARY, parse_people(SYSTEM_PROMPT))
+    return _glossary
+
+
+def _review_glossary(source: str, reply: str) -> str | None:
+    """Hint for a reply that misses a glossary spelling (re‑prompted once), or None."""
+    missing = glossary().check(source, reply)
+    if not missing:
+        return None
+    return "use the glossary spelling " + ", ".join(f"{en} for {jp}" for jp, en in missing)
+
+
+def queue_retranslation(rel: str, indices: List[int]) -> List[int]:
+    """Make the next run translate blocks *indices* of *rel* again.
+
+    Their manifest hashes are blanked and their translation‑memory entries
+    dropped, so neither hands back the old translation.  Blocks already
+    queued ``MAX_REQUEUES`` times are skipped; returns the ones queued.
+    """
+    src = json.loads(read_file(os.path.join(EXPORT_DIR, rel)))["Text"]
+    blocks, _spans = _extract_blocks(src)
+    manifest = translation_manifest()
+    if rel not in manifest:
+        manifest.update(rel, blocks, _prompt_id())
+    indices = [i for i in indices if manifest.requeued(rel, blocks[i]) < MAX_REQUEUES]
+    manifest.requeue(rel, (blocks[i] for i in indices))
+    manifest.invalidate(rel, indices)
+    translation_memory().forget(
+        translation_memory().key(_protect(blocks[i])[0], model=MODEL, system_prompt=SYSTEM_PROMPT)
+        for i in indices
+    )
+    return indices
+
+
+def check_glossary(*, queue: bool = True) -> Dict[str, Dict[int, List[Tuple[str, str]]]]:
+    """Blocks of ``Translated/`` that miss the canonical English of a glossary term.
+
+    Returns ``rel → {block index → [(term, expected english), …]}``; with
+    *queue* the flagged blocks are also queued for re‑translation (at most
+    ``MAX_REQUEUES`` times each).  Speaker pose labels (left in Japanese) are
+    not checked.
+    """
+    matcher = glossary()
+    flagged: Dict[str, Dict[int, List[Tuple[str, str]]]] = {}
+    capped = 0
+    for rel in sorted(os.listdir(TRANSL_DIR)):
+        src_path = os.path.join(EXPORT_DIR, rel)
+        if not rel.lower().endswith(".json") or not os.path.isfile(src_path):
+            continue
+        sources, _ = _extract_blocks(json.loads(read_file(src_path))["Text"])
+        translated, _ = _extract_blocks(json.loads(read_file(os.path.join(TRANSL_DIR, rel)))["Text"])
+        if len(sources) != len(translated):
+            logging.warning("Skipping %s: %d source vs %d translated blocks", rel, len(sources), len(translated))
+            continue
+        hits = {}
+        for i, (jp, en) in enumerate(zip(sources, translated)):
+            missing = matcher.check(strip_notes(jp), en)
+            if missing:
+                hits[i] = missing
+        if hits:
+            flagged[rel] = hits
+            if queue:
+                capped += len(hits) - len(queue_retranslation(rel, list(hits)))
+    if queue:
+        translation_manifest().save()
+    if capped:
+        logging.info("%d flagged block(s) not queued again: already re‑translated %d times", capped, MAX_REQUEUES)
+    return flagged
 
-    os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+# ─────────────────────  FILE PROCESSORS  ─────────────────────────
+def pending_blocks(rels: List[str], *, everything: bool = False) -> Dict[str, List[str]]:
+    """``rel → protected blocks`` a run over *rels* would send to the API.
+
+    Blocks reused from the existing translation or the journal and blocks
+    already in the translation memory are left out, unless *everything*
+    (plan a run from scratch).
+    """
+    memory = translation_memory()
+    pending: Dict[str, List[str]] = {}
+    for rel in rels:
+        job = _FileJob(os.path.join(EXPORT_DIR, rel))
+        if everything:
+            safe = [_protect(b)[0] for b in job.blocks]
+        else:
+            job.prepare()
+            safe = [_protect(job.blocks[i])[0] for i in job.todo]
+            keys = [memory.key(s, model=MODEL, system_prompt=SYSTEM_PROMPT) for s in safe]
+            cached = memory.get_many(keys)
+            safe = [s for s, k in zip(safe, keys) if k not in cached]
+        if safe:
+            pending[rel] = safe
+    return pending
+
+
+def translated_pairs(limit: int | None = 5000) -> List[Tuple[str, str]]:
+    """``(protected source, protected translation)`` of already translated blocks, for calibration."""
+    return [
+        (b.protected, _protect(b.translation)[0])
+        for b in index_corpus().translated(limit)
+        if b.protected and b.translation
+    ]
+
+
+def is_stale(path: str) -> bool:
+    """True if the translation of *path* is older than its source or the prompt.
+
+    Translations written before the manifest existed are adopted as current
+    the first time they are seen.
+    """
+    rel = os.path.relpath(path, EXPORT_DIR)
+    blocks, _spans = _extract_blocks(json.loads(read_file(path))["Text"])
+    dest = os.path.join(TRANSL_DIR, rel)
+    output = read_file(dest) if os.path.isfile(dest) else None
+    manifest = translation_manifest()
+    if rel not in manifest:
+        manifest.update(rel, blocks, _prompt_id(), output)
+        return False
+    if output is not None and not manifest.describes(rel, output):
+        return True
+    return not manifest.is_current(rel, blocks, _prompt_id())
+
+
+def _block_cost(block: str) -> int:
+    return 2 * estimate_tokens(block) + 8
+
+
+def estimate_cost(path: str) -> int:
+    """Rough token cost of translating *path* (prompt + reply), for scheduling."""
+    blocks, _spans = _extract_blocks(json.loads(read_file(path))["Text"])
+    return sum(_block_cost(b) for b in blocks)
+
+
+class _FileJob:
+    """One export file on its way through translation."""
+
+    def __init__(self, path: str, dest_path: str | None = None, on_progress: Callable[[int], None] | None = None):
+        self.path = path
+        self.on_progress = on_progress  # called with each checkpointed block's estimated cost
+        self.rel = os.path.relpath(path, EXPORT_DIR)
+        self.dest_path = dest_path or os.path.join(TRANSL_DIR, self.rel)
+        self.custom_dest = dest_path is not None
+        with metrics.stage("load"):
+            self.raw_json = json.loads(read_file(path))
+        self.lua_src: str = self.raw_json["Text"]
+        with metrics.stage("extract"):
+            self.msgs = scan(self.lua_src)
+        self.blocks = [m.body for m in self.msgs]
+        self.spans = [m.span for m in self.msgs]
+        self.translated: list[str] = list(self.blocks)
+        self.todo: list[int] = []
+        self.missing: set[int] = set()
+
+    def prepare(self) -> None:
+        """Fill in reusable blocks and work out which ones still need the API.
+
+        Blocks whose source and prompt are unchanged since the existing
+        translation (per the manifest) and blocks already checkpointed in the
+        journal are reused.
+        """
+        reused: dict[int, str] = {}
+        if os.path.isfile(self.dest_path):
+            output = read_file(self.dest_path)
+            reuse = translation_manifest().reusable(self.rel, self.blocks, _prompt_id(), output)
+            if reuse:
+                old_blocks, _old_spans = _extract_blocks(json.loads(output)["Text"])
+                reused = {i: old_blocks[j] for i, j in reuse.items() if j < len(old_blocks)}
+
+        done = {**block_journal().replay(self.rel, self.blocks), **reused}
+        for i, text in done.items():
+            self.translated[i] = text
+        self.todo = [i for i in range(len(self.blocks)) if i not in done]
+        self.missing = set(self.todo)
+        if done:
+            logging.info("↻  %s: %d/%d blocks reused (%d unchanged, rest from journal)",
+                         self.rel, len(done), len(self.blocks), len(reused))
+
+    def checkpoint(self, j: int, text: str) -> None:
+        """Record the translation of ``todo[j]`` in the journal."""
+        i = self.todo[j]
+        self.translated[i] = text
+        self.missing.discard(i)
+        block_journal().record(self.rel, i, self.blocks[i], text)
+        if self.on_progress is not None:
+            self.on_progress(_block_cost(self.blocks[i]))
+
+    def pipeline(self) -> Pipeline:
+        return Pipeline([
+            ("cleanup", lambda i, t: _cleanup_newlines(t)),
+            ("combine", lambda i, t: combine_block(self.msgs[i], t)),
+            ("notes", lambda i, t: strip_notes(t)),
+        ])
+
+    def finish(self, outputs: dict | None = None) -> None:
+        """Run the blocks through the output stages and write every variant.
+
+        With an explicit ``dest_path`` only the translated variant is written
+        (there).  Updates journal + manifest afterwards; the manifest is saved
+        right away so it never lags behind the files on disk.
+        """
+        outputs = dict(OUTPUTS if outputs is None else outputs)
+        outputs.setdefault("translated", OUTPUTS["translated"])
+        if self.custom_dest:
+            outputs = {"translated": outputs["translated"]}
+        pipe = self.pipeline()
+        variants = pipe.run(self.translated, {v: stages for v, (_dir, stages) in outputs.items()})
+        for name, secs in pipe.seconds.items():
+            if secs:
+                metrics.add_time(name, secs, calls=len(self.blocks))
+
+        # ── re‑insert each variant into the original Lua text and write it ─
+        written: dict[str, str] = {}
+        for variant, blocks in variants.items():
+            out_dir = outputs[variant][0]
+            dest = self.dest_path if variant == "translated" else os.path.join(out_dir, self.rel)
+            with metrics.stage("write"):
+                data = dict(self.raw_json, Text=splice(self.lua_src, zip(self.spans, blocks)))
+                written[variant] = json.dumps(data, ensure_ascii=False, indent=2)
+                write_file(dest, written[variant])
+            logging.debug("✅  Wrote %s", dest)
+        block_journal().finish(self.rel)
+        if not self.custom_dest:
+            manifest = translation_manifest()
+            manifest.update(self.rel, self.blocks, _prompt_id(), written["translated"])
+            with metrics.stage("write"):
+                manifest.save()
+
+
+async def process_file_async(path: str, dest_path: str | None = None, *, debug: bool = False,
+                             outputs: dict | None = None, on_progress: Callable[[int], None] | None = None):
+    """Translate all MSG() blocks in a single exported JSON file asynchronously.
+
+    Blocks whose source and prompt are unchanged since the existing
+    translation (per the manifest) and blocks already checkpointed in the
+    journal are reused; only the rest are sent.  *outputs* overrides
+    :data:`OUTPUTS` for this file; *on_progress* receives the estimated cost
+    (see :func:`estimate_cost`) of every block as it is translated.
+    """
     if debug:
         logging.getLogger().setLevel(logging.DEBUG)
-    logging.debug("Processing %s → %s", path, dest_path)
-
-    raw_json = json.loads(read_file(path))
-    lua_src: str = raw_json["Text"]
+    job = _FileJob(path, dest_path, on_progress)
+    logging.debug("Processing %s → %s", path, job.dest_path)
 
-    # ── extract message blocks ────────────────────────────────
-    blocks, spans = _extract_blocks(lua_src)
-    if not blocks:  # nothing to translate
-        write_file(dest_path, json.dumps(raw_json, ensure_ascii=False, indent=2))
+    if not job.blocks:  # nothing to translate
+        job.finish(outputs)
         return
 
+    job.prepare()
+    before, after = _compaction[job.rel] = savings([job.blocks[i] for i in job.todo])
+    if before:
+        logging.info("🗜  %s: %d → %d est. prompt tokens after compaction (−%.0f%%)",
+                     job.rel, before, after, 100 * (before - after) / before)
+
     # ── translate ─────────────────────────────────────────────
-    translated_blocks, success = await translate_blocks_async(
-        blocks,
+    from common.gpt import translate_blocks_async  # type: ignore  # pulls in openai
+    new_blocks, success, failures = await translate_blocks_async(
+        [job.blocks[i] for i in job.todo],
         system_prompt=SYSTEM_PROMPT,
         model=MODEL,
         protect=_protect,
         restore=_restore,
+        memory=translation_memory(),
+        on_block=job.checkpoint,
+        fallback_models=FALLBACK_MODELS,
+        validate=check_markup,
+        review=_review_glossary,
+        context=prompt_context(job.rel),
     )
+    for i, text in zip(job.todo, new_blocks):
+        job.translated[i] = text
+    failures = {job.todo[j]: why for j, why in failures.items()}
     if not success:
-        logging.warning("⚠️  Some blocks failed to translate in %s", path)
+        logging.warning("⚠️  %d block(s) failed to translate in %s", len(failures), path)
+        for idx, why in sorted(failures.items()):
+            logging.warning("    block %d: %s", idx, why)
         return
 
-    cleaned_blocks = [_cleanup_newlines(t) for t in translated_blocks]
-
-    # ── re‑insert translations into original Lua text ─────────
-    buf: list[str] = []
-    last = 0
-    for (start, end), new in zip(spans, cleaned_blocks):
-        buf.append(lua_src[last:start])
-        buf.append(new)
-        last = end
-    buf.append(lua_src[last:])
-
-    raw_json["Text"] = "".join(buf)
-
-    # ── write out ─────────────────────────────────────────────
-    write_file(dest_path, json.dumps(raw_json, ensure_ascii=False, indent=2))
-    logging.debug("✅  Wrote %s", dest_path)
+    job.finish(outputs)
+
+
+async def process_batch_async(paths: list[str], *, poll_interval: float = 30.0) -> None:
+    """Translate *paths* in one OpenAI Batch API job (cheaper, not interactive).
+
+    Uses the same prompt, context, ``_protect`` placeholders, translation
+    memory and journal as :func:`process_file_async`.  Files whose blocks all
+    came back (with their markup intact) are written; anything missing stays
+    in the journal for ``resume``.  There is no second round trip to
+    re‑prompt, so blocks the glossary review flags are written as they are
+    and queued for re‑translation by the next ``all`` run.
+
+    A batch left by an interrupted run is waited for first and its replies
+    go to the translation memory, so it is never submitted twice.
+    """
+    from common.batch import forget_batch, resume_batch, run_batch  # type: ignore
+    from common.gpt import MAX_BATCH_TOKENS, pack_batches  # type: ignore
+
+    memory = translation_memory()
+
+    def tm_key(safe: str) -> str:
+        return memory.key(safe, model=MODEL, system_prompt=SYSTEM_PROMPT)
+
+    def learn(requests: dict[str, dict[str, str]], replies: dict[str, dict[str, str]]) -> None:
+        learned: dict[str, str] = {}
+        for cid, batch in requests.items():
+            out = replies.get(cid, {})
+            for k, safe in batch.items():
+                if isinstance(out.get(k), str) and not check_markup(safe, out[k]):
+                    learned[tm_key(safe)] = out[k]
+        memory.put_many(learned)
+
+    resumed = await resume_batch(BATCH_PATH, system_prompt=SYSTEM_PROMPT, model=MODEL, poll_interval=poll_interval)
+    if resumed is not None:
+        learn(*resumed)
+        forget_batch(BATCH_PATH)
+
+    jobs = [_FileJob(p) for p in paths]
+    requests: dict[str, dict[str, str]] = {}  # custom_id → payload
+    contexts: dict[str, str | None] = {}      # custom_id → prompt context
+    pending: dict[str, tuple[_FileJob, dict[str, tuple[int, object]]]] = {}  # custom_id → job, key → (index, meta)
+    flagged: dict[str, list[int]] = {}        # rel → blocks the glossary review flagged
+
+    def accept(job: _FileJob, j: int, safe: str, reply: str, meta) -> None:
+        if _review_glossary(safe, reply):
+            flagged.setdefault(job.rel, []).append(job.todo[j])
+        job.checkpoint(j, _restore(reply, meta))
+
+    for job in jobs:
+        job.prepare()
+        metas: dict[str, tuple[int, object]] = {}
+        safe_dict: dict[str, str] = {}
+        tm_keys: dict[int, str] = {}
+        for j, i in enumerate(job.todo):
+            safe, meta = _protect(job.blocks[i])
+            tm_keys[j] = tm_key(safe)
+            safe_dict[str(j)] = safe
+            metas[str(j)] = (j, meta)
+        cached = memory.get_many(tm_keys.values())
+        for j, key in tm_keys.items():
+            safe = safe_dict[str(j)]
+            if key in cached and not check_markup(safe, cached[key]):
+                accept(job, j, safe, cached[key], metas[str(j)][1])
+                safe_dict.pop(str(j))
+        for n, batch in enumerate(pack_batches(safe_dict, MAX_BATCH_TOKENS)):
+            cid = f"{job.rel}::{n}"
+            requests[cid] = batch
+            contexts[cid] = prompt_context(job.rel)
+            pending[cid] = (job, {k: metas[k] for k in batch})
+
+    if requests:
+        replies = await run_batch(requests, system_prompt=SYSTEM_PROMPT, model=MODEL, contexts=contexts,
+                                  poll_interval=poll_interval, state_path=BATCH_PATH)
+        for cid, (job, metas) in pending.items():
+            out = replies.get(cid, {})
+            for k, (j, meta) in metas.items():
+                if isinstance(out.get(k), str) and not check_markup(requests[cid][k], out[k]):
+                    accept(job, j, requests[cid][k], out[k], meta)
+        learn(requests, replies)
+        forget_batch(BATCH_PATH)
+
+    for job in jobs:
+        if job.missing:
+            logging.warning("⚠️  %d block(s) missing from batch output for %s", len(job.missing), job.rel)
+            continue
+        job.finish()
+        if flagged.get(job.rel):
+            queued = queue_retranslation(job.rel, flagged[job.rel])
+            logging.warning("🔁  %s: %d block(s) miss a glossary spelling, %d queued for re‑translation",
+                            job.rel, len(flagged[job.rel]), len(queued))
 
 
 def process_file(path: str, dest_path: str | None = None, *, debug: bool = False):
     """Synchronous wrapper for tooling that expects a blocking call."""
+    import asyncio
+
     asyncio.run(process_file_async(path, dest_path, debug=debug))
+    translation_manifest().save()
+
+
+def process_batch(paths: list[str], *, poll_interval: float = 30.0):
+    """Synchronous wrapper around :func:`process_batch_async`."""
+    import asyncio
+
+    asyncio.run(process_batch_async(paths, poll_interval=poll_interval))
+    translation_manifest().save()
 
 # ─────────────────────  CLI TEST HOOK  ───────────────────────────
 if __name__ == "__main__":
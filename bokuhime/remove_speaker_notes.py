@@ -1,46 +1,44 @@
 import os
-import re
+import sys
 import json
 import argparse
+from pathlib import Path
 
-# Regex for MSG blocks
-MSG_RX = re.compile(r'MSG\(\[\[(.*?)\]\]\)', re.DOTALL)
-# Regex for speaker note: captures (【Speaker】), (Note), and trailing (\r\n)
-# Works for examples like 【Erika】Serious\r\n
-SPEAKER_NOTE_RX = re.compile(r'(【[^】]+】)\s*([^\r\n]+)(\r\n)')
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))  # project root, for `common`
+from common.luascan import MsgBlock, scan, split_speaker_note  # type: ignore
+from common.splice import splice  # type: ignore
 
-def remove_notes_from_block_content(block_content):
+def remove_notes_from_block(msg: MsgBlock):
     """
-    Removes author notes from speaker tags within a single MSG block's content.
+    Removes author notes from speaker tags within a single MSG block.
     Example: "【Erika】Serious\r\n" becomes "【Erika】\r\n"
+    Only the rest of the speaker's own line is dropped, never the next line.
     """
-    return SPEAKER_NOTE_RX.sub(r'\1\3', block_content)
+    edits = []
+    for token in msg.speakers:
+        head, note = split_speaker_note(token)
+        if note and msg.body[token.end:token.end + 2] == "\r\n":
+            edits.append(((token.start, token.end), head))
+    return splice(msg.body, edits) if edits else msg.body
+
+def strip_notes(body):
+    """Same as :func:`remove_notes_from_block` for a bare MSG body string."""
+    return remove_notes_from_block(MsgBlock(0, len(body), body, False))
 
 def process_text_field(text_content):
     """
     Processes the entire "Text" field, finding all MSG blocks and cleaning them.
     """
-    new_text_content = text_content
-    offset = 0
-    for match in MSG_RX.finditer(text_content):
-        original_block_content = match.group(1)
-        modified_block_content = remove_notes_from_block_content(original_block_content)
+    edits = []
+    for msg in scan(text_content):
+        original_block_content = msg.body
+        modified_block_content = remove_notes_from_block(msg)
 
         if modified_block_content != original_block_content:
             # Replace the content of the current MSG block
-            # match.span(1) gives the start and end of the content *within* MSG([[]])
-            start, end = match.span(1)
-            
-            current_pos_start = start + offset
-            current_pos_end = end + offset
-
-            new_text_content = (
-                new_text_content[:current_pos_start] +
-                modified_block_content +
-                new_text_content[current_pos_end:]
-            )
-            offset += len(modified_block_content) - len(original_block_content)
-    return new_text_content
+            # msg.span gives the start and end of the content *within* MSG([[]])
+            edits.append((msg.span, modified_block_content))
+    return splice(text_content, edits)
 
 def process_json_file(input_path, output_path):
     """
@@ -0,0 +1,225 @@
+from __future__ import annotations
+
+"""Python port of the patched ``Wyvern.TextRender.WordWrap`` (``WordWrap.cs``).
+
+``combine_json`` and the overflow report need to know how many lines a
+message really takes in the game's message box.  :func:`word_wrap` follows
+the C# routine step by step – ``_`` pairs that take no width, ASCII word
+back‑tracking, kinsoku head/tail rules, and zero‑width markup runs – so the
+line breaks match what the player sees.
+
+The kinsoku tables are not part of ``WordWrap.cs`` (they are static fields
+elsewhere in ``TextRender``); :data:`KINSOKU_HEAD` / :data:`KINSOKU_END`
+are the usual Japanese line‑breaking sets.  Run as a script to score every
+block of a directory::
+
+    python -m bokuhime.wordwrap bokuhime/Combined
+"""
+
+from typing import Iterable, List, NamedTuple, Sequence, Tuple
+import os, re, sys, json, time, argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # project root, for `common`
+from common.luascan import scan, tokenize  # type: ignore
+
+LINE_CHARACTER = 70  # the patched routine ignores its argument and uses 70
+ALLOW_NUM = 1        # how many kinsoku characters may hang past the limit
+MAX_LINES = 4        # lines that fit in the message box
+
+# Characters that may not start a line (closing brackets, small kana, punctuation …)
+KINSOKU_HEAD = (
+    ",)]}、。，．・：；？！゛゜ヽヾゝゞ々ー’”）〕］｝〉》」』】〙〗〟｠»"
+    "ぁぃぅぇぉっゃゅょゎゕゖァィゥェォッャュョヮヵヶ…‥〜～!?.:;"
+)
+# Characters that may not end a line (opening brackets)
+KINSOKU_END = "([{‘“（〔［｛〈《「『【〘〖〝｟«"
+
+# Precomputed lookups
+_HEAD = frozenset(KINSOKU_HEAD)
+_END = frozenset(KINSOKU_END)
+_ZERO_WIDTH_TAGS = ("<sprite", "<space", "<line-height")
+
+
+def word_wrap(
+    text: str,
+    line_character: int = LINE_CHARACTER,
+    allow_num: int = ALLOW_NUM,
+    *,
+    commands: Sequence[str] = (),
+) -> Tuple[str, int]:
+    """Wrap *text* like ``TextRender.WordWrap``; returns ``(wrapped, textCount)``.
+
+    The patched C# always uses 70 characters per line, the default here.
+
+    *commands* are the regexes of ``TextRender.textCommandList`` removed
+    before wrapping (``commandReplace``).  Where the C# would throw on a
+    trailing ``_`` or an unmatched closing tag, the port stops or ignores
+    the tag instead, and an ASCII word longer than a line is split where
+    the C# would wrap it again forever.
+    """
+    out: List[str] = []
+    i = num = text_count = line_start = 0
+    limit = line_character
+    text = text.replace("\n　", "\n")
+    for rx in commands:
+        text = re.sub(rx, "", text)
+    n = len(text)
+
+    while i < n:
+        while i < n and text[i] == "_":
+            for _ in range(2):  # "_" and the character after it take no width
+                if i >= n:
+                    break
+                out.append(text[i])
+                i += 1
+                num += 1
+                limit += 1
+        if i >= n:
+            break
+        if num > limit and text[i] != "\n":
+            # back‑track so an ASCII word is not split – unless the word
+            # fills the whole line, which would wrap it again forever
+            j = i
+            while j > 0 and text[j - 1] <= "\x7f" and text[j] <= "\x7f" and text[j - 1] not in " 　":
+                j -= 1
+            if i - j < len(out) - line_start:
+                del out[len(out) - (i - j):]
+                num -= i - j
+                i = j
+            hang = -1
+            k = 0
+            while k < allow_num and n > i + k:
+                if text[i + k] in _HEAD:
+                    hang = k
+                k += 1
+            if text[i] in _END:
+                k = 0
+                while k < allow_num and n > i + k:
+                    if text[i + k] in _HEAD:
+                        hang = k
+                        break
+                    k += 1
+            if hang >= 0 and n > i + hang + 1 and text[i + hang + 1] not in _HEAD:
+                # keep the kinsoku characters on this line
+                for _ in range(hang + 1):
+                    out.append(text[i])
+                    i += 1
+                    text_count += 1
+            # (the C# ``else if`` that follows can never be true and is omitted)
+            if text[i] != "\n":
+                out.append("\n")
+                line_start = len(out)
+                num = 0
+                limit = line_character
+        if text[i] == "\n":
+            line_start = len(out) + 1
+            num = 0
+            limit = line_character
+        out.append(text[i])
+        i += 1
+        num += 1
+        text_count += 1
+
+        # markup runs (tags and everything inside an open tag pair) take no width
+        while i < n and text[i] == "<":
+            in_tag = False
+            cur = ""
+            stack: List[str] = []
+            while i < n:
+                c = text[i]
+                if c == "<":
+                    in_tag = True
+                elif c == ">":
+                    cur += c
+                    if any(t in cur for t in _ZERO_WIDTH_TAGS):
+                        in_tag = False
+                    elif "</" in cur:
+                        if stack:
+                            stack.pop()
+                        if not stack:
+                            in_tag = False
+                    else:
+                        stack.append(cur)
+                    cur = ""
+                if in_tag:
+                    cur += c
+                out.append(c)
+                i += 1
+                num += 1
+                limit += 1
+                if not in_tag:
+                    break
+    return "".join(out), text_count
+
+
+def game_text(body: str) -> str:
+    """The text the game hands to WordWrap for an MSG body.
+
+    Lua long strings turn every ``\\r\\n`` into ``\\n`` and drop a newline
+    right after ``[[``; the speaker header line is shown as the name plate,
+    not in the message box.
+    """
+    for token in reversed([t for t in tokenize(body) if t.kind == "speaker"]):
+        end = token.end + (2 if body.startswith("\r\n", token.end) else 0)
+        body = body[:token.start] + body[end:]
+    text = body.replace("\r\n", "\n").replace("\r", "\n")
+    return text.strip("\n")
+
+
+def count_lines(text: str, line_character: int = LINE_CHARACTER) -> int:
+    """Number of message‑box lines *text* (already game text) wraps to."""
+    if not text:
+        return 0
+    if len(text) <= line_character and "\n" not in text:
+        return 1  # nothing can exceed the limit
+    return word_wrap(text, line_character)[0].count("\n") + 1
+
+
+class Overflow(NamedTuple):
+    file: str
+    block: int
+    lines: int
+    text: str
+
+
+def score_file(path: str, *, max_lines: int = MAX_LINES) -> Tuple[int, List[Overflow]]:
+    """``(blocks, overflowing blocks)`` for one game JSON file."""
+    with open(path, encoding="utf-8") as f:
+        msgs = scan(json.load(f)["Text"])
+    name = os.path.basename(path)
+    over = []
+    for idx, msg in enumerate(msgs):
+        text = game_text(msg.body)
+        lines = count_lines(text)
+        if lines > max_lines:
+            over.append(Overflow(name, idx, lines, text))
+    return len(msgs), over
+
+
+def score_dir(directory: str, *, max_lines: int = MAX_LINES) -> Tuple[int, List[Overflow]]:
+    total, over = 0, []
+    for fn in sorted(os.listdir(directory)):
+        if fn.lower().endswith(".json"):
+            n, o = score_file(os.path.join(directory, fn), max_lines=max_lines)
+            total += n
+            over.extend(o)
+    return total, over
+
+
+def main(argv: Iterable[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Report MSG blocks that overflow the message box.")
+    parser.add_argument("directory", nargs="?", default=os.path.join(os.path.dirname(__file__), "Combined"))
+    parser.add_argument("--max-lines", type=int, default=MAX_LINES)
+    parser.add_argument("--show", type=int, default=20, help="Print the N longest overflows")
+    args = parser.parse_args(argv)
+
+    t0 = time.perf_counter()
+    total, over = score_dir(args.directory, max_lines=args.max_lines)
+    for o in sorted(over, key=lambda o: -o.lines)[:args.show]:
+        print(f"{o.lines} lines  {o.file} #{o.block}: {o.text[:60]!r}")
+    print(f"{len(over)} of {total} blocks exceed {args.max_lines} lines "
+          f"({time.perf_counter() - t0:.2f} s)")
+
+
+if __name__ == "__main__":
+    main()
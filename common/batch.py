@@ -0,0 +1,168 @@
+from __future__ import annotations
+
+"""OpenAI Batch API path for bulk (non‑interactive) translation runs.
+
+Every request is one JSON line in the batch input file, built with the same
+:func:`common.gpt.request_body` as interactive requests so the prompt and
+placeholders are identical.  The flow is upload → create batch → poll →
+download output, after which each reply is parsed back into
+``{block key: translated safe text}``.
+
+A batch can take up to 24 h, so its id and requests are saved to a small
+JSON file before polling starts; a run killed while waiting picks the batch
+up again with :func:`resume_batch` instead of submitting (and paying for)
+it a second time.
+
+Point ``OPENAI_BASE_URL`` at ``python -m common.mockapi`` to exercise the
+whole round trip offline.
+"""
+
+from typing import Any, Callable, Dict, Mapping, Tuple
+import json, logging, os, asyncio
+
+from common.gpt import async_client, prefix_key, request_body  # type: ignore
+
+CHAT_ENDPOINT = "/v1/chat/completions"
+TERMINAL_STATES = {"completed", "failed", "expired", "cancelled"}
+
+
+def build_input(
+    requests: Mapping[str, Dict[str, str]],
+    *,
+    system_prompt: str,
+    model: str,
+    contexts: Mapping[str, str | None] | None = None,
+) -> bytes:
+    """JSONL batch input: one chat request per ``custom_id → payload``.
+
+    *contexts* (``custom_id → text``) is sent after the system prompt, as
+    the ``context`` of interactive requests is.
+    """
+    contexts = contexts or {}
+    lines = [
+        json.dumps(
+            {"custom_id": cid, "method": "POST", "url": CHAT_ENDPOINT,
+             "body": request_body(system_prompt, payload, model=model, context=contexts.get(cid))},
+            ensure_ascii=False,
+        )
+        for cid, payload in requests.items()
+    ]
+    return ("\n".join(lines) + "\n").encode("utf-8")
+
+
+def parse_output(text: str) -> Dict[str, Dict[str, str]]:
+    """``custom_id → parsed JSON reply`` for every successful line of *text*."""
+    replies: Dict[str, Dict[str, str]] = {}
+    for line in text.splitlines():
+        if not line.strip():
+            continue
+        rec = json.loads(line)
+        cid = rec.get("custom_id")
+        resp = rec.get("response") or {}
+        if rec.get("error") or resp.get("status_code") != 200:
+            logging.warning("Batch request %s failed: %s", cid, rec.get("error") or resp.get("status_code"))
+            continue
+        try:
+            content = resp["body"]["choices"][0]["message"]["content"]
+            out = json.loads(content)
+        except (KeyError, IndexError, TypeError, json.JSONDecodeError) as exc:
+            logging.warning("Bad JSON in batch reply %s: %s", cid, exc)
+            continue
+        if isinstance(out, dict):
+            replies[cid] = out
+    return replies
+
+
+def _save_state(path: str, state: Dict[str, Any]) -> None:
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as fh:
+        json.dump(state, fh, ensure_ascii=False)
+    os.replace(tmp, path)
+
+
+def forget_batch(state_path: str) -> None:
+    """Drop the saved batch once its replies have been stored."""
+    if os.path.isfile(state_path):
+        os.remove(state_path)
+
+
+async def _wait(aclient, batch, *, poll_interval: float, on_status) -> Dict[str, Dict[str, str]]:
+    while batch.status not in TERMINAL_STATES:
+        await asyncio.sleep(poll_interval)
+        batch = await aclient.batches.retrieve(batch.id)
+        if on_status is not None:
+            on_status(batch.status, getattr(batch, "request_counts", None))
+        logging.debug("Batch %s: %s %s", batch.id, batch.status, getattr(batch, "request_counts", ""))
+
+    if batch.status != "completed":
+        logging.warning("Batch %s ended as %s", batch.id, batch.status)
+    if getattr(batch, "error_file_id", None):
+        errors = await aclient.files.content(batch.error_file_id)
+        for line in errors.text.splitlines()[:20]:
+            logging.warning("Batch error: %s", line)
+    if not getattr(batch, "output_file_id", None):
+        return {}
+    output = await aclient.files.content(batch.output_file_id)
+    return parse_output(output.text)
+
+
+async def run_batch(
+    requests: Mapping[str, Dict[str, str]],
+    *,
+    system_prompt: str,
+    model: str,
+    contexts: Mapping[str, str | None] | None = None,
+    poll_interval: float = 30.0,
+    on_status: Callable[[str, object], None] | None = None,
+    state_path: str | None = None,
+) -> Dict[str, Dict[str, str]]:
+    """Submit *requests* as one batch, wait for it and return the parsed replies.
+
+    Requests missing from the result (failed, expired, bad JSON) are simply
+    absent; the caller decides what to retry.  With *state_path* the batch
+    is saved there before polling; call :func:`forget_batch` once the
+    replies are stored.
+    """
+    aclient = async_client()
+    data = build_input(requests, system_prompt=system_prompt, model=model, contexts=contexts)
+    upload = await aclient.files.create(file=("batch_input.jsonl", data), purpose="batch")
+    batch = await aclient.batches.create(
+        input_file_id=upload.id,
+        endpoint=CHAT_ENDPOINT,
+        completion_window="24h",
+    )
+    logging.info("📤  Submitted batch %s (%d requests)", batch.id, len(requests))
+    if state_path is not None:
+        _save_state(state_path, {"id": batch.id, "prefix": prefix_key(system_prompt, model=model),
+                                 "requests": dict(requests)})
+    return await _wait(aclient, batch, poll_interval=poll_interval, on_status=on_status)
+
+
+async def resume_batch(
+    state_path: str,
+    *,
+    system_prompt: str,
+    model: str,
+    poll_interval: float = 30.0,
+    on_status: Callable[[str, object], None] | None = None,
+) -> Tuple[Dict[str, Dict[str, str]], Dict[str, Dict[str, str]]] | None:
+    """Wait for the batch an interrupted :func:`run_batch` saved at *state_path*.
+
+    Returns its ``(requests, replies)``, or None if no batch was saved.  A
+    batch made with another system prompt or model is dropped.
+    """
+    if not os.path.isfile(state_path):
+        return None
+    with open(state_path, encoding="utf-8") as fh:
+        state = json.load(fh)
+    if state.get("prefix") != prefix_key(system_prompt, model=model):
+        logging.warning("Dropping batch %s: it was submitted with another prompt or model", state["id"])
+        forget_batch(state_path)
+        return None
+    aclient = async_client()
+    batch = await aclient.batches.retrieve(state["id"])
+    logging.info("📥  Reattached to batch %s (%s, %d requests)", batch.id, batch.status, len(state["requests"]))
+    replies = await _wait(aclient, batch, poll_interval=poll_interval, on_status=on_status)
+    return state["requests"], replies
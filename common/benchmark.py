@@ -0,0 +1,202 @@
+from __future__ import annotations
+
+"""Offline throughput benchmark for ``translate.py <game> all``.
+
+Copies a random sample of a game's ``Export/`` into a scratch directory,
+starts :mod:`common.mockapi` in‑process, points the OpenAI client at it and
+runs the real ``all`` mode over the sample::
+
+    python -m common.benchmark bokuhime --sample 20 --latency lognormal:0.8,0.4 --rate-429 0.02
+
+The mock answers with recorded English replies – by default the game's own
+``Translated/`` blocks, which are what the model returned for them (read
+without writing anything), or a ``--fixtures`` file – so validation, the
+glossary review and re‑prompts behave as in a real run; ``--replies echo``
+sends the Japanese back instead.  ``--write-fixtures FILE`` saves the
+recorded replies for ``python -m common.mockapi --fixtures FILE``.
+
+The report gives files/s, blocks/s, request latency (p50/p99 as served by
+the mock, injected delay included), 429s, malformed replies, resent payloads
+(requests beyond the first one per distinct payload – not the same thing as
+the ``batch_retries`` counter of :mod:`common.metrics`, which counts every
+attempt after a batch's first) and the share of prompt
+tokens served from the (simulated) prompt cache.  Nothing outside the
+scratch directory is written.
+
+``--startup`` instead times how long ``translate.py`` takes to import and
+load the game module in a fresh interpreter – what every offline mode pays
+before doing any work – and fails if an API‑only dependency got imported::
+
+    python -m common.benchmark bokuhime --startup
+"""
+
+from typing import Any, Dict, List
+import argparse, contextlib, json, os, random, shutil, statistics, subprocess, sys, tempfile, time
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from common.compact import check_markup  # type: ignore
+from common.luascan import scan  # type: ignore
+from common.mockapi import MockState, load_fixtures, serve  # type: ignore
+
+# must not be imported by offline modes (see translate.py)
+API_ONLY_MODULES = ("openai", "httpx", "dotenv", "prompt_toolkit", "alive_progress")
+
+
+def count_blocks(directory: str) -> int:
+    total = 0
+    for fn in os.listdir(directory):
+        if fn.lower().endswith(".json"):
+            with open(os.path.join(directory, fn), encoding="utf-8") as f:
+                total += len(scan(json.load(f).get("Text", "")))
+    return total
+
+
+def recorded_replies(game_mod) -> Dict[str, str]:
+    """``protected source → protected reply`` for every block of *game_mod* with a current translation.
+
+    Replies that lost markup are left out: the validator would reject them on
+    every retry, which a real model doesn't do.
+    """
+    if not hasattr(game_mod, "translated_pairs"):
+        return {}
+    with getattr(game_mod, "read_only", contextlib.nullcontext)():
+        pairs = game_mod.translated_pairs(limit=None)
+    return {src: reply for src, reply in pairs if not check_markup(src, reply)}
+
+
+def write_fixtures(path: str, replies: Dict[str, str]) -> None:
+    with open(path, "w", encoding="utf-8") as fh:
+        for source, reply in replies.items():
+            fh.write(json.dumps({"source": source, "reply": reply}, ensure_ascii=False) + "\n")
+
+
+def run(args: argparse.Namespace) -> Dict[str, Any]:
+    import translate  # type: ignore
+    game_mod = translate.load_game(args.game)
+    if args.fixtures:
+        replies = load_fixtures(args.fixtures)
+    else:
+        replies = recorded_replies(game_mod) if args.replies == "recorded" else {}
+
+    state = MockState(latency=args.latency, rate_429=args.rate_429, malformed=args.malformed,
+                      rpm=args.rpm, tpm=args.tpm, seed=args.seed, replies=replies)
+    server = serve("127.0.0.1", 0, state=state)
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{server.server_port}/v1"
+    os.environ.setdefault("OPENAI_API_KEY", "mock")
+    if args.stream:
+        os.environ["GPT_STREAM"] = "1"
+
+    work = tempfile.mkdtemp(prefix=f"bench-{args.game}-")
+    try:
+        sample_dir = os.path.join(work, "Export")
+        os.makedirs(sample_dir)
+        files = sorted(fn for fn in os.listdir(game_mod.EXPORT_DIR) if fn.lower().endswith(".json"))
+        sample = random.Random(args.seed).sample(files, min(args.sample, len(files)))
+        for fn in sample:
+            shutil.copy2(os.path.join(game_mod.EXPORT_DIR, fn), sample_dir)
+        game_mod.relocate(sample_dir, work)
+        blocks = count_blocks(sample_dir)
+
+        argv = sys.argv
+        sys.argv = ["translate.py", args.game, "all"]
+        t0 = time.perf_counter()
+        try:
+            translate.main()
+        finally:
+            sys.argv = argv
+        elapsed = time.perf_counter() - t0
+        written = len([fn for fn in os.listdir(game_mod.TRANSL_DIR) if fn.lower().endswith(".json")])
+    finally:
+        server.shutdown()
+        if args.keep:
+            print(f"Scratch directory kept: {work}")
+        else:
+            shutil.rmtree(work, ignore_errors=True)
+
+    stats = state.snapshot()
+    return {
+        "files": len(sample), "written": written, "blocks": blocks, "fixtures": len(replies),
+        "seconds": round(elapsed, 3),
+        "files_per_s": round(len(sample) / elapsed, 2), "blocks_per_s": round(blocks / elapsed, 1),
+        "requests": stats["requests"], "rate_limited": stats["rate_limited"], "malformed": stats["malformed"],
+        "resent_payloads": stats["requests"] - stats["distinct_payloads"],
+        "cache_hits": stats["cache_hits"],
+        "cached_share": round(stats["cached_tokens"] / stats["prompt_tokens"], 3) if stats["prompt_tokens"] else 0.0,
+        "latency_p50": round(stats["latency_p50"], 3), "latency_p99": round(stats["latency_p99"], 3),
+    }
+
+
+def startup(game: str, runs: int = 10) -> Dict[str, Any]:
+    """Import ``translate`` and load *game* in *runs* fresh interpreters."""
+    code = (
+        "import json, sys, translate; translate.load_game(%r); "
+        "print(json.dumps([m for m in %r if m in sys.modules]))" % (game, API_ONLY_MODULES)
+    )
+    env = {k: v for k, v in os.environ.items() if k != "OPENAI_API_KEY"}
+    times: List[float] = []
+    loaded: List[str] = []
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        out = subprocess.run([sys.executable, "-c", code], cwd=PROJECT_ROOT, env=env,
+                             capture_output=True, text=True, check=True).stdout
+        times.append(time.perf_counter() - t0)
+        loaded = json.loads(out.splitlines()[-1])
+    baseline = min(_interpreter_start() for _ in range(3))
+    return {
+        "runs": runs,
+        "startup_ms_min": round(min(times) * 1000, 1),
+        "startup_ms_median": round(statistics.median(times) * 1000, 1),
+        "interpreter_ms": round(baseline * 1000, 1),
+        "api_modules_loaded": loaded,
+    }
+
+
+def _interpreter_start() -> float:
+    t0 = time.perf_counter()
+    subprocess.run([sys.executable, "-c", "pass"], check=True)
+    return time.perf_counter() - t0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark `translate.py <game> all` against the mock API.")
+    parser.add_argument("game", nargs="?", default="bokuhime")
+    parser.add_argument("--sample", type=int, default=20, help="Export files to translate")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--latency", default="lognormal:0.8,0.4", help="See python -m common.mockapi --help")
+    parser.add_argument("--rate-429", type=float, default=0.0)
+    parser.add_argument("--malformed", type=float, default=0.0)
+    parser.add_argument("--rpm", type=int, default=0)
+    parser.add_argument("--tpm", type=int, default=0)
+    parser.add_argument("--stream", action="store_true", help="Run with GPT_STREAM=1")
+    parser.add_argument("--replies", choices=("recorded", "echo"), default="recorded",
+                        help="Answer with the game's existing translations or echo the source")
+    parser.add_argument("--fixtures", help="JSON-lines file of recorded {source, reply} pairs to answer with")
+    parser.add_argument("--write-fixtures", metavar="FILE", help="Save the recorded replies to FILE and exit")
+    parser.add_argument("--keep", action="store_true", help="Keep the scratch directory")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    parser.add_argument("--startup", action="store_true", help="Time translate.py start‑up instead")
+    parser.add_argument("--runs", type=int, default=10, help="Interpreters to start with --startup")
+    args = parser.parse_args()
+
+    if args.write_fixtures:
+        import translate  # type: ignore
+        replies = recorded_replies(translate.load_game(args.game))
+        write_fixtures(args.write_fixtures, replies)
+        print(f"{len(replies)} recorded replies written to {args.write_fixtures}")
+        return
+    report = startup(args.game, args.runs) if args.startup else run(args)
+    if args.json:
+        print(json.dumps(report))
+        return
+    width = max(map(len, report))
+    for k, v in report.items():
+        print(f"{k:<{width}}  {v}")
+    if report.get("api_modules_loaded"):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
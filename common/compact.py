@@ -0,0 +1,144 @@
+from __future__ import annotations
+
+"""Reversible prompt compaction for MSG blocks.
+
+Everything the model must copy verbatim costs tokens twice – once in the
+prompt and once in the reply.  :func:`compact` shrinks a block before it is
+sent:
+
+* a run of adjacent markup tags (``<sprite …><sprite …>``, ``</r><r=…>``)
+  becomes one ``<TAGn>`` placeholder;
+* a speaker header ``\\r\\n【ミナト】笑顔\\r\\n`` becomes just ``【ミナト】`` –
+  only the name is translated, the surrounding CRLFs and the pose label are
+  kept aside;
+* every other line break, with the indentation around it, becomes a single
+  space (the prompt asks the model to drop them anyway), and leading /
+  trailing whitespace is kept aside.
+
+:func:`expand` puts everything back in one regex pass over the reply and
+:func:`check_markup` verifies that the reply kept every placeholder and
+header before it is accepted.
+"""
+
+from typing import Counter, List, NamedTuple, Tuple
+import re
+from collections import Counter as _Counter
+
+from common.ratelimit import estimate_tokens  # type: ignore
+
+_HEADER = r"【[^】\r\n]+】"
+_COMPACT_RX = re.compile(
+    rf"(?P<header>(?:\r\n)?^(?P<indent>[ \t　]*)(?P<name>{_HEADER})(?P<pose>[^\r\n]*)(?:\r\n[ \t　]*)?)"
+    r"|(?P<tags>(?:<[^>]+>)+)"
+    # line breaks (but not the one right before a speaker header)
+    rf"|(?P<space>(?:[ \t　]*\r\n(?![ \t　]*{_HEADER}))+[ \t　]*)",
+    re.MULTILINE,
+)
+# placeholders are matched leniently (``<tag 3>``, ``< TAG3 >``) and by their
+# whole number, so ``<TAG1>`` can never eat the front of ``<TAG10>``
+_PLACEHOLDER = r"<\s*[Tt][Aa][Gg]\s*(\d+)\s*>"
+_EXPAND_RX = re.compile(rf"{_PLACEHOLDER}|{_HEADER}")
+_MARKUP_RX = re.compile(rf"{_PLACEHOLDER}|(?P<header>{_HEADER})|(?P<tag><[^>]*>)")
+_EDGE_WS = " \t　\r\n"
+
+
+class Compacted(NamedTuple):
+    """What :func:`compact` took out of a block."""
+    tags: List[str]                  # original tag run behind each ``<TAGn>``
+    headers: List[Tuple[str, str]]   # (text before, text after) the name of each speaker header
+    lead: str                        # leading whitespace
+    trail: str                       # trailing whitespace
+
+
+def compact(text: str) -> Tuple[str, Compacted]:
+    """``text → (safe_text, meta)``; see the module docstring."""
+    tags: List[str] = []
+    headers: List[Tuple[str, str]] = []
+
+    def repl(m: re.Match[str]) -> str:
+        if m.group("header") is not None:
+            before = m.group(0)[:m.start("name") - m.start()]
+            after = m.group(0)[m.end("name") - m.start():]
+            headers.append((before, after))
+            return m.group("name")
+        if m.group("tags") is not None:
+            tags.append(m.group(0))
+            return f"<TAG{len(tags) - 1}>"
+        return " "
+
+    body = text.strip(_EDGE_WS)
+    start = len(text) - len(text.lstrip(_EDGE_WS))
+    lead, trail = text[:start], text[start + len(body):]
+    safe = _COMPACT_RX.sub(repl, body).strip(" ")
+    if headers and body.startswith("【"):
+        # a leading header keeps the CRLF in front of it even if the reply
+        # puts something before the name
+        headers[0] = (lead + headers[0][0], headers[0][1])
+        lead = ""
+    return safe, Compacted(tags, headers, lead, trail)
+
+
+def expand(safe: str, meta: Compacted) -> str:
+    """Inverse of :func:`compact` for a (translated) safe text.
+
+    Unknown ``<TAGn>`` indices and surplus ``【…】`` are left as they are.
+    """
+    n_header = 0
+
+    def repl(m: re.Match[str]) -> str:
+        nonlocal n_header
+        if m.group(1) is not None:
+            i = int(m.group(1))
+            return meta.tags[i] if i < len(meta.tags) else m.group(0)
+        if n_header >= len(meta.headers):
+            return m.group(0)
+        before, after = meta.headers[n_header]
+        n_header += 1
+        return before + m.group(0) + after
+
+    return meta.lead + _EXPAND_RX.sub(repl, safe) + meta.trail
+
+
+def markup(safe: str) -> Tuple[Counter[int], int, List[str]]:
+    """``(placeholder multiset, speaker headers, other tags)`` of a safe text."""
+    placeholders: Counter[int] = _Counter()
+    headers = 0
+    other: List[str] = []
+    for m in _MARKUP_RX.finditer(safe):
+        if m.group(1) is not None:
+            placeholders[int(m.group(1))] += 1
+        elif m.group("header") is not None:
+            headers += 1
+        else:
+            other.append(m.group("tag"))
+    return placeholders, headers, other
+
+
+def check_markup(source: str, reply: str) -> str | None:
+    """Why *reply* (a translated safe text) can't stand in for *source*, or None.
+
+    Every ``<TAGn>`` of the source must come back exactly as often, the
+    number of ``【…】`` speaker headers must match, and the reply must not
+    invent raw tags of its own.
+    """
+    want, want_headers, _ = markup(source)
+    got, got_headers, invented = markup(reply)
+    problems: List[str] = []
+    missing = want - got
+    extra = got - want
+    if missing:
+        problems.append("missing " + ", ".join(f"<TAG{i}>" + (f"×{n}" if n > 1 else "") for i, n in sorted(missing.items())))
+    if extra:
+        problems.append("extra " + ", ".join(f"<TAG{i}>" + (f"×{n}" if n > 1 else "") for i, n in sorted(extra.items())))
+    if got_headers != want_headers:
+        problems.append(f"{got_headers} speaker header(s), expected {want_headers}")
+    if invented:
+        problems.append("unexpected tag(s) " + " ".join(invented[:3]))
+    return "; ".join(problems) or None
+
+
+def savings(blocks: List[str]) -> Tuple[int, int]:
+    """Estimated prompt tokens of *blocks* ``(as is, compacted)``."""
+    before = sum(estimate_tokens(b) for b in blocks)
+    after = sum(estimate_tokens(compact(b)[0]) for b in blocks)
+    return before, after
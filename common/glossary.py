@@ -0,0 +1,175 @@
+from __future__ import annotations
+
+"""Glossary consistency checks over source / translation block pairs.
+
+The canonical spellings live in each game's ``SYSTEM_PROMPT``;
+:func:`parse_glossary` pulls them out as ``{japanese: english}`` and
+:func:`name_aliases` adds the given names and surnames on their own
+(``伊草ミナト → Minato Ikusa`` also yields ``ミナト → Minato`` and
+``伊草 → Ikusa``), which is how most lines refer to people.
+
+:class:`Glossary` compiles every term into one Aho–Corasick automaton, so a
+source block is scanned once whatever the number of terms; :meth:`check`
+then reports the terms whose canonical English is missing from the
+translation::
+
+    glossary = Glossary({**parse_glossary(SYSTEM_PROMPT), ...})
+    glossary.check("【ミナト】はぁ……", "【Minado】Haa...")  # → [("ミナト", "Minato")]
+
+Characters (the ``♂`` / ``♀`` entries, see :func:`parse_people`) are often
+rendered as a pronoun in natural English, so a missing name is not
+reported when the translation uses a pronoun of that character's gender
+(never for the name in a ``【…】`` speaker header).
+"""
+
+from collections import deque
+from typing import Dict, Iterator, List, Mapping, Sequence, Tuple
+import re
+
+# "• 伊草ミナト   (♂ | 1st-year boys div.)     → Minato Ikusa"
+_ENTRY_RX = re.compile(r"^\s*•\s*(?P<jp>[^\s(→]+)\s*(?:\([^)]*\))?\s*→\s*(?P<en>.+?)\s*$", re.MULTILINE)
+_NUMBERED_RX = re.compile(r"^(?P<base>.+?)\d+(?:/\d+)*$")          # "マスク先輩1/2/3"
+_FULL_NAME_RX = re.compile(r"^(?P<surname>[㐀-鿿々]+)(?P<given>[ァ-ヺー]+)$")
+_PRONOUN_RX = {
+    "♂": re.compile(r"\b(?:he|him|his|himself)\b", re.I),
+    "♀": re.compile(r"\b(?:she|her|hers|herself)\b", re.I),
+}
+
+
+def _is_katakana(c: str) -> bool:
+    return "ァ" <= c <= "ヺ" or c == "ー"
+
+
+def _entries(system_prompt: str) -> Iterator[Tuple[str, str, str]]:
+    """``(japanese, english, gender mark or "")`` for every glossary line of a prompt."""
+    for m in _ENTRY_RX.finditer(system_prompt):
+        jp, en = m.group("jp").strip("♂♀"), m.group("en").strip()
+        numbered = _NUMBERED_RX.match(jp)
+        if numbered and "#" in en:
+            jp, en = numbered.group("base"), en.split("#")[0].strip()
+        if jp and en:
+            yield jp, en, next((g for g in "♂♀" if g in m.group(0)), "")
+
+
+def parse_glossary(system_prompt: str) -> Dict[str, str]:
+    """``{japanese: english}`` for every ``• 日本語 (…) → English`` line of a prompt.
+
+    Gender marks are dropped and numbered entries (``♂マスク先輩1/2/3 →
+    Mask Senpai #1 / #2 / #3``) collapse to their common stem.
+    """
+    return {jp: en for jp, en, _gender in _entries(system_prompt)}
+
+
+def parse_people(system_prompt: str) -> Dict[str, str]:
+    """``{japanese: "♂" | "♀"}`` for the characters of a prompt and their name parts.
+
+    A surname shared by characters of both genders (``伊草``) is left out.
+    """
+    entries = [(jp, en, g) for jp, en, g in _entries(system_prompt) if g]
+    people = {jp: g for jp, _en, g in entries}
+    for jp, en, g in entries:
+        for alias in name_aliases({jp: en}):
+            people[alias] = g if people.get(alias, g) == g else ""
+    return {jp: g for jp, g in people.items() if g}
+
+
+def name_aliases(terms: Mapping[str, str]) -> Dict[str, str]:
+    """Given names and surnames of the ``漢字カタカナ → Given Surname`` entries."""
+    aliases: Dict[str, str] = {}
+    for jp, en in terms.items():
+        m = _FULL_NAME_RX.match(jp)
+        words = en.split()
+        if m is None or len(words) != 2:
+            continue
+        aliases.setdefault(m.group("given"), words[0])
+        aliases.setdefault(m.group("surname"), words[1])
+    return {jp: en for jp, en in aliases.items() if jp not in terms}
+
+
+class Glossary:
+    """Aho–Corasick matcher over the Japanese side of a glossary."""
+
+    def __init__(self, terms: Mapping[str, str | Sequence[str]], people: Mapping[str, str] | None = None):
+        # accepted English renderings per term (any one of them will do)
+        self.terms: Dict[str, Tuple[str, ...]] = {
+            jp: (en,) if isinstance(en, str) else tuple(en) for jp, en in terms.items() if jp
+        }
+        # term → gender mark of the characters a pronoun may stand in for
+        self.people: Dict[str, str] = dict(people or {})
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[str]] = [[]]
+        for jp in self.terms:
+            state = 0
+            for c in jp:
+                nxt = self._goto[state].get(c)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[state][c] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                state = nxt
+            self._out[state].append(jp)
+        # breadth‑first failure links; outputs of the fallback state are inherited
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for c, nxt in self._goto[state].items():
+                queue.append(nxt)
+                f = self._fail[state]
+                while f and c not in self._goto[f]:
+                    f = self._fail[f]
+                self._fail[nxt] = self._goto[f].get(c, 0) if self._goto[f].get(c, 0) != nxt else 0
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def find(self, text: str) -> List[Tuple[int, int, str]]:
+        """Non‑overlapping ``(start, end, term)`` matches, leftmost‑longest first.
+
+        All‑katakana terms only match as whole katakana words, so ``リラ``
+        is not found inside ``ゴリラ``.
+        """
+        hits: List[Tuple[int, int, str]] = []
+        state = 0
+        for i, c in enumerate(text):
+            while state and c not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(c, 0)
+            for jp in self._out[state]:
+                start, end = i + 1 - len(jp), i + 1
+                if _is_katakana(jp[0]) and start > 0 and _is_katakana(text[start - 1]):
+                    continue
+                if _is_katakana(jp[-1]) and end < len(text) and _is_katakana(text[end]):
+                    continue
+                hits.append((start, end, jp))
+        hits.sort(key=lambda h: (h[0], -h[1]))
+        chosen: List[Tuple[int, int, str]] = []
+        last = 0
+        for h in hits:
+            if h[0] >= last:
+                chosen.append(h)
+                last = h[1]
+        return chosen
+
+    def check(self, source: str, translation: str) -> List[Tuple[str, str]]:
+        """``(term, expected english)`` for each term in *source* not rendered in *translation*.
+
+        Missing :attr:`people` are let through when *translation* uses a
+        pronoun of their gender instead, unless the name is a speaker header.
+        """
+        folded = translation.casefold()
+        missing: List[Tuple[str, str]] = []
+        seen = set()
+        for start, _end, jp in self.find(source):
+            if jp in seen:
+                continue
+            seen.add(jp)
+            accepted = self.terms[jp]
+            if any(en.casefold() in folded for en in accepted):
+                continue
+            gender = self.people.get(jp)
+            header = start > 0 and source[start - 1] == "【"
+            if gender and not header and _PRONOUN_RX[gender].search(translation):
+                continue
+            missing.append((jp, accepted[0]))
+        return missing
@@ -1,5 +1,4 @@
 from __future__ import annotations
-import functools
 
 """Thin OpenAI helper wrapping chat‑completions with JSON I/O + rate‑limits.
 
@@ -7,16 +6,76 @@ This version has been simplified to work with the updated ``game.py``:
 * ``protect`` must now return **two** values: (safe_text, meta).
 * ``restore`` must accept exactly those two values in the same order.
 * Sprite‑map handling has been removed (not needed).
+
+Requests go through a native ``openai.AsyncOpenAI`` client so that the
+``all`` mode can keep many files in flight without one thread per call:
+* every event loop gets one async client backed by a bounded connection pool;
+* at most ``MAX_CONCURRENCY`` chat requests are in flight at once;
+* rate‑limit backoff uses ``asyncio.sleep`` instead of blocking the loop;
+* every request is admitted through the process‑wide ``governor``
+  (see ``common.ratelimit``) so concurrent files share one RPM/TPM budget;
+* an optional ``TranslationMemory`` (see ``common.memory``) is consulted
+  first, so only blocks never seen before reach the API;
+* the blocks of one file are packed into batches of at most
+  ``MAX_BATCH_TOKENS`` estimated tokens which are translated concurrently;
+* optional hedging re‑sends a request that is slower than the
+  ``HEDGE_PERCENTILE`` of recent latencies and keeps whichever reply wins;
+* repeated failures move a batch down an ordered list of fallback models;
+* with ``stream`` the reply is parsed while it arrives (``common.jsonstream``)
+  and each block is handed back as soon as its value is complete;
+* an optional ``validate`` callable rejects replies that lost markup, and
+  just those blocks are sent again;
+* queue wait, network time, token usage, 429s and retries are recorded in
+  :data:`common.metrics.metrics`;
+* every request starts with the same byte‑identical prefix – system prompt,
+  then an optional shared *context* (few‑shot examples, episode notes) – and
+  only the JSON payload varies at the end, so the provider's prompt cache can
+  serve the prefix.  Requests carry a ``prompt_cache_key`` derived from the
+  prefix, and the first request of a cold prefix is sent alone so the ones
+  behind it find it cached.
+
+``openai`` and ``httpx`` are only imported when the first client is built,
+so modules that merely need :func:`request_body` or :func:`pack_batches`
+load in a few milliseconds and need no API key.
 """
 
-from typing import Any, Dict, List, Tuple
-import os, json, random, string, logging, time, asyncio
+from typing import Any, Callable, Deque, Dict, List, NamedTuple, Sequence, Tuple
+import os, json, random, string, logging, time, asyncio, hashlib, weakref
+from collections import deque
 
-import openai  # type: ignore
 from dotenv import load_dotenv  # type: ignore
 
+from common.jsonstream import ObjectStream  # type: ignore
+from common.memory import TranslationMemory  # type: ignore
+from common.metrics import metrics  # type: ignore
+from common.ratelimit import RateLimitGovernor, estimate_prompt_tokens, estimate_request_tokens, estimate_tokens  # type: ignore
+
 load_dotenv()
-client = openai.OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+
+# Upper bound on concurrent chat requests / pooled HTTP connections.
+MAX_CONCURRENCY = int(os.getenv("GPT_MAX_CONCURRENCY", "16"))
+MAX_CONNECTIONS = int(os.getenv("GPT_MAX_CONNECTIONS", "32"))
+# Estimated input tokens per request when a file is split into batches.
+MAX_BATCH_TOKENS = int(os.getenv("GPT_BATCH_TOKENS", "2000"))
+# Hedge a request once it is slower than this latency percentile (0 = off).
+HEDGE_PERCENTILE = float(os.getenv("GPT_HEDGE_PERCENTILE", "0"))
+# Failed attempts on one model before a batch moves to the next fallback.
+FALLBACK_AFTER = 2
+# Stream replies and hand back blocks as they complete.
+STREAM = os.getenv("GPT_STREAM", "0") == "1"
+# Send the first request of a cold prompt prefix alone and hold back the
+# others with that prefix until it has answered (and warmed the cache).
+CACHE_WARMUP = os.getenv("GPT_CACHE_WARMUP", "1") == "1"
+# Treat a prefix as cold again after this long without a request (the
+# provider evicts idle prefixes after a few minutes).
+PREFIX_TTL = 300.0
+
+# One governor for the whole process; the limits are refined from the
+# ``x-ratelimit-limit-*`` headers as soon as the first response arrives.
+governor = RateLimitGovernor(
+    rpm=int(os.getenv("OPENAI_RPM", "500")),
+    tpm=int(os.getenv("OPENAI_TPM", "200000")),
+)
 
 # ───────────────────────────  UTILS  ─────────────────────────────
 
@@ -39,26 +98,533 @@ def _parse_reset(val: str | None) -> float:
         return 0.0
 
 
+# ───────────────────────  ASYNC CLIENT POOL  ─────────────────────
+# ``httpx.AsyncClient`` and ``asyncio.Semaphore`` are bound to the loop they
+# were first used on, so keep one (client, semaphore) pair per running loop.
+# ``process_file`` / ``translate_blocks`` each spin up their own loop.
+_loop_state: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Tuple[Any, asyncio.Semaphore]]" = weakref.WeakKeyDictionary()
+
+
+def configure(*, max_concurrency: int | None = None, max_connections: int | None = None) -> None:
+    """Override the concurrency / pool limits (affects clients created afterwards)."""
+    global MAX_CONCURRENCY, MAX_CONNECTIONS
+    if max_concurrency is not None:
+        MAX_CONCURRENCY = max(1, max_concurrency)
+    if max_connections is not None:
+        MAX_CONNECTIONS = max(1, max_connections)
+    _loop_state.clear()
+
+
+_client = None
+
+
+def _openai():
+    """The ``openai`` module, imported on first use (it takes ~0.5 s)."""
+    import openai  # type: ignore
+    return openai
+
+
+def sync_client():
+    """The blocking ``openai.OpenAI`` client, built on first use."""
+    global _client
+    if _client is None:
+        _client = _openai().OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+    return _client
+
+
+def __getattr__(name: str):
+    # ``gpt.client`` used to be created at import time
+    if name == "client":
+        return sync_client()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def async_client():
+    """The ``AsyncOpenAI`` client of the running event loop."""
+    return _async_state()[0]
+
+
+def _async_state() -> Tuple[Any, asyncio.Semaphore]:
+    loop = asyncio.get_running_loop()
+    state = _loop_state.get(loop)
+    if state is None:
+        openai = _openai()
+        # build the limits with the same httpx openai itself was built against
+        Limits = type(openai.DEFAULT_CONNECTION_LIMITS)
+        http_client = openai.DefaultAsyncHttpxClient(
+            limits=Limits(max_connections=MAX_CONNECTIONS, max_keepalive_connections=MAX_CONNECTIONS),
+        )
+        # retries are handled below so 429s go through our own backoff
+        aclient = openai.AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"), http_client=http_client, max_retries=0)
+        state = (aclient, asyncio.Semaphore(MAX_CONCURRENCY))
+        _loop_state[loop] = state
+    return state
+
+
 # ──────────────────────  CORE WRAPPERS  ──────────────────────────
 
-def _chat_json(system_prompt: str, payload: Dict[str, str], *, model: str):
-    messages = [
-        {"role": "system", "content": system_prompt},
-        {"role": "user", "content": json.dumps(payload, ensure_ascii=False)},
-    ]
-    return client.chat.completions.create(
-        model=model,
-        response_format={"type": "json_object"},
-        messages=messages,
+def _messages(
+    system_prompt: str, payload: Dict[str, str], context: str | None = None, note: str | None = None,
+) -> List[Dict[str, str]]:
+    # most‑shared first: everything before the user message is the cacheable prefix,
+    # so a per‑request *note* goes after the payload
+    messages = [{"role": "system", "content": system_prompt}]
+    if context:
+        messages.append({"role": "system", "content": context})
+    content = json.dumps(payload, ensure_ascii=False, separators=(",", ":"))
+    messages.append({"role": "user", "content": f"{content}\n\n{note}" if note else content})
+    return messages
+
+
+def prefix_key(system_prompt: str, *, model: str, context: str | None = None) -> str:
+    """Short hash identifying the cacheable prefix of a request."""
+    return hashlib.sha256(f"{model}\0{system_prompt}\0{context or ''}".encode("utf-8")).hexdigest()[:16]
+
+
+def request_body(
+    system_prompt: str, payload: Dict[str, str], *, model: str, context: str | None = None,
+    note: str | None = None,
+) -> Dict[str, Any]:
+    """Chat‑completions parameters for one JSON translation request.
+
+    *note* is appended to the user message, after the payload, and is not
+    part of the cached prefix.
+    """
+    return {
+        "model": model,
+        "response_format": {"type": "json_object"},
+        "messages": _messages(system_prompt, payload, context, note),
+        # routes requests with the same prefix to the same cache
+        "prompt_cache_key": prefix_key(system_prompt, model=model, context=context),
+    }
+
+
+def _chat_json(system_prompt: str, payload: Dict[str, str], *, model: str, context: str | None = None):
+    return sync_client().chat.completions.create(**request_body(system_prompt, payload, model=model, context=context))
+
+
+# prefix key → (warm event, monotonic time of the last request), per event loop
+_prefixes: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, List[Any]]]" = weakref.WeakKeyDictionary()
+
+
+async def _prefix_gate(key: str) -> Callable[[], None] | None:
+    """Wait while another request is warming prefix *key*.
+
+    Returns a callback if this request has to warm the prefix itself; it
+    must be called once the request is over (whatever its outcome).
+    """
+    entries = _prefixes.setdefault(asyncio.get_running_loop(), {})
+    entry = entries.get(key)
+    now = time.monotonic()
+    if entry is None or (entry[0].is_set() and now - entry[1] > PREFIX_TTL):
+        event = asyncio.Event()
+        entries[key] = [event, now]
+
+        def warmed() -> None:
+            event.set()
+            entries[key][1] = time.monotonic()
+        return warmed
+    await entry[0].wait()
+    entry[1] = time.monotonic()
+    return None
+
+
+def _record_usage(usage: Any, key: str, model: str) -> None:
+    metrics.record_usage(usage, model)
+    details = getattr(usage, "prompt_tokens_details", None)
+    logging.debug("prefix %s: %s of %s prompt tokens cached", key,
+                  getattr(details, "cached_tokens", 0) or 0, getattr(usage, "prompt_tokens", "?"))
+
+
+async def _chat_json_async(
+    system_prompt: str,
+    payload: Dict[str, str],
+    *,
+    model: str,
+    context: str | None = None,
+    note: str | None = None,
+    sent: asyncio.Event | None = None,
+    gated: bool = True,
+):
+    """Send one JSON chat request through the shared governor.
+
+    *sent* is set once the request has left the queues (prefix gate,
+    governor, semaphore) and is on the wire; ``gated=False`` skips the
+    prefix gate.  Returns ``(completion, response_headers)``.
+    """
+    aclient, sem = _async_state()
+    prompt = system_prompt + (context or "") + (note or "")
+    estimate = estimate_request_tokens(prompt, payload)
+    key = prefix_key(system_prompt, model=model, context=context)
+    queued = time.perf_counter()
+    warmed = await _prefix_gate(key) if CACHE_WARMUP and gated else None
+    try:
+        await governor.acquire(estimate)
+        async with sem:
+            if sent is not None:
+                sent.set()
+            t0 = time.perf_counter()
+            metrics.add_time("api_queue", t0 - queued)
+            metrics.count("requests")
+            metrics.count("estimated_prompt_tokens", estimate_prompt_tokens(prompt, payload))
+            try:
+                raw = await aclient.chat.completions.with_raw_response.create(
+                    **request_body(system_prompt, payload, model=model, context=context, note=note),
+                )
+            finally:
+                metrics.add_time("api_network", time.perf_counter() - t0)
+            _latencies.append(time.perf_counter() - t0)
+    finally:
+        if warmed is not None:
+            warmed()
+    resp = raw.parse()
+    governor.update(raw.headers)
+    usage = getattr(resp, "usage", None)
+    _record_usage(usage, key, model)
+    governor.settle(estimate, getattr(usage, "total_tokens", None))
+    return resp, raw.headers
+
+
+class _Reply(NamedTuple):
+    """A streamed completion, reassembled."""
+    content: str
+    usage: Any
+
+
+async def _chat_json_stream(
+    system_prompt: str,
+    payload: Dict[str, str],
+    *,
+    model: str,
+    on_pair: Callable[[str, str], None],
+    context: str | None = None,
+    note: str | None = None,
+):
+    """Streaming :func:`_chat_json_async`: ``on_pair(key, text)`` fires per finished member.
+
+    Returns ``(reply, response_headers)`` once the stream has ended; the reply
+    holds the full content so the caller can still validate it as a whole.
+    """
+    aclient, sem = _async_state()
+    prompt = system_prompt + (context or "") + (note or "")
+    estimate = estimate_request_tokens(prompt, payload)
+    prefix = prefix_key(system_prompt, model=model, context=context)
+    queued = time.perf_counter()
+    warmed = await _prefix_gate(prefix) if CACHE_WARMUP else None
+    parser = ObjectStream()
+    parts: List[str] = []
+    usage = None
+    try:
+        await governor.acquire(estimate)
+        async with sem:
+            t0 = time.perf_counter()
+            metrics.add_time("api_queue", t0 - queued)
+            metrics.count("requests")
+            metrics.count("estimated_prompt_tokens", estimate_prompt_tokens(prompt, payload))
+            metrics.count("streamed")
+            try:
+                raw = await aclient.chat.completions.with_raw_response.create(
+                    **request_body(system_prompt, payload, model=model, context=context, note=note),
+                    stream=True,
+                    stream_options={"include_usage": True},
+                )
+                governor.update(raw.headers)
+                async for chunk in raw.parse():
+                    usage = getattr(chunk, "usage", None) or usage
+                    if not chunk.choices:
+                        continue
+                    delta = chunk.choices[0].delta.content or ""
+                    parts.append(delta)
+                    if not parser.broken:
+                        for key, text in parser.feed(delta):
+                            on_pair(key, text)
+            finally:
+                metrics.add_time("api_network", time.perf_counter() - t0)
+            _latencies.append(time.perf_counter() - t0)
+    finally:
+        if warmed is not None:
+            warmed()
+    _record_usage(usage, prefix, model)
+    governor.settle(estimate, getattr(usage, "total_tokens", None))
+    return _Reply("".join(parts), usage), raw.headers
+
+
+# ───────────────────────  REQUEST HEDGING  ───────────────────────
+_latencies: Deque[float] = deque(maxlen=256)  # recent successful request latencies
+
+
+def _hedge_deadline(percentile: float) -> float | None:
+    """Latency at *percentile* of recent requests, or None without enough samples."""
+    if not 0 < percentile < 1 or len(_latencies) < 20:
+        return None
+    ordered = sorted(_latencies)
+    return ordered[min(len(ordered) - 1, int(percentile * len(ordered)))]
+
+
+async def _chat_json_hedged(
+    system_prompt: str, payload: Dict[str, str], *, model: str, percentile: float, context: str | None = None,
+    note: str | None = None,
+):
+    """:func:`_chat_json_async`, duplicated once if it outlives the percentile deadline.
+
+    The deadline runs from the moment the request is actually sent, since
+    :data:`_latencies` only holds network time; queueing for the governor or
+    a free slot never triggers a hedge.  No copy is sent while the governor
+    is throttled or every slot is busy – it would only queue behind the same
+    budget.  Whichever copy answers first wins and the other is cancelled;
+    if one copy fails the other is still awaited.
+    """
+    deadline = _hedge_deadline(percentile)
+    sent = asyncio.Event()
+    first = asyncio.ensure_future(
+        _chat_json_async(system_prompt, payload, model=model, context=context, note=note, sent=sent),
     )
+    if deadline is None:
+        return await first
+    tasks = {first}
+    try:
+        on_wire = asyncio.ensure_future(sent.wait())
+        try:
+            await asyncio.wait({first, on_wire}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            on_wire.cancel()
+        done = {first} if first.done() else set()
+        if not done:
+            done, _pending = await asyncio.wait(tasks, timeout=deadline)
+        _aclient, sem = _async_state()
+        if not done and (governor.throttled or sem.locked()):
+            logging.debug("Not hedging request of %d blocks: rate limit or concurrency exhausted", len(payload))
+        elif not done:
+            logging.debug("Hedging request of %d blocks after %.1f s", len(payload), deadline)
+            metrics.count("hedged")
+            tasks.add(asyncio.ensure_future(
+                _chat_json_async(system_prompt, payload, model=model, context=context, note=note, gated=False),
+            ))
+        error: BaseException | None = None
+        while tasks:
+            done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            for t in done:
+                if t.exception() is None:
+                    return t.result()
+                error = t.exception()
+        assert error is not None
+        raise error
+    finally:
+        for t in tasks:
+            t.cancel()
 
 
 # ─────────────────────  BLOCK TRANSLATION  ───────────────────────
 
-TranslateResult = Tuple[List[str], bool]  # (translated_blocks, all_success)
+class TranslateResult(NamedTuple):
+    blocks: List[str]          # translated blocks (source text where failed)
+    success: bool              # every block translated
+    failures: Dict[int, str]   # block index → reason it could not be translated
+
+
+def pack_batches(payload: Dict[str, str], max_tokens: int) -> List[Dict[str, str]]:
+    """Split *payload* in key order into batches of ≤ *max_tokens* estimated tokens.
+
+    A single block larger than the budget still gets a batch of its own.
+    """
+    batches: List[Dict[str, str]] = []
+    cur: Dict[str, str] = {}
+    cur_tokens = 0
+    for k, v in payload.items():
+        cost = estimate_tokens(v) + 4  # key, quotes, separators
+        if cur and cur_tokens + cost > max_tokens:
+            batches.append(cur)
+            cur, cur_tokens = {}, 0
+        cur[k] = v
+        cur_tokens += cost
+    if cur:
+        batches.append(cur)
+    return batches
+
+
+async def _translate_batch(
+    batch: Dict[str, str],
+    *,
+    system_prompt: str,
+    models: Sequence[str],
+    max_retries: int,
+    failures: Dict[str, str],
+    hedge_percentile: float = 0.0,
+    fails: int = 0,
+    stream: bool = False,
+    on_done: Callable[[str, str], None] | None = None,
+    validate: Callable[[str, str], str | None] | None = None,
+    context: str | None = None,
+    review: Callable[[str, str], str | None] | None = None,
+    reviewed: Dict[str, str] | None = None,
+) -> Dict[str, str]:
+    """Translate one batch, bisecting it whenever a reply is unusable.
+
+    A reply that can't be parsed or returns none of the requested keys splits
+    the batch in two and each half is retried on its own, so a single
+    poisoned block ends up isolated instead of costing the whole batch on
+    every retry.  Partial replies just shrink the batch to the missing keys.
+
+    *models* is the primary model followed by its fallbacks; every
+    ``FALLBACK_AFTER`` failed attempts (*fails*, carried into the halves) move
+    the batch one model further down the list.
+
+    ``on_done(key, text)`` is called once per completed key – with *stream*
+    while the reply is still arriving (streamed requests are not hedged).
+
+    ``validate(source, reply)`` returns why a reply is unacceptable (or None);
+    rejected keys stay in the batch and are re‑sent on the next attempt.
+
+    ``review(source, reply)`` is a softer check: it returns a hint for the
+    model (or None).  A flagged key is re‑prompted once with its hint added
+    after the payload and the second reply is taken as is; if that attempt
+    never comes back the first reply is kept.  *reviewed* (``key → first
+    reply``) carries that state into bisected halves.
+
+    *context* is sent after the system prompt as part of the shared prefix.
+
+    Returns the completed keys; every other key of *batch* is recorded in
+    *failures* with the last reason it failed.
+    """
+    remaining = dict(batch)  # copy
+    completed: Dict[str, str] = {}
+    attempt = 0
+    reason = "not attempted"
+
+    rejected: Dict[str, str] = {}  # key → why its last reply failed validation
+    reviewed = {} if reviewed is None else reviewed  # key → first reply, flagged by review
+    hints: Dict[str, str] = {}     # key → what review flagged in that reply
+    flagged: set = set()           # keys sent back for review in this attempt
+
+    def take(k: str, v: Any) -> None:
+        # (a streamed reply is taken twice: per member, then as a whole)
+        if k in remaining and k not in flagged and isinstance(v, str):
+            why = validate(remaining[k], v) if validate is not None else None
+            if why:
+                rejected[k] = why
+                return
+            rejected.pop(k, None)
+            if review is not None and k not in reviewed:
+                hint = review(remaining[k], v)
+                if hint:
+                    reviewed[k] = v
+                    hints[k] = hint
+                    flagged.add(k)
+                    return
+            hints.pop(k, None)
+            completed[k] = v
+            remaining.pop(k)
+            if on_done is not None:
+                on_done(k, v)
+
+    while remaining and attempt < max_retries:
+        attempt += 1
+        if attempt > 1:
+            metrics.count("batch_retries")
+        before = len(remaining)
+        flagged.clear()
+        level = min(fails // FALLBACK_AFTER, len(models) - 1)
+        model = models[level]
+        if level and fails % FALLBACK_AFTER == 0:
+            from common.planner import price_ratio  # type: ignore
+            ratio = price_ratio(model, models[0])
+            logging.warning("Falling back from %s to %s for %d blocks%s", models[0], model, len(remaining),
+                            f" (×{ratio:.1f} the price)" if ratio is not None else " (price unknown)")
+            metrics.count("fallbacks")
+
+        note = None
+        if hints:
+            # after the payload, so the re‑prompt shares the cached prefix
+            metrics.count("review_reprompts", len(hints))
+            note = "Your previous reply to these keys needs another look:\n" + "\n".join(
+                f'"{k}": {hint}' for k, hint in hints.items() if k in remaining)
+        try:
+            if stream:
+                resp, _hdrs = await _chat_json_stream(
+                    system_prompt, remaining, model=model, on_pair=take, context=context, note=note,
+                )
+            elif hedge_percentile:
+                resp, _hdrs = await _chat_json_hedged(
+                    system_prompt, remaining, model=model, percentile=hedge_percentile, context=context, note=note,
+                )
+            else:
+                resp, _hdrs = await _chat_json_async(system_prompt, remaining, model=model, context=context, note=note)
+        except _openai().RateLimitError as e:  # type: ignore[attr-defined]
+            # the governor holds back every caller until the limit resets
+            rl = getattr(getattr(e, "response", None), "headers", None) or {}
+            reset = max(
+                _parse_reset(rl.get("x-ratelimit-reset-requests")),
+                _parse_reset(rl.get("x-ratelimit-reset-tokens")),
+            )
+            governor.penalize(rl, attempt, reset)
+            metrics.count("rate_limited")
+            reason = "rate limited"
+            continue
+        except Exception as exc:
+            logging.exception("GPT call failed (%s): %s", model, exc)
+            metrics.count("api_errors")
+            reason = f"API error: {exc}"
+            # retrying the same model won't help; go straight to the next one
+            fails = (level + 1) * FALLBACK_AFTER
+            if level + 1 >= len(models):
+                break
+            continue
 
+        # —— merge GPT output ——
+        try:
+            content = resp.content if stream else resp.choices[0].message.content  # type: ignore[index]
+            out = json.loads(content)
+            if not isinstance(out, dict):
+                raise ValueError("reply is not a JSON object")
+        except (json.JSONDecodeError, TypeError, ValueError) as exc:
+            logging.warning("Bad JSON from GPT (%d blocks): %s", len(remaining), exc)
+            metrics.count("malformed")
+            reason = f"bad JSON reply: {exc}"
+            out = {}
+        else:
+            reason = "missing from reply"
 
-def translate_blocks(
+        for k, v in out.items():
+            take(k, v)
+
+        stuck = len(remaining) == before and not flagged
+        if remaining and stuck:
+            fails += 1
+        if remaining and stuck and len(remaining) > 1:
+            # no progress at all → bisect and retry the halves independently
+            keys = list(remaining)
+            mid = len(keys) // 2
+            halves = ({k: remaining[k] for k in keys[:mid]}, {k: remaining[k] for k in keys[mid:]})
+            logging.info("Bisecting batch of %d blocks after unusable reply", len(keys))
+            metrics.count("bisections")
+            for done in await asyncio.gather(*(
+                _translate_batch(
+                    h, system_prompt=system_prompt, models=models, max_retries=max_retries,
+                    failures=failures, hedge_percentile=hedge_percentile, fails=fails,
+                    stream=stream, on_done=on_done, validate=validate, context=context,
+                    review=review, reviewed=reviewed,
+                )
+                for h in halves
+            )):
+                completed.update(done)
+            return completed
+
+    # flagged by review but the re‑prompt never came back: keep the first reply
+    for k in [k for k in remaining if k in reviewed]:
+        completed[k] = reviewed[k]
+        remaining.pop(k)
+        if on_done is not None:
+            on_done(k, completed[k])
+
+    if rejected:
+        metrics.count("rejected", len(rejected))
+        logging.info("%d block(s) rejected by validation, e.g. %s", len(rejected), next(iter(rejected.values())))
+    for k in remaining:
+        failures[k] = f"invalid reply: {rejected[k]}" if k in rejected else reason
+    return completed
+
+
+async def translate_blocks_async(
     blocks: List[str],
     *,
     system_prompt: str,
@@ -66,13 +632,45 @@ def translate_blocks(
     protect,
     restore,
     max_retries: int = 3,
-    min_remaining_requests: int = 5,
-    min_remaining_tokens: int = 5000,
+    memory: TranslationMemory | None = None,
+    max_batch_tokens: int | None = None,
+    on_block: Callable[[int, str], None] | None = None,
+    fallback_models: Sequence[str] = (),
+    hedge_percentile: float | None = None,
+    stream: bool | None = None,
+    validate: Callable[[str, str], str | None] | None = None,
+    context: str | None = None,
+    review: Callable[[str, str], str | None] | None = None,
 ) -> TranslateResult:
     """Translate each *block* via GPT while enforcing rate‑limits.
 
     ``protect``  – callable ``jp_str → (safe_text, meta)``
     ``restore``  – callable ``(translated_safe, meta) → restored_text``
+    ``memory``   – optional translation memory checked before the API and
+                   updated with every block the model returned; hits go
+                   through ``validate``/``review`` and ``on_block`` like
+                   replies, and the ones they reject are sent again
+    ``on_block`` – optional callback ``(index, restored_text)`` invoked for
+                   each block as soon as its batch comes back (checkpointing),
+                   or as soon as the block itself arrives when streaming
+    ``fallback_models`` – models tried in order after repeated failures
+    ``hedge_percentile`` – hedge requests slower than this latency percentile
+                   (default ``HEDGE_PERCENTILE``; 0 disables hedging)
+    ``stream``   – stream replies and parse them incrementally
+                   (default ``STREAM``)
+    ``validate`` – optional ``(safe_text, translated_safe) → reason | None``;
+                   rejected blocks are retried (only they are re‑sent) and
+                   count as failed once the retries are used up
+    ``review``   – optional ``(safe_text, translated_safe) → hint | None``;
+                   flagged blocks are re‑prompted once with the hint and the
+                   second reply is accepted (e.g. glossary spellings)
+    ``context``  – optional shared text (few‑shot examples, episode notes)
+                   sent right after the system prompt; keep it identical
+                   across files so the prompt prefix stays cacheable
+
+    The blocks are packed into batches of ≤ ``max_batch_tokens`` estimated
+    tokens (default ``MAX_BATCH_TOKENS``) that run concurrently; the result is
+    reassembled in the original block order.
     """
 
     # map `str(i)` → safe_text so we can send many blocks at once
@@ -84,77 +682,98 @@ def translate_blocks(
         safe_dict[str(i)] = safe
         metas.append(meta)
 
-    remaining = dict(safe_dict)  # copy
+    # —— translation memory + in‑file duplicates ——
+    # cached blocks are never sent; identical protected text is sent once
+    tm_keys: Dict[str, str] = {}
+    cached: Dict[str, str] = {}
+    if memory is not None:
+        tm_keys = {k: memory.key(v, model=model, system_prompt=system_prompt) for k, v in safe_dict.items()}
+        cached = memory.get_many(tm_keys.values())
+
+    def usable(safe: str, reply: str) -> bool:
+        # a cached reply passes the same checks as a fresh one or is sent again
+        if validate is not None and validate(safe, reply):
+            return False
+        return review is None or not review(safe, reply)
+
+    remaining: Dict[str, str] = {}
     completed: Dict[str, str] = {}
-
-    # Track rate‑limit headers
-    reqs_left = tokens_left = float("inf")
-    reqs_reset = tokens_reset = 0.0
-    attempt = 0
-    success = True
-
-    while remaining and attempt < max_retries:
-        attempt += 1
-
-        now = time.time()
-        if reqs_left <= min_remaining_requests and reqs_reset > now:
-            time.sleep(reqs_reset - now)
-        if tokens_left <= min_remaining_tokens and tokens_reset > now:
-            time.sleep(tokens_reset - now)
-
-        try:
-            resp = _chat_json(system_prompt, remaining, model=model)
-        except openai.RateLimitError as e:  # type: ignore[attr-defined]
-            hdrs = getattr(e, "response", None)
-            if hdrs is not None and hasattr(hdrs, "headers"):
-                rl = hdrs.headers
-                time.sleep(_parse_reset(rl.get("x-ratelimit-reset-requests")))
-            continue
-        except Exception as exc:
-            logging.exception("GPT call failed: %s", exc)
-            success = False
-            break
-
-        # —— header bookkeeping ——
-        hdrs = getattr(resp, "response", None)
-        if hdrs is not None:
-            hdrs = resp.response.headers  # type: ignore[assignment]
-            try:
-                reqs_left = int(hdrs.get("x-ratelimit-remaining-requests", reqs_left))
-                tokens_left = int(hdrs.get("x-ratelimit-remaining-tokens", tokens_left))
-                now = time.time()
-                reqs_reset = now + _parse_reset(hdrs.get("x-ratelimit-reset-requests"))
-                tokens_reset = now + _parse_reset(hdrs.get("x-ratelimit-reset-tokens"))
-            except Exception:
-                pass
-
-        # —— merge GPT output ——
-        try:
-            out = json.loads(resp.choices[0].message.content)  # type: ignore[index]
-        except json.JSONDecodeError:
-            logging.warning("Bad JSON from GPT, retrying…")
-            continue
-
-        for k, v in out.items():
-            if k in remaining:
-                completed[k] = v
-                remaining.pop(k)
+    first_key: Dict[str, str] = {}  # safe_text → key that carries it
+    dupes: Dict[str, str] = {}      # key → key that carries the same text
+    for k, safe in safe_dict.items():
+        hit = cached.get(tm_keys.get(k, ""))
+        if hit is not None and not usable(safe, hit):
+            metrics.count("memory_rejected")
+            hit = None
+        if hit is not None:
+            completed[k] = hit
+        elif safe in first_key:
+            dupes[k] = first_key[safe]
+        else:
+            first_key[safe] = k
+            remaining[k] = safe
+    sent = list(remaining)
+    copies: Dict[str, List[str]] = {}
+    for k, src in dupes.items():
+        copies.setdefault(src, []).append(k)
+
+    failed: Dict[str, str] = {}
+    models = [model, *(m for m in fallback_models if m != model)]
+    hedge = HEDGE_PERCENTILE if hedge_percentile is None else hedge_percentile
+
+    restored: Dict[int, str] = {}  # blocks already restored for on_block
+
+    def emit(k: str, v: str) -> None:
+        for key in (k, *copies.get(k, ())):
+            i = int(key)
+            restored[i] = restore(v, metas[i])
+            on_block(i, restored[i])  # type: ignore[misc]
+
+    # memory hits are checkpointed like replies, so a kill doesn't cost the lookups again
+    if on_block is not None:
+        for k, v in completed.items():
+            emit(k, v)
+
+    async def run(batch: Dict[str, str]) -> Dict[str, str]:
+        return await _translate_batch(
+            batch, system_prompt=system_prompt, models=models, max_retries=max_retries,
+            failures=failed, hedge_percentile=hedge, stream=STREAM if stream is None else stream,
+            on_done=emit if on_block is not None else None, validate=validate, context=context,
+            review=review,
+        )
+
+    batches = pack_batches(remaining, max_batch_tokens or MAX_BATCH_TOKENS)
+    for done in await asyncio.gather(*(run(b) for b in batches)):
+        completed.update(done)
+    remaining = {k: v for k, v in remaining.items() if k not in completed}
+
+    if memory is not None:
+        memory.put_many({tm_keys[k]: completed[k] for k in sent if k in completed})
 
     if remaining:
         # didn’t manage to translate everything
-        success = False
         completed.update({k: v for k, v in remaining.items()})  # use safe text
 
+    for k, src in dupes.items():
+        completed[k] = completed[src]
+        if src in failed:
+            failed[k] = failed[src]
+
     # —— restore original formatting ——
     results: List[str] = []
     for i in range(len(blocks)):
-        raw_safe = completed[str(i)]
-        results.append(restore(raw_safe, metas[i]))
+        if i not in restored:
+            restored[i] = restore(completed[str(i)], metas[i])
+        results.append(restored[i])
 
-    return results, success
+    failures = {int(k): why for k, why in failed.items()}
+    return TranslateResult(results, not failures, failures)
 
 
-async def translate_blocks_async(*args, **kwargs) -> TranslateResult:  # type: ignore[override]
-    loop = asyncio.get_event_loop()
-    func = functools.partial(translate_blocks, *args, **kwargs)
-    return await loop.run_in_executor(None, func)
\ No newline at end of file
+def translate_blocks(blocks: List[str], **kwargs) -> TranslateResult:
+    """Blocking wrapper around :func:`translate_blocks_async`.
+
+    Must not be called from inside a running event loop – ``await``
+    :func:`translate_blocks_async` directly there instead.
+    """
+    return asyncio.run(translate_blocks_async(blocks, **kwargs))
@@ -0,0 +1,107 @@
+from __future__ import annotations
+
+"""Append‑only checkpoint journal of translated blocks.
+
+Each translated block is appended as one JSON line the moment its batch
+comes back, keyed by ``(file, block index, source hash)``.  When the file
+is finally written a ``done`` record is appended and its blocks are dropped,
+so the journal only ever holds work that would otherwise be lost by a crash
+or Ctrl‑C.  Replaying the journal returns the blocks whose source is still
+identical; only the rest need to be sent again.
+"""
+
+from typing import Dict, List, Sequence, Tuple
+import hashlib, json, logging, os
+
+
+def source_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+
+class BlockJournal:
+    """JSON‑lines journal: ``{"file", "index", "src", "text"}`` / ``{"file", "done"}``."""
+
+    def __init__(self, path: str | os.PathLike, *, read_only: bool = False):
+        """With *read_only* the journal is only replayed: nothing is appended
+        and a missing file is not created."""
+        self.path = os.fspath(path)
+        self._blocks: Dict[str, Dict[int, Tuple[str, str]]] = {}  # file → index → (src hash, text)
+        self._done_records = 0
+        self._torn = False
+        self._fh = None
+        self._load()
+        if read_only:
+            return
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._fh = open(self.path, "a", encoding="utf-8")
+        if self._torn:
+            self._fh.write("\n")  # don't glue the next record onto a torn line
+
+    def _load(self) -> None:
+        if not os.path.isfile(self.path):
+            return
+        line = ""
+        with open(self.path, encoding="utf-8") as fh:
+            for n, line in enumerate(fh, 1):
+                try:
+                    rec = json.loads(line)
+                except json.JSONDecodeError:
+                    # a torn last line from an interrupted write – ignore it
+                    logging.debug("Skipping unreadable journal line %d in %s", n, self.path)
+                    continue
+                if rec.get("done"):
+                    self._blocks.pop(rec["file"], None)
+                    self._done_records += 1
+                else:
+                    self._blocks.setdefault(rec["file"], {})[rec["index"]] = (rec["src"], rec["text"])
+        self._torn = bool(line) and not line.endswith("\n")
+
+    def _append(self, rec: dict) -> None:
+        if self._fh is None:
+            raise ValueError(f"{self.path} was opened read-only")
+        self._fh.write(json.dumps(rec, ensure_ascii=False) + "\n")
+        self._fh.flush()
+
+    def record(self, file: str, index: int, source: str, text: str) -> None:
+        """Checkpoint the translation of block *index* of *file*."""
+        src = source_hash(source)
+        self._blocks.setdefault(file, {})[index] = (src, text)
+        self._append({"file": file, "index": index, "src": src, "text": text})
+
+    def replay(self, file: str, sources: Sequence[str]) -> Dict[int, str]:
+        """Return ``index → text`` for journaled blocks whose source is unchanged."""
+        entries = self._blocks.get(file, {})
+        return {
+            i: text
+            for i, (src, text) in entries.items()
+            if i < len(sources) and src == source_hash(sources[i])
+        }
+
+    def finish(self, file: str) -> None:
+        """Mark *file* as written so its blocks are no longer needed."""
+        if self._blocks.pop(file, None) is not None:
+            self._append({"file": file, "done": True})
+            self._done_records += 1
+
+    def pending_files(self) -> List[str]:
+        """Files with journaled blocks that were never finished."""
+        return sorted(f for f, entries in self._blocks.items() if entries)
+
+    def compact(self) -> None:
+        """Rewrite the journal keeping only blocks of unfinished files."""
+        if not self._done_records or self._fh is None:
+            return
+        self._fh.close()
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as fh:
+            for file, entries in self._blocks.items():
+                for i, (src, text) in sorted(entries.items()):
+                    fh.write(json.dumps({"file": file, "index": i, "src": src, "text": text}, ensure_ascii=False) + "\n")
+        os.replace(tmp, self.path)
+        self._done_records = 0
+        self._fh = open(self.path, "a", encoding="utf-8")
+
+    def close(self) -> None:
+        if self._fh is not None:
+            self._fh.close()
@@ -0,0 +1,106 @@
+from __future__ import annotations
+
+"""Incremental parser for the ``{"0": "…", "1": "…"}`` translation replies.
+
+A streamed chat completion arrives as many small text deltas.  Feeding them
+to :class:`ObjectStream` yields every ``(key, value)`` member as soon as its
+closing quote has arrived, so a block can be restored and checkpointed while
+the model is still writing the next one::
+
+    stream = ObjectStream()
+    async for delta in deltas:
+        for key, text in stream.feed(delta):
+            ...
+
+Only string members are reported; anything else (a nested value, stray
+text) makes the parser stop reporting and the caller falls back to parsing
+the full reply with :func:`json.loads`.  The input is scanned once.
+"""
+
+from typing import Iterator, List, Tuple
+import json, re
+
+_SPECIAL = re.compile(r'["\\]')
+_WS = " \t\r\n"
+
+# parser states
+_BEFORE_KEY, _KEY, _COLON, _BEFORE_VALUE, _VALUE, _AFTER_VALUE, _DONE, _BROKEN = range(8)
+
+
+class ObjectStream:
+    def __init__(self) -> None:
+        self.state = _BEFORE_KEY
+        self.started = False     # seen the opening "{"
+        self.parts: List[str] = []  # raw (still escaped) text of the current string
+        self.escape = False
+        self.key = ""
+
+    @property
+    def broken(self) -> bool:
+        """The input stopped looking like a flat object of strings."""
+        return self.state == _BROKEN
+
+    def feed(self, chunk: str) -> List[Tuple[str, str]]:
+        """Consume *chunk*; return the members completed by it."""
+        return list(self._feed(chunk))
+
+    def _feed(self, s: str) -> Iterator[Tuple[str, str]]:
+        i, n = 0, len(s)
+        while i < n and self.state not in (_DONE, _BROKEN):
+            if self.state in (_KEY, _VALUE):
+                if self.escape:  # the character after a backslash is taken verbatim
+                    self.parts.append(s[i])
+                    self.escape = False
+                    i += 1
+                    continue
+                m = _SPECIAL.search(s, i)
+                if m is None:
+                    self.parts.append(s[i:])
+                    return
+                j = m.start()
+                self.parts.append(s[i:j])
+                if s[j] == "\\":
+                    self.parts.append("\\")
+                    self.escape = True
+                    i = j + 1
+                    continue
+                i = j + 1
+                text = self._decode()
+                if text is None:
+                    self.state = _BROKEN
+                elif self.state == _KEY:
+                    self.key, self.state = text, _COLON
+                else:
+                    self.state = _AFTER_VALUE
+                    yield self.key, text
+                continue
+
+            c = s[i]
+            i += 1
+            if c in _WS:
+                continue
+            if not self.started:
+                self.started = c == "{"
+                self.state = _BEFORE_KEY if self.started else _BROKEN
+            elif self.state == _BEFORE_KEY and c == '"':
+                self.state = _KEY
+            elif self.state == _BEFORE_KEY and c == "}":
+                self.state = _DONE
+            elif self.state == _COLON and c == ":":
+                self.state = _BEFORE_VALUE
+            elif self.state == _BEFORE_VALUE and c == '"':
+                self.state = _VALUE
+            elif self.state == _AFTER_VALUE and c == ",":
+                self.state = _BEFORE_KEY
+            elif self.state == _AFTER_VALUE and c == "}":
+                self.state = _DONE
+            else:
+                self.state = _BROKEN
+
+    def _decode(self) -> str | None:
+        raw = "".join(self.parts)
+        self.parts = []
+        try:
+            return json.loads(f'"{raw}"')
+        except json.JSONDecodeError:
+            return None
@@ -0,0 +1,124 @@
+from __future__ import annotations
+
+"""Single‑pass scanner for the Lua scenario scripts.
+
+Every tool in the pipeline needs the same view of a script: where the
+``MSG([[ … ]])`` bodies are and, inside them, the speaker header, markup
+tags and ruby segments.  :func:`scan` finds the MSG bodies with plain
+``str.find`` (linear, no backtracking) and each :class:`MsgBlock` tokenizes
+its body once, on first access::
+
+    for msg in scan(lua_text):
+        msg.start, msg.end      # span of the body inside lua_text
+        msg.speaker             # Token for "【名前】pose" or None
+        msg.tags, msg.ruby      # Tokens for <…> and <r=…>…</r>
+"""
+
+from typing import List, NamedTuple
+import re
+
+MSG_OPEN = "MSG([["
+MSG_CLOSE = "]])"
+
+# One alternation, tried left to right at each position → linear in the body.
+# Ruby text can't contain "<", so an unclosed ``<r=`` fails at the next tag
+# instead of scanning to the end of the body (quadratic with many of them).
+_BODY_RX = re.compile(
+    r"(?P<ruby><r=[^>]*>[^<]*</r>)"
+    r"|(?P<tag><[^>]+>)"
+    r"|(?P<speaker>^[ \t　]*【[^】\r\n]+】[^\r\n]*)",
+    re.MULTILINE | re.DOTALL,
+)
+
+
+class Token(NamedTuple):
+    kind: str   # "text" | "speaker" | "tag" | "ruby"
+    start: int  # offsets relative to the MSG body
+    end: int
+    text: str
+
+
+def tokenize(body: str) -> List[Token]:
+    """Split an MSG body into text / speaker / tag / ruby tokens (covers all of it)."""
+    tokens: List[Token] = []
+    last = 0
+    for m in _BODY_RX.finditer(body):
+        if m.start() > last:
+            tokens.append(Token("text", last, m.start(), body[last:m.start()]))
+        tokens.append(Token(m.lastgroup or "text", m.start(), m.end(), m.group(0)))
+        last = m.end()
+    if last < len(body):
+        tokens.append(Token("text", last, len(body), body[last:]))
+    return tokens
+
+
+class MsgBlock:
+    """One ``MSG([[ … ]])`` call; ``start``/``end`` delimit its body."""
+
+    __slots__ = ("start", "end", "body", "commented", "_tokens")
+
+    def __init__(self, start: int, end: int, body: str, commented: bool):
+        self.start = start
+        self.end = end
+        self.body = body
+        self.commented = commented  # the call sits on a ``--`` comment line
+        self._tokens: List[Token] | None = None
+
+    def __repr__(self) -> str:
+        return f"MsgBlock({self.start}, {self.end}, {self.body[:20]!r}…)"
+
+    @property
+    def span(self) -> tuple[int, int]:
+        return self.start, self.end
+
+    @property
+    def tokens(self) -> List[Token]:
+        if self._tokens is None:
+            self._tokens = tokenize(self.body)
+        return self._tokens
+
+    @property
+    def speaker(self) -> Token | None:
+        """The first speaker header (``【名前】pose`` line), if any."""
+        return next((t for t in self.tokens if t.kind == "speaker"), None)
+
+    @property
+    def speakers(self) -> List[Token]:
+        return [t for t in self.tokens if t.kind == "speaker"]
+
+    @property
+    def tags(self) -> List[Token]:
+        return [t for t in self.tokens if t.kind == "tag"]
+
+    @property
+    def ruby(self) -> List[Token]:
+        return [t for t in self.tokens if t.kind == "ruby"]
+
+
+def scan(text: str) -> List[MsgBlock]:
+    """Return every MSG block of *text* in order, in one left‑to‑right pass.
+
+    Matches the old ``MSG\\(\\[\\[(.*?)\\]\\]\\)`` regexes: a body ends at the
+    first ``]])`` after its opening ``MSG([[``.
+    """
+    blocks: List[MsgBlock] = []
+    pos = 0
+    while True:
+        i = text.find(MSG_OPEN, pos)
+        if i < 0:
+            break
+        start = i + len(MSG_OPEN)
+        end = text.find(MSG_CLOSE, start)
+        if end < 0:
+            break
+        line_start = text.rfind("\n", 0, i) + 1
+        commented = text[line_start:i].lstrip().startswith("--")
+        blocks.append(MsgBlock(start, end, text[start:end], commented))
+        pos = end + len(MSG_CLOSE)
+    return blocks
+
+
+def split_speaker_note(token: Token) -> tuple[str, str]:
+    """``"  【Erika】Serious"`` → ``("  【Erika】", "Serious")``."""
+    head, _, note = token.text.partition("】")
+    return head + "】", note
@@ -0,0 +1,126 @@
+from __future__ import annotations
+
+"""Content‑hash manifest describing what each translated file was built from.
+
+For every file the manifest stores the hash of the prompt + model it was
+translated with, one hash per MSG block of its source and the hash of the
+translated file it describes::
+
+    {"files": {"EP01_01-….json": {"prompt": "…", "blocks": ["…", "…"], "output": "…"}}}
+
+Comparing a fresh export against it tells which blocks can be reused from
+the existing translation and which ones actually changed.  The output hash
+guards against a translated file that was rewritten after the manifest was
+last saved (e.g. a run killed between the two): its blocks are not reused.
+"""
+
+from typing import Dict, Iterable, Sequence
+import hashlib, json, os
+
+from common.journal import source_hash  # type: ignore
+
+
+def prompt_hash(system_prompt: str, model: str) -> str:
+    return hashlib.sha256(f"{model}\0{system_prompt}".encode("utf-8")).hexdigest()[:16]
+
+
+class Manifest:
+    """``file → {prompt hash, block hashes}`` index persisted as JSON."""
+
+    def __init__(self, path: str | os.PathLike, *, read_only: bool = False):
+        """With *read_only* changes stay in this copy: :meth:`save` is a no‑op."""
+        self.path = os.fspath(path)
+        self.read_only = read_only
+        self.files: Dict[str, dict] = {}
+        self.dirty = False
+        if os.path.isfile(self.path):
+            with open(self.path, encoding="utf-8") as fh:
+                self.files = json.load(fh).get("files", {})
+
+    def __contains__(self, rel: str) -> bool:
+        return rel in self.files
+
+    def describes(self, rel: str, output: str) -> bool:
+        """True unless the entry of *rel* records a different translated file than *output*.
+
+        Entries written before output hashes were recorded describe any file.
+        """
+        recorded = self.files.get(rel, {}).get("output")
+        return recorded is None or recorded == source_hash(output)
+
+    def reusable(self, rel: str, sources: Sequence[str], prompt: str, output: str | None = None) -> Dict[int, int]:
+        """Map ``new block index → old block index`` for blocks that need no work.
+
+        A block is reusable when the file was translated with the same prompt
+        and an identical source block existed (at any position).  Empty when
+        the file is unknown, the prompt changed or *output* (the current
+        translated file) is not the one the entry was recorded for.
+        """
+        entry = self.files.get(rel)
+        if entry is None or entry.get("prompt") != prompt:
+            return {}
+        if output is not None and not self.describes(rel, output):
+            return {}
+        old_index: Dict[str, int] = {}
+        for i, h in enumerate(entry.get("blocks", [])):
+            old_index.setdefault(h, i)
+        reuse: Dict[int, int] = {}
+        for i, src in enumerate(sources):
+            j = old_index.get(source_hash(src))
+            if j is not None:
+                reuse[i] = j
+        return reuse
+
+    def is_current(self, rel: str, sources: Sequence[str], prompt: str) -> bool:
+        entry = self.files.get(rel)
+        return (
+            entry is not None
+            and entry.get("prompt") == prompt
+            and entry.get("blocks") == [source_hash(s) for s in sources]
+        )
+
+    def update(self, rel: str, sources: Sequence[str], prompt: str, output: str | None = None) -> None:
+        hashes = [source_hash(s) for s in sources]
+        requeued = {h: n for h, n in self.files.get(rel, {}).get("requeued", {}).items() if h in hashes}
+        self.files[rel] = {"prompt": prompt, "blocks": hashes}
+        if output is not None:
+            self.files[rel]["output"] = source_hash(output)
+        if requeued:
+            self.files[rel]["requeued"] = requeued
+        self.dirty = True
+
+    def requeued(self, rel: str, source: str) -> int:
+        """How often the block with *source* was queued for re‑translation (see :meth:`requeue`)."""
+        return self.files.get(rel, {}).get("requeued", {}).get(source_hash(source), 0)
+
+    def requeue(self, rel: str, sources: Iterable[str]) -> None:
+        """Count one more re‑translation of each block in *sources* (kept until its source changes)."""
+        entry = self.files.get(rel)
+        if entry is None:
+            return
+        counts = entry.setdefault("requeued", {})
+        for h in {source_hash(src) for src in sources}:  # repeated lines count once
+            counts[h] = counts.get(h, 0) + 1
+        self.dirty = True
+
+    def invalidate(self, rel: str, indices: Iterable[int]) -> None:
+        """Forget the hashes of blocks *indices* of *rel* so they are translated again."""
+        entry = self.files.get(rel)
+        if entry is None:
+            return
+        blocks = entry.get("blocks", [])
+        for i in indices:
+            if 0 <= i < len(blocks):
+                blocks[i] = ""
+        self.dirty = True
+
+    def save(self) -> None:
+        if not self.dirty or self.read_only:
+            return
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as fh:
+            json.dump({"files": self.files}, fh, ensure_ascii=False, indent=1, sort_keys=True)
+        os.replace(tmp, self.path)
+        self.dirty = False
@@ -0,0 +1,103 @@
+from __future__ import annotations
+
+"""On‑disk translation memory shared by every ``translate_blocks`` call.
+
+Entries are keyed by ``sha256(model, sha256(system_prompt), protected_text)``
+and hold the model’s raw reply for that block (still in protected form, so
+each caller restores it with its own tag map).  Storage is a single SQLite
+table; once it grows past ``max_entries`` the least recently used rows are
+evicted.
+"""
+
+from typing import Dict, Iterable, Mapping
+import hashlib, os, pathlib, sqlite3
+
+
+class TranslationMemory:
+    """SQLite backed ``protected text → translated text`` cache."""
+
+    def __init__(self, path: str | os.PathLike, *, max_entries: int = 200_000, read_only: bool = False):
+        """With *read_only* the file is never created or written: lookups do
+        not touch the LRU clock and a missing file reads as an empty memory."""
+        self.path = os.fspath(path)
+        self.max_entries = max_entries
+        self.read_only = read_only
+        self.hits = self.misses = 0
+        if not read_only:
+            if os.path.dirname(self.path):
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._db = sqlite3.connect(self.path)
+        elif os.path.isfile(self.path):
+            self._db = sqlite3.connect(pathlib.Path(self.path).resolve().as_uri() + "?mode=ro", uri=True)
+        else:
+            self._db = sqlite3.connect(":memory:")
+        if not (read_only and os.path.isfile(self.path)):
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS tm ("
+                " key TEXT PRIMARY KEY, value TEXT NOT NULL, used INTEGER NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS tm_used ON tm(used)")
+        self._count, clock = self._db.execute("SELECT COUNT(*), COALESCE(MAX(used), 0) FROM tm").fetchone()
+        self._clock = int(clock)
+
+    @staticmethod
+    def key(safe_text: str, *, model: str, system_prompt: str) -> str:
+        prompt_hash = hashlib.sha256(system_prompt.encode("utf-8")).hexdigest()
+        h = hashlib.sha256()
+        for part in (model, prompt_hash, safe_text):
+            h.update(part.encode("utf-8"))
+            h.update(b"\0")
+        return h.hexdigest()
+
+    def _tick(self) -> int:
+        self._clock += 1
+        return self._clock
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, str]:
+        """Return the cached subset of *keys* and mark those rows as recently used."""
+        keys = list(dict.fromkeys(keys))
+        found: Dict[str, str] = {}
+        for i in range(0, len(keys), 500):  # stay below SQLite's variable limit
+            chunk = keys[i:i + 500]
+            marks = ",".join("?" * len(chunk))
+            found.update(self._db.execute(f"SELECT key, value FROM tm WHERE key IN ({marks})", chunk).fetchall())
+        if found and not self.read_only:
+            tick = self._tick()
+            self._db.executemany("UPDATE tm SET used = ? WHERE key = ?", ((tick, k) for k in found))
+            self._db.commit()
+        self.hits += len(found)
+        self.misses += len(keys) - len(found)
+        return found
+
+    def put_many(self, items: Mapping[str, str]) -> None:
+        if not items:
+            return
+        tick = self._tick()
+        before = self._db.total_changes
+        self._db.executemany(
+            "INSERT OR IGNORE INTO tm(key, value, used) VALUES (?, ?, ?)",
+            ((k, v, tick) for k, v in items.items()),
+        )
+        self._count += self._db.total_changes - before
+        self._db.executemany("UPDATE tm SET value = ?, used = ? WHERE key = ?", ((v, tick, k) for k, v in items.items()))
+        if self._count > self.max_entries:
+            excess = self._count - self.max_entries
+            self._db.execute("DELETE FROM tm WHERE key IN (SELECT key FROM tm ORDER BY used LIMIT ?)", (excess,))
+            self._count -= excess
+        self._db.commit()
+
+    def forget(self, keys: Iterable[str]) -> None:
+        """Drop *keys* (e.g. translations found to be wrong) from the memory."""
+        keys = list(dict.fromkeys(keys))
+        before = self._db.total_changes
+        for i in range(0, len(keys), 500):
+            chunk = keys[i:i + 500]
+            self._db.execute(f"DELETE FROM tm WHERE key IN ({','.join('?' * len(chunk))})", chunk)
+        self._count -= self._db.total_changes - before
+        self._db.commit()
+
+    def stats(self) -> Dict[str, int]:
+        return {"entries": self._count, "hits": self.hits, "misses": self.misses}
+
+    def close(self) -> None:
+        self._db.close()
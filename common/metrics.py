@@ -0,0 +1,170 @@
+from __future__ import annotations
+
+"""Per‑stage timings and API counters for one translation run.
+
+Every module records into the process‑wide :data:`metrics`::
+
+    with metrics.stage("load"):
+        doc = json.loads(read_file(path))
+
+    @metrics.timed("protect")
+    def _protect(text): ...
+
+    metrics.count("rate_limited")
+    metrics.record_usage(completion.usage)   # prompt / completion / cached tokens
+
+At the end of a run :meth:`Metrics.table` gives a summary for the terminal,
+:meth:`Metrics.write_jsonl` appends one JSON record per run to a report file
+and :meth:`Metrics.write_prometheus` writes the same numbers in the
+Prometheus text format (e.g. for node_exporter's textfile collector).
+
+Stage seconds are summed over all calls, so stages that run concurrently
+(``api_queue`` / ``api_network`` across requests) can add up to more than
+the wall‑clock time of the run.
+"""
+
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, TypeVar
+from collections import Counter, defaultdict
+import functools, json, os, time
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+
+class Metrics:
+    def __init__(self) -> None:
+        self.reset()
+
+    def reset(self) -> None:
+        """Start a new run: clear every timer and counter."""
+        self.started = time.time()
+        self._t0 = time.perf_counter()
+        self.seconds: Dict[str, float] = defaultdict(float)
+        self.calls: Counter[str] = Counter()
+        self.counters: Counter[str] = Counter()
+        self.models: Dict[str, Counter[str]] = defaultdict(Counter)  # model → token counts
+
+    # ── recording ─────────────────────────────────────────────────
+    def add_time(self, name: str, seconds: float, calls: int = 1) -> None:
+        self.seconds[name] += seconds
+        self.calls[name] += calls
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - t0)
+
+    def timed(self, name: str) -> Callable[[F], F]:
+        """Decorator form of :meth:`stage`."""
+        def wrap(fn: F) -> F:
+            @functools.wraps(fn)
+            def inner(*args: Any, **kwargs: Any) -> Any:
+                t0 = time.perf_counter()
+                try:
+                    return fn(*args, **kwargs)
+                finally:
+                    self.add_time(name, time.perf_counter() - t0)
+            return inner  # type: ignore[return-value]
+        return wrap
+
+    def count(self, name: str, n: int = 1) -> None:
+        self.counters[name] += n
+
+    def record_usage(self, usage: Any, model: str | None = None) -> None:
+        """Add the token counts of a completion's ``usage`` (object or dict).
+
+        With *model* the counts are also kept per model (see :attr:`models`).
+        """
+        if usage is None:
+            return
+        get = usage.get if isinstance(usage, dict) else lambda k: getattr(usage, k, None)
+        details = get("prompt_tokens_details")
+        cached = (details.get("cached_tokens") if isinstance(details, dict)
+                  else getattr(details, "cached_tokens", None)) if details is not None else None
+        counts = {
+            "prompt_tokens": get("prompt_tokens") or 0,
+            "completion_tokens": get("completion_tokens") or 0,
+            "cached_tokens": cached or 0,
+        }
+        self.counters.update(counts)
+        if cached:
+            self.counters["cache_hits"] += 1
+        if model is not None:
+            self.models[model].update(requests=1, **counts)
+
+    # ── reporting ─────────────────────────────────────────────────
+    @property
+    def elapsed(self) -> float:
+        return time.perf_counter() - self._t0
+
+    def snapshot(self, **extra: Any) -> Dict[str, Any]:
+        """The run as one JSON‑serialisable record; *extra* fields are added as is."""
+        return {
+            "started": round(self.started, 3),
+            "elapsed": round(self.elapsed, 3),
+            **extra,
+            "stages": {
+                name: {"seconds": round(self.seconds[name], 4), "calls": self.calls[name]}
+                for name in self.seconds
+            },
+            "counters": dict(self.counters),
+            "models": {m: dict(c) for m, c in self.models.items()},
+        }
+
+    def write_jsonl(self, path: str | os.PathLike, **extra: Any) -> None:
+        """Append :meth:`snapshot` as one line to *path*."""
+        path = os.fspath(path)
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "a", encoding="utf-8") as fh:
+            fh.write(json.dumps(self.snapshot(**extra), ensure_ascii=False) + "\n")
+
+    def write_prometheus(self, path: str | os.PathLike, *, prefix: str = "translate", **labels: str) -> None:
+        """Write the run in the Prometheus text exposition format (atomically)."""
+        lbl = ",".join(f'{k}="{v}"' for k, v in sorted(labels.items()))
+
+        def series(**more: str) -> str:
+            parts = ",".join(p for p in (lbl, ",".join(f'{k}="{v}"' for k, v in more.items())) if p)
+            return f"{{{parts}}}" if parts else ""
+
+        lines = [
+            f"# HELP {prefix}_stage_seconds Seconds spent per stage in the last run.",
+            f"# TYPE {prefix}_stage_seconds gauge",
+            *(f"{prefix}_stage_seconds{series(stage=n)} {s:.6f}" for n, s in sorted(self.seconds.items())),
+            f"# HELP {prefix}_stage_calls Calls per stage in the last run.",
+            f"# TYPE {prefix}_stage_calls gauge",
+            *(f"{prefix}_stage_calls{series(stage=n)} {c}" for n, c in sorted(self.calls.items())),
+            f"# HELP {prefix}_events Counters (requests, tokens, 429s, retries …) of the last run.",
+            f"# TYPE {prefix}_events gauge",
+            *(f"{prefix}_events{series(event=n)} {c}" for n, c in sorted(self.counters.items())),
+            f"# HELP {prefix}_run_seconds Wall-clock duration of the last run.",
+            f"# TYPE {prefix}_run_seconds gauge",
+            f"{prefix}_run_seconds{series()} {self.elapsed:.3f}",
+            f"# HELP {prefix}_run_started Unix time the last run started.",
+            f"# TYPE {prefix}_run_started gauge",
+            f"{prefix}_run_started{series()} {self.started:.0f}",
+        ]
+        path = os.fspath(path)
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as fh:
+            fh.write("\n".join(lines) + "\n")
+        os.replace(tmp, path)
+
+    def table(self) -> str:
+        """Human‑readable summary: one row per stage, then the counters."""
+        w = max([len("wall clock"), *map(len, self.seconds), *map(len, self.counters)])
+        rows = [f"{'stage':<{w}} {'calls':>8} {'total s':>9} {'mean ms':>9}"]
+        for name, secs in sorted(self.seconds.items(), key=lambda kv: -kv[1]):
+            n = self.calls[name]
+            rows.append(f"{name:<{w}} {n:>8} {secs:>9.2f} {1000 * secs / n if n else 0:>9.2f}")
+        if self.counters:
+            rows.append("")
+            rows.extend(f"{name:<{w}} {value:>8}" for name, value in sorted(self.counters.items()))
+        rows.append(f"{'wall clock':<{w}} {'':>8} {self.elapsed:>9.2f}")
+        return "\n".join(rows)
+
+
+metrics = Metrics()
@@ -0,0 +1,383 @@
+from __future__ import annotations
+
+"""Local stand‑in for the OpenAI chat, files and batches endpoints.
+
+Lets every API path be exercised end to end without an API key::
+
+    python -m common.mockapi --port 8787 --latency lognormal:0.8,0.4 --rate-429 0.02
+    OPENAI_BASE_URL=http://127.0.0.1:8787/v1 OPENAI_API_KEY=x \\
+        python translate.py bokuhime all
+
+Blocks found in the recorded replies (``--fixtures``, a JSON‑lines file of
+``{"source": …, "reply": …}`` in protected form, e.g. written by
+``python -m common.benchmark --write-fixtures``) get their recorded English
+so a run behaves like a real one; any other block is a deterministic echo
+(``"[EN] " + source``, after a leading ``【speaker】`` header like a real
+reply) so results can be checked.  Batches complete after ``--batch-delay`` seconds.  Chat requests
+can be slowed down by a latency distribution, rejected with 429s carrying
+``x-ratelimit-*`` headers (randomly and when the ``--rpm`` / ``--tpm``
+window is used up) and answered with truncated JSON; ``GET /_stats``
+reports what happened (see ``common.benchmark``).  Like the real prompt
+cache, a prompt prefix (everything before the last message) of at least
+1024 tokens is reported as ``cached_tokens`` once a request with it has
+been answered.
+"""
+
+from typing import Any, Callable, Dict, List, Mapping
+import argparse, hashlib, json, math, random, re, threading, time, uuid
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+_SPEAKER_RX = re.compile(r"^(【[^】]*】)?")
+
+
+def echo_translate(content: str, replies: Mapping[str, str] | None = None) -> str:
+    """Fake reply for a JSON translation payload (any note after it is ignored).
+
+    Blocks found in *replies* (``source → recorded reply``) get the recorded
+    reply, the rest a deterministic echo.
+    """
+    payload, _end = json.JSONDecoder().raw_decode(content)
+    replies = replies or {}
+    return json.dumps(
+        {k: replies[v] if v in replies else _SPEAKER_RX.sub(r"\1[EN] ", v, count=1) for k, v in payload.items()},
+        ensure_ascii=False,
+    )
+
+
+def load_fixtures(path: str) -> Dict[str, str]:
+    """``source → reply`` from a JSON‑lines file of ``{"source", "reply"}`` records."""
+    with open(path, encoding="utf-8") as fh:
+        return {rec["source"]: rec["reply"] for rec in map(json.loads, filter(str.strip, fh))}
+
+
+CACHE_MIN_TOKENS = 1024  # shortest prefix the prompt cache stores
+CACHE_STEP = 128         # cache hits grow in steps of this many tokens
+
+
+def prefix_tokens(body: Dict[str, Any]) -> int:
+    """Mock token count of everything before *body*'s last message."""
+    return sum(len(m["content"]) for m in body["messages"][:-1]) // 2
+
+
+def chat_completion(
+    body: Dict[str, Any], cached_tokens: int = 0, replies: Mapping[str, str] | None = None,
+) -> Dict[str, Any]:
+    """Fake ``chat.completion`` answering *body*'s last message (see :func:`echo_translate`)."""
+    content = echo_translate(body["messages"][-1]["content"], replies)
+    prompt_tokens = sum(len(m["content"]) for m in body["messages"]) // 2
+    completion_tokens = len(content) // 2
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex[:12]}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "mock"),
+        "choices": [{
+            "index": 0,
+            "finish_reason": "stop",
+            "message": {"role": "assistant", "content": content},
+        }],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+            "prompt_tokens_details": {"cached_tokens": cached_tokens},
+        },
+    }
+
+
+def parse_latency(spec: str) -> Callable[[random.Random], float]:
+    """``"fixed:0.3"``, ``"uniform:0.2,1.5"`` or ``"lognormal:median,sigma"`` → sampler (seconds)."""
+    kind, _, args = spec.partition(":")
+    vals = [float(v) for v in args.split(",") if v] or [0.0]
+    if kind == "fixed":
+        return lambda rng: vals[0]
+    if kind == "uniform":
+        return lambda rng: rng.uniform(vals[0], vals[1])
+    if kind == "lognormal":
+        return lambda rng: rng.lognormvariate(math.log(vals[0]), vals[1] if len(vals) > 1 else 0.5)
+    raise ValueError(f"unknown latency distribution {spec!r}")
+
+
+class MockState:
+    def __init__(
+        self,
+        batch_delay: float = 1.0,
+        *,
+        latency: str = "fixed:0",
+        rate_429: float = 0.0,
+        malformed: float = 0.0,
+        rpm: int = 0,
+        tpm: int = 0,
+        seed: int | None = None,
+        replies: Mapping[str, str] | None = None,
+    ):
+        self.batch_delay = batch_delay
+        self.replies = dict(replies or {})  # recorded ``source → reply`` fixtures
+        self.files: Dict[str, Dict[str, Any]] = {}    # id → metadata + "data"
+        self.batches: Dict[str, Dict[str, Any]] = {}  # id → batch object
+        self.lock = threading.RLock()
+        # —— chat completions ——
+        self.latency = parse_latency(latency)
+        self.rate_429 = rate_429      # share of requests rejected at random
+        self.malformed = malformed    # share of replies with truncated JSON
+        self.rpm, self.tpm = rpm, tpm  # 0 = unlimited
+        self.rng = random.Random(seed)
+        self.window_start = time.time()
+        self.window_requests = self.window_tokens = 0
+        self.stats: Dict[str, Any] = {"requests": 0, "ok": 0, "rate_limited": 0, "malformed": 0, "streamed": 0,
+                                      "prompt_tokens": 0, "cached_tokens": 0, "cache_hits": 0}
+        self.latencies: List[float] = []
+        self.payloads: set = set()    # hashes of distinct request payloads
+        self.prefixes: set = set()    # hashes of cached prompt prefixes
+
+    def admit(self, tokens: int) -> tuple[bool, Dict[str, str], float]:
+        """Count a chat request against the window: ``(allowed, headers, injected latency)``."""
+        with self.lock:
+            now = time.time()
+            if now - self.window_start >= 60:
+                self.window_start, self.window_requests, self.window_tokens = now, 0, 0
+            reset = f"{max(0.0, 60 - (now - self.window_start)):.3f}s"
+            over = (self.rpm and self.window_requests >= self.rpm) or (self.tpm and self.window_tokens + tokens > self.tpm)
+            allowed = not over and self.rng.random() >= self.rate_429
+            if allowed:
+                self.window_requests += 1
+                self.window_tokens += tokens
+            rpm, tpm = self.rpm or 10_000, self.tpm or 10_000_000
+            headers = {
+                "x-ratelimit-limit-requests": str(rpm),
+                "x-ratelimit-limit-tokens": str(tpm),
+                "x-ratelimit-remaining-requests": str(max(0, rpm - self.window_requests)),
+                "x-ratelimit-remaining-tokens": str(max(0, tpm - self.window_tokens)),
+                "x-ratelimit-reset-requests": reset if self.rpm else "0s",
+                "x-ratelimit-reset-tokens": reset if self.tpm else "0s",
+            }
+            if not allowed:
+                headers["retry-after"] = "1"
+            return allowed, headers, max(0.0, self.latency(self.rng))
+
+    @staticmethod
+    def _prefix(body: Dict[str, Any]) -> str:
+        prefix = json.dumps([body.get("prompt_cache_key"), body["messages"][:-1]], ensure_ascii=False)
+        return hashlib.sha1(prefix.encode("utf-8")).hexdigest()
+
+    def cached(self, body: Dict[str, Any]) -> int:
+        """Prompt tokens of *body* served from the cache."""
+        tokens = prefix_tokens(body)
+        if tokens < CACHE_MIN_TOKENS:
+            return 0
+        with self.lock:
+            hit = self._prefix(body) in self.prefixes
+        return tokens // CACHE_STEP * CACHE_STEP if hit else 0
+
+    def warm(self, body: Dict[str, Any]) -> None:
+        """Cache *body*'s prefix (once its request has been answered)."""
+        if prefix_tokens(body) >= CACHE_MIN_TOKENS:
+            with self.lock:
+                self.prefixes.add(self._prefix(body))
+
+    def record(self, key: str, seconds: float | None = None, **counts: int) -> None:
+        with self.lock:
+            self.payloads.add(key)
+            for k, n in counts.items():
+                self.stats[k] += n
+            if seconds is not None:
+                self.latencies.append(seconds)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self.lock:
+            lat = sorted(self.latencies)
+            pct = lambda q: lat[min(len(lat) - 1, int(q * len(lat)))] if lat else 0.0  # noqa: E731
+            return {**self.stats, "distinct_payloads": len(self.payloads),
+                    "latency_p50": pct(0.5), "latency_p99": pct(0.99)}
+
+    def add_file(self, data: bytes, filename: str, purpose: str) -> Dict[str, Any]:
+        meta = {
+            "id": f"file-{uuid.uuid4().hex[:12]}", "object": "file", "bytes": len(data),
+            "created_at": int(time.time()), "filename": filename, "purpose": purpose,
+            "status": "processed",
+        }
+        with self.lock:
+            self.files[meta["id"]] = {**meta, "data": data}
+        return meta
+
+    def run_batch(self, input_file_id: str) -> tuple[str, int, int]:
+        lines = self.files[input_file_id]["data"].decode("utf-8").splitlines()
+        out, ok, failed = [], 0, 0
+        for line in filter(None, lines):
+            req = json.loads(line)
+            try:
+                body = chat_completion(req["body"], replies=self.replies)
+                out.append({"id": f"batch_req_{uuid.uuid4().hex[:12]}", "custom_id": req["custom_id"],
+                            "response": {"status_code": 200, "request_id": uuid.uuid4().hex, "body": body},
+                            "error": None})
+                ok += 1
+            except (KeyError, ValueError) as exc:
+                out.append({"id": f"batch_req_{uuid.uuid4().hex[:12]}", "custom_id": req.get("custom_id"),
+                            "response": None, "error": {"code": "invalid_request", "message": str(exc)}})
+                failed += 1
+        data = "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in out).encode("utf-8")
+        return self.add_file(data, "batch_output.jsonl", "batch_output")["id"], ok, failed
+
+    def batch_view(self, batch_id: str) -> Dict[str, Any]:
+        with self.lock:
+            batch = self.batches[batch_id]
+            if batch["status"] == "in_progress" and time.time() - batch["created_at"] >= self.batch_delay:
+                out_id, ok, failed = self.run_batch(batch["input_file_id"])
+                batch.update(status="completed", output_file_id=out_id, completed_at=int(time.time()),
+                             request_counts={"total": ok + failed, "completed": ok, "failed": failed})
+            return dict(batch)
+
+
+class Handler(BaseHTTPRequestHandler):
+    state: MockState
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, fmt: str, *args: Any) -> None:  # keep benchmarks quiet
+        pass
+
+    def _send(self, status: int, body: Any, headers: Dict[str, str] | None = None, *, raw: bool = False) -> None:
+        data = body if raw else json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/octet-stream" if raw else "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _body(self) -> bytes:
+        return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+    def _chunk(self, data: bytes) -> None:
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        self.wfile.flush()
+
+    def _stream(self, completion: Dict[str, Any], headers: Dict[str, str]) -> None:
+        """Send *completion* as server‑sent ``chat.completion.chunk`` events."""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        for k, v in headers.items():
+            self.send_header(k, v)
+        self.end_headers()
+        content = completion["choices"][0]["message"]["content"]
+        base = {k: completion[k] for k in ("id", "created", "model")} | {"object": "chat.completion.chunk"}
+        for i in range(0, len(content), 8):  # ~ a couple of tokens per event
+            delta = {"index": 0, "delta": {"content": content[i:i + 8]}, "finish_reason": None}
+            self._chunk(f"data: {json.dumps({**base, 'choices': [delta]}, ensure_ascii=False)}\n\n".encode("utf-8"))
+        done = {"index": 0, "delta": {}, "finish_reason": "stop"}
+        self._chunk(f"data: {json.dumps({**base, 'choices': [done]})}\n\n".encode("utf-8"))
+        self._chunk(f"data: {json.dumps({**base, 'choices': [], 'usage': completion['usage']})}\n\n".encode("utf-8"))
+        self._chunk(b"data: [DONE]\n\n")
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _chat(self, body: bytes) -> None:
+        state = self.state
+        t0 = time.perf_counter()
+        req = json.loads(body)
+        key = hashlib.sha1(req["messages"][-1]["content"].encode("utf-8")).hexdigest()
+        tokens = sum(len(m["content"]) for m in req["messages"]) // 2
+        allowed, headers, delay = state.admit(tokens)
+        if not allowed:
+            state.record(key, requests=1, rate_limited=1)
+            self._send(429, {"error": {"message": "Rate limit reached (mock)", "type": "requests",
+                                       "code": "rate_limit_exceeded"}}, headers)
+            return
+        time.sleep(delay)
+        completion = chat_completion(req, state.cached(req), state.replies)
+        usage = completion["usage"]
+        bad = state.rng.random() < state.malformed
+        if bad:  # cut the JSON reply short
+            message = completion["choices"][0]["message"]
+            message["content"] = message["content"][: len(message["content"]) // 2]
+        stream = bool(req.get("stream"))
+        if stream:
+            self._stream(completion, headers)
+        else:
+            self._send(200, completion, headers)
+        state.warm(req)
+        cached = usage["prompt_tokens_details"]["cached_tokens"]
+        state.record(key, time.perf_counter() - t0, requests=1, ok=1, malformed=int(bad), streamed=int(stream),
+                     prompt_tokens=usage["prompt_tokens"], cached_tokens=cached, cache_hits=int(cached > 0))
+
+    def do_GET(self) -> None:
+        parts = self.path.split("?")[0].strip("/").split("/")
+        if parts == ["_stats"]:
+            self._send(200, self.state.snapshot())
+        elif parts[:2] == ["v1", "batches"] and len(parts) == 3 and parts[2] in self.state.batches:
+            self._send(200, self.state.batch_view(parts[2]))
+        elif parts[:2] == ["v1", "files"] and len(parts) == 4 and parts[3] == "content" and parts[2] in self.state.files:
+            self._send(200, self.state.files[parts[2]]["data"], raw=True)
+        elif parts[:2] == ["v1", "files"] and len(parts) == 3 and parts[2] in self.state.files:
+            self._send(200, {k: v for k, v in self.state.files[parts[2]].items() if k != "data"})
+        else:
+            self._send(404, {"error": {"message": f"unknown route {self.path}"}})
+
+    def do_POST(self) -> None:
+        path = self.path.split("?")[0].rstrip("/")
+        body = self._body()
+        if path == "/v1/chat/completions":
+            self._chat(body)
+        elif path == "/v1/files":
+            msg = BytesParser(policy=HTTP).parsebytes(
+                b"Content-Type: " + self.headers["Content-Type"].encode() + b"\r\n\r\n" + body
+            )
+            fields = {part.get_param("name", header="content-disposition"): part for part in msg.iter_parts()}
+            upload = fields["file"]
+            purpose = fields["purpose"].get_payload(decode=True).decode()
+            self._send(200, self.state.add_file(upload.get_payload(decode=True), upload.get_filename() or "upload", purpose))
+        elif path == "/v1/batches":
+            req = json.loads(body)
+            batch = {
+                "id": f"batch_{uuid.uuid4().hex[:12]}", "object": "batch", "endpoint": req["endpoint"],
+                "input_file_id": req["input_file_id"], "completion_window": req.get("completion_window", "24h"),
+                "status": "in_progress", "created_at": int(time.time()), "output_file_id": None,
+                "error_file_id": None, "request_counts": {"total": 0, "completed": 0, "failed": 0},
+            }
+            with self.state.lock:
+                self.state.batches[batch["id"]] = batch
+            self._send(200, batch)
+        else:
+            self._send(404, {"error": {"message": f"unknown route {self.path}"}})
+
+
+def serve(host: str = "127.0.0.1", port: int = 8787, *, state: MockState | None = None) -> ThreadingHTTPServer:
+    """Start the mock server in a background thread and return it."""
+    handler = type("BoundHandler", (Handler,), {"state": state or MockState()})
+    server = ThreadingHTTPServer((host, port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Offline stand-in for the OpenAI API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8787)
+    parser.add_argument("--batch-delay", type=float, default=1.0, help="Seconds before a batch completes")
+    parser.add_argument("--latency", default="fixed:0",
+                        help="Chat latency: fixed:S, uniform:LO,HI or lognormal:MEDIAN,SIGMA (seconds)")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="Share of chat requests answered with 429")
+    parser.add_argument("--malformed", type=float, default=0.0, help="Share of replies with truncated JSON")
+    parser.add_argument("--rpm", type=int, default=0, help="Requests per minute before 429s (0 = unlimited)")
+    parser.add_argument("--tpm", type=int, default=0, help="Tokens per minute before 429s (0 = unlimited)")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--fixtures", help="JSON-lines file of recorded {source, reply} pairs")
+    args = parser.parse_args()
+    state = MockState(
+        batch_delay=args.batch_delay, latency=args.latency, rate_429=args.rate_429,
+        malformed=args.malformed, rpm=args.rpm, tpm=args.tpm, seed=args.seed,
+        replies=load_fixtures(args.fixtures) if args.fixtures else None,
+    )
+    server = serve(args.host, args.port, state=state)
+    print(f"Mock OpenAI API on http://{args.host}:{server.server_port}/v1  (Ctrl-C to stop)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+from __future__ import annotations
+
+"""Per‑block post‑translation stages, fused into one in‑memory pass.
+
+Shipping a file used to mean writing ``Translated/``, re‑reading it to
+combine, and re‑reading that to strip speaker notes – a full JSON load,
+scan and ``indent=2`` dump per step.  A :class:`Pipeline` instead runs each
+block through the enabled stages once and hands back every requested
+output *variant* (a subset of the stages, applied in pipeline order)::
+
+    pipe = Pipeline([("cleanup", clean), ("combine", combine), ("notes", strip)])
+    out = pipe.run(blocks, {"translated": ["cleanup"],
+                            "combined": ["cleanup", "combine", "notes"]})
+
+Variants that share a prefix of stages share its result, so ``cleanup``
+above runs once per block.
+"""
+
+from typing import Callable, Dict, Iterable, List, Mapping, Sequence, Tuple
+import time
+
+# fn(block index, text) → text
+StageFn = Callable[[int, str], str]
+
+
+class Pipeline:
+    def __init__(self, stages: Sequence[Tuple[str, StageFn]]):
+        self.order = [name for name, _fn in stages]
+        self.stages = dict(stages)
+        self.seconds: Dict[str, float] = dict.fromkeys(self.order, 0.0)  # time spent per stage
+
+    def chain(self, names: Iterable[str]) -> Tuple[str, ...]:
+        """*names* as a tuple in pipeline order; unknown stage names raise ``ValueError``."""
+        wanted = set(names)
+        unknown = wanted - self.stages.keys()
+        if unknown:
+            raise ValueError(f"unknown stage(s) {sorted(unknown)}; have {self.order}")
+        return tuple(n for n in self.order if n in wanted)
+
+    def run(self, blocks: Sequence[str], variants: Mapping[str, Iterable[str]]) -> Dict[str, List[str]]:
+        """``variant → processed blocks`` for every variant, in one pass over *blocks*."""
+        chains = {v: self.chain(names) for v, names in variants.items()}
+        out: Dict[str, List[str]] = {v: [] for v in chains}
+        for i, text in enumerate(blocks):
+            done: Dict[Tuple[str, ...], str] = {(): text}
+            for v, chain in chains.items():
+                k = len(chain)
+                while chain[:k] not in done:  # longest prefix already computed
+                    k -= 1
+                cur = done[chain[:k]]
+                for n in range(k, len(chain)):
+                    t0 = time.perf_counter()
+                    cur = self.stages[chain[n]](i, cur)
+                    self.seconds[chain[n]] += time.perf_counter() - t0
+                    done[chain[:n + 1]] = cur
+                out[v].append(cur)
+        return out
@@ -0,0 +1,324 @@
+from __future__ import annotations
+
+"""Offline cost / wall‑clock planner for a translation run.
+
+:func:`plan` packs the pending (already protected) blocks of every file into
+requests exactly like :func:`common.gpt.translate_blocks_async` would –
+in‑file duplicates sent once, batches of ``batch_tokens`` estimated tokens –
+and counts each request's input (system prompt + JSON payload + chat
+framing) and expected output::
+
+    counter = token_counter(MODEL)                       # tiktoken if installed
+    p = plan(pending, system_prompt=SYSTEM_PROMPT, count=counter, batch_tokens=2000)
+    p.input_tokens, p.output_tokens, p.cost(MODEL)
+    project(p, rpm=500, tpm=200_000, concurrency=16)      # → seconds
+
+With a *context* function (the game's few‑shot / episode text) each
+request's prompt prefix grows by that text, and :meth:`Plan.cost` with
+``cached_system=True`` bills every repeat of a prefix of at least
+``CACHE_MIN_TOKENS`` at the cached‑input rate.
+
+Output size is the input payload times *output_ratio*, which
+:func:`output_ratio` measures on blocks that are already translated.
+Without ``tiktoken`` the offline estimator is used, scaled by the ratio of
+real to estimated prompt tokens seen in earlier runs (see
+:func:`estimator_scale`).
+
+:func:`project` is a simple throughput model: a run can't be faster than
+the RPM budget, the TPM budget, the total request latency spread over the
+requests in flight, or its slowest single request.
+"""
+
+from typing import Callable, Dict, Iterable, List, Mapping, NamedTuple, Sequence, Tuple
+import json, logging, os
+
+from common.ratelimit import estimate_tokens  # type: ignore
+
+# USD per 1M tokens (input, cached input, output); Batch API runs cost half.
+PRICES: Dict[str, Tuple[float, float, float]] = {
+    "gpt-4.1": (2.00, 0.50, 8.00),
+    "gpt-4.1-mini": (0.40, 0.10, 1.60),
+    "gpt-4.1-nano": (0.10, 0.025, 0.40),
+    "gpt-4o": (2.50, 1.25, 10.00),
+    "gpt-4o-mini": (0.15, 0.075, 0.60),
+}
+CHAT_OVERHEAD = 9         # tokens of chat framing per request (2 messages + reply priming)
+KEY_OVERHEAD = 4          # '"12":"…",' around each value of the JSON reply
+REQUEST_LATENCY = 0.8     # seconds before the first output token
+OUTPUT_TOKENS_PER_S = 60  # generation speed once the reply is streaming
+HEADROOM = 0.95           # share of RPM/TPM the governor actually uses
+CACHE_MIN_TOKENS = 1024   # shortest prompt prefix the provider caches
+CACHE_STEP = 128          # cached prefixes count in steps of this many tokens
+
+Counter = Callable[[str], int]
+
+
+def price_ratio(model: str, base: str) -> float | None:
+    """Input + output price of *model* relative to *base* (None if either is unknown)."""
+    if model not in PRICES or base not in PRICES:
+        return None
+    return (PRICES[model][0] + PRICES[model][2]) / (PRICES[base][0] + PRICES[base][2])
+
+
+def usage_cost(model: str, prompt: int, completion: int, cached: int = 0) -> float | None:
+    """USD of real token usage on *model* (None if its price is unknown)."""
+    price = PRICES.get(model)
+    if price is None:
+        return None
+    inp, cache, out = price
+    return ((prompt - cached) * inp + cached * cache + completion * out) / 1e6
+
+
+def token_counter(model: str) -> Tuple[Counter, str]:
+    """``(count(text) → tokens, name)`` – ``tiktoken`` when installed, else the estimator."""
+    try:
+        import tiktoken  # type: ignore
+    except ImportError:
+        return estimate_tokens, "estimate"
+    try:
+        enc = tiktoken.encoding_for_model(model)
+    except KeyError:
+        enc = tiktoken.get_encoding("o200k_base")
+    return (lambda text: len(enc.encode(text, disallowed_special=()))), f"tiktoken/{enc.name}"
+
+
+def _recent_runs(runs_path: str | None, last: int = 5) -> List[dict]:
+    if not runs_path or not os.path.isfile(runs_path):
+        return []
+    with open(runs_path, encoding="utf-8") as fh:
+        records = [json.loads(line) for line in fh if line.strip()]
+    return [r for r in records if r.get("counters", {}).get("requests")][-last:]
+
+
+def estimator_scale(runs_path: str | None) -> float:
+    """Real ÷ estimated prompt tokens over the last runs of ``runs.jsonl`` (1.0 if unknown)."""
+    real = est = 0
+    for r in _recent_runs(runs_path):
+        c = r["counters"]
+        if c.get("prompt_tokens") and c.get("estimated_prompt_tokens"):
+            real += c["prompt_tokens"]
+            est += c["estimated_prompt_tokens"]
+    return real / est if est else 1.0
+
+
+def output_ratio(pairs: Iterable[Tuple[str, str]], count: Counter, default: float = 1.0) -> float:
+    """Tokens of translation per token of source over ``(source, translation)`` pairs."""
+    src = out = 0
+    for s, t in pairs:
+        src += count(s)
+        out += count(t)
+    return out / src if src else default
+
+
+def latency_model(runs_path: str | None) -> Tuple[float, float]:
+    """``(seconds per request, output tokens per second)``, fitted to past runs when possible."""
+    seconds = requests = completion = 0.0
+    for r in _recent_runs(runs_path):
+        net = r.get("stages", {}).get("api_network")
+        if net and r["counters"].get("completion_tokens"):
+            seconds += net["seconds"]
+            requests += net["calls"]
+            completion += r["counters"]["completion_tokens"]
+    if not requests:
+        return REQUEST_LATENCY, OUTPUT_TOKENS_PER_S
+    generating = seconds / requests - REQUEST_LATENCY
+    speed = (completion / requests) / generating if generating > 0 else OUTPUT_TOKENS_PER_S
+    return REQUEST_LATENCY, speed
+
+
+class Request(NamedTuple):
+    rel: str
+    blocks: int
+    input_tokens: int
+    output_tokens: int
+    prefix: str = ""        # text sent before the payload beyond the system prompt
+    prefix_tokens: int = 0  # system prompt + that text
+
+
+class Plan(NamedTuple):
+    requests: List[Request]
+    batch_tokens: int
+    system_tokens: int
+
+    @property
+    def input_tokens(self) -> int:
+        return sum(r.input_tokens for r in self.requests)
+
+    @property
+    def output_tokens(self) -> int:
+        return sum(r.output_tokens for r in self.requests)
+
+    @property
+    def files(self) -> int:
+        return len({r.rel for r in self.requests})
+
+    @property
+    def cached_tokens(self) -> int:
+        """Input tokens served from the prompt cache if every prefix stays warm."""
+        seen = set()
+        total = 0
+        for r in self.requests:
+            if r.prefix in seen and r.prefix_tokens >= CACHE_MIN_TOKENS:
+                total += r.prefix_tokens // CACHE_STEP * CACHE_STEP
+            seen.add(r.prefix)
+        return total
+
+    def per_file(self) -> Dict[str, Tuple[int, int, int, int]]:
+        """``rel → (blocks, requests, input tokens, output tokens)``."""
+        out: Dict[str, Tuple[int, int, int, int]] = {}
+        for r in self.requests:
+            b, n, i, o = out.get(r.rel, (0, 0, 0, 0))
+            out[r.rel] = (b + r.blocks, n + 1, i + r.input_tokens, o + r.output_tokens)
+        return out
+
+    def cost(self, model: str, *, cached_system: bool = False, batch_api: bool = False) -> float | None:
+        """Estimated USD for *model* (None if its price is unknown).
+
+        With *cached_system* the prompt prefix of every request but the
+        first with that prefix is billed at the cached‑input rate (see
+        :attr:`cached_tokens`).
+        """
+        price = PRICES.get(model)
+        if price is None:
+            return None
+        inp, cached, out = price
+        cached_tokens = self.cached_tokens if cached_system else 0
+        usd = ((self.input_tokens - cached_tokens) * inp + cached_tokens * cached + self.output_tokens * out) / 1e6
+        return usd / 2 if batch_api else usd
+
+
+def plan(
+    pending: Mapping[str, Sequence[str]],
+    *,
+    system_prompt: str,
+    count: Counter = estimate_tokens,
+    batch_tokens: int = 2000,
+    ratio: float = 1.0,
+    scale: float = 1.0,
+    context: Callable[[str], str | None] | None = None,
+) -> Plan:
+    """Requests needed for *pending* (``rel → protected blocks``) at *batch_tokens* per batch.
+
+    *scale* multiplies every count (use :func:`estimator_scale` with the
+    offline estimator); *ratio* is the expected output ÷ input size;
+    ``context(rel)`` is the text sent after the system prompt for *rel*.
+    """
+    from common.gpt import pack_batches  # type: ignore  # same packing as a real run
+
+    system = round(count(system_prompt) * scale)
+    context_tokens: Dict[str, int] = {}
+    requests: List[Request] = []
+    for rel, blocks in pending.items():
+        prefix = (context(rel) if context else None) or ""
+        if prefix not in context_tokens:
+            context_tokens[prefix] = round(count(prefix) * scale) if prefix else 0
+        prefix_tokens = system + context_tokens[prefix]
+        payload: Dict[str, str] = {}
+        seen = set()
+        for j, text in enumerate(blocks):
+            if text not in seen:  # in‑file duplicates are sent once
+                seen.add(text)
+                payload[str(j)] = text
+        for batch in pack_batches(payload, batch_tokens):
+            body = json.dumps(batch, ensure_ascii=False, separators=(",", ":"))
+            values = sum(count(v) for v in batch.values())
+            requests.append(Request(
+                rel, len(batch),
+                prefix_tokens + round(count(body) * scale) + CHAT_OVERHEAD,
+                round((values * ratio + KEY_OVERHEAD * len(batch)) * scale) + 2,
+                prefix, prefix_tokens,
+            ))
+    return Plan(requests, batch_tokens, system)
+
+
+def project(
+    p: Plan,
+    *,
+    rpm: int,
+    tpm: int,
+    concurrency: int,
+    file_workers: int | None = None,
+    latency: Tuple[float, float] = (REQUEST_LATENCY, OUTPUT_TOKENS_PER_S),
+) -> Tuple[float, str]:
+    """``(seconds, limiting factor)`` for running *p* with *concurrency* requests in flight.
+
+    *file_workers* caps the files in flight, and with them the requests
+    (a file's batches run concurrently).
+    """
+    if not p.requests:
+        return 0.0, "-"
+    base, speed = latency
+    latencies = [base + r.output_tokens / speed for r in p.requests]
+    in_flight = concurrency
+    if file_workers:
+        per_file = len(p.requests) / p.files
+        in_flight = min(in_flight, max(1, round(file_workers * per_file)))
+    bounds = {
+        "RPM": len(p.requests) / (rpm * HEADROOM) * 60,
+        "TPM": (p.input_tokens + p.output_tokens) / (tpm * HEADROOM) * 60,
+        "latency": sum(latencies) / max(1, in_flight),
+        "slowest request": max(latencies),
+    }
+    limit = max(bounds, key=bounds.__getitem__)
+    return bounds[limit], limit
+
+
+def report(
+    plans: Sequence[Plan],
+    *,
+    model: str,
+    counter_name: str,
+    ratio: float,
+    rpm: int,
+    tpm: int,
+    concurrency: Sequence[int],
+    file_workers: int | None,
+    latency: Tuple[float, float],
+    top: int = 10,
+) -> str:
+    """Text report: largest files, totals and cost per batch size, and a time grid.
+
+    The "cached" column assumes every repeated prompt prefix hits the cache.
+    """
+    def fmt_time(s: float) -> str:
+        return f"{s / 60:.1f} min" if s >= 60 else f"{s:.0f} s"
+
+    lines: List[str] = []
+    first = plans[0]
+    files = sorted(first.per_file().items(), key=lambda kv: -kv[1][2])
+    if files:
+        lines.append(f"Largest files (batch size {first.batch_tokens}):")
+        lines.extend(f"  {rel:<60.60} {b:>5} blocks {n:>3} req {i:>8,} in {o:>8,} out" for rel, (b, n, i, o) in files[:top])
+        if len(files) > top:
+            lines.append(f"  … {len(files) - top} more file(s)")
+        lines.append("")
+    lines.append(f"Tokens counted with {counter_name}; output ≈ {ratio:.2f} × input payload; "
+                 f"latency ≈ {latency[0]:.1f} s + output / {latency[1]:.0f} tok/s")
+    prefixes = sorted({r.prefix_tokens for r in first.requests})
+    if prefixes:
+        size = f"{prefixes[0]:,}" if len(prefixes) == 1 else f"{prefixes[0]:,}–{prefixes[-1]:,}"
+        lines.append(f"Prompt prefix: {size} tokens in {len({r.prefix for r in first.requests})} variant(s)"
+                     + ("" if prefixes[0] >= CACHE_MIN_TOKENS else
+                        f" – below the {CACHE_MIN_TOKENS}-token caching minimum, so not (always) cacheable"))
+    lines.append(f"{'batch tokens':>12} {'requests':>9} {'input':>11} {'output':>11} {'prefix share':>12} "
+                 f"{'cost':>9} {'cached':>9} {'batch API':>9}")
+    for p in plans:
+        costs = [p.cost(model), p.cost(model, cached_system=True), p.cost(model, batch_api=True)]
+        share = sum(r.prefix_tokens for r in p.requests) / p.input_tokens if p.input_tokens else 0
+        lines.append(
+            f"{p.batch_tokens:>12} {len(p.requests):>9,} {p.input_tokens:>11,} {p.output_tokens:>11,} {share:>12.0%} "
+            + " ".join(f"{'$' + format(c, ',.2f') if c is not None else '?':>9}" for c in costs)
+        )
+    lines.append("")
+    lines.append(f"Projected wall clock at {rpm:,} RPM / {tpm:,} TPM"
+                 + (f", {file_workers} file workers" if file_workers else "") + " (limiting factor):")
+    lines.append(f"{'concurrency':>12} " + " ".join(f"{p.batch_tokens:>24}" for p in plans))
+    for c in concurrency:
+        cells = []
+        for p in plans:
+            secs, limit = project(p, rpm=rpm, tpm=tpm, concurrency=c, file_workers=file_workers, latency=latency)
+            cells.append(f"{fmt_time(secs) + ' (' + limit + ')':>24}")
+        lines.append(f"{c:>12} " + " ".join(cells))
+    if PRICES.get(model) is None:
+        logging.warning("No price known for %s; add it to common.planner.PRICES", model)
+    return "\n".join(lines)
@@ -0,0 +1,161 @@
+from __future__ import annotations
+
+"""Process‑wide request/token governor for the OpenAI rate limits.
+
+Every chat request in the process is admitted through one
+:class:`RateLimitGovernor` so concurrent files share a single view of the
+RPM / TPM budget:
+
+* two token buckets (requests, tokens) refill continuously at
+  ``limit × headroom`` per minute;
+* each request is charged an *estimated* token cost before it is sent and the
+  difference is settled against ``usage.total_tokens`` afterwards;
+* ``x-ratelimit-*`` response headers re‑sync the buckets with the server;
+* a 429 drains the affected bucket and blocks admission until the reset, and
+  every waiter adds its own jitter so retries don’t fire in lock‑step.
+"""
+
+from typing import Any, Mapping
+import json, math, random, time
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap offline token estimate: ~4 ASCII chars or ~1 CJK char per token."""
+    ascii_chars = sum(1 for ch in text if ch < "\x80")
+    return math.ceil(ascii_chars / 4 + (len(text) - ascii_chars))
+
+
+def estimate_prompt_tokens(system_prompt: str, payload: Mapping[str, str]) -> int:
+    """Estimated prompt tokens of one JSON translation request."""
+    body = json.dumps(payload, ensure_ascii=False, separators=(",", ":"))
+    return estimate_tokens(system_prompt) + estimate_tokens(body) + 9
+
+
+def estimate_request_tokens(system_prompt: str, payload: Mapping[str, str]) -> int:
+    """Estimated prompt + completion tokens for one JSON translation request."""
+    body = json.dumps(payload, ensure_ascii=False)
+    # the reply repeats the keys with English values of roughly the same size
+    return estimate_tokens(system_prompt) + 2 * estimate_tokens(body) + 16
+
+
+class _Bucket:
+    def __init__(self, limit: float, headroom: float):
+        self.headroom = headroom
+        self.capacity = self.rate = self.level = 0.0
+        self.set_limit(limit)
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def set_limit(self, limit: float) -> None:
+        self.capacity = max(1.0, limit * self.headroom)
+        self.rate = self.capacity / 60.0  # per second
+        self.level = min(self.level, self.capacity)
+
+    def refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait(self, cost: float, now: float) -> float:
+        self.refill(now)
+        return 0.0 if self.level >= cost else (cost - self.level) / self.rate
+
+
+class RateLimitGovernor:
+    """Shared token‑bucket admission control for RPM/TPM limits."""
+
+    def __init__(
+        self,
+        rpm: int = 500,
+        tpm: int = 200_000,
+        *,
+        headroom: float = 0.95,
+        min_remaining_requests: int = 5,
+        min_remaining_tokens: int = 5000,
+        base_backoff: float = 1.0,
+        max_backoff: float = 60.0,
+    ):
+        self.requests = _Bucket(rpm, headroom)
+        self.tokens = _Bucket(tpm, headroom)
+        self.min_remaining_requests = min_remaining_requests
+        self.min_remaining_tokens = min_remaining_tokens
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self._blocked_until = 0.0
+
+    # —— admission ——
+    async def acquire(self, tokens: int) -> float:
+        """Wait until one request costing *tokens* fits; returns seconds waited."""
+        import asyncio  # already loaded by the running loop; kept out of offline imports
+
+        tokens = min(tokens, self.tokens.capacity)
+        t0 = time.monotonic()
+        while True:
+            now = time.monotonic()
+            wait = max(
+                self._blocked_until - now,
+                self.requests.wait(1, now),
+                self.tokens.wait(tokens, now),
+            )
+            if wait <= 0:
+                self.requests.level -= 1
+                self.tokens.level -= tokens
+                return now - t0
+            # jitter so waiters released by the same refill don't stampede
+            await asyncio.sleep(wait + random.uniform(0, min(1.0, 0.25 * wait + 0.05)))
+
+    @property
+    def throttled(self) -> bool:
+        """True while a 429 backoff is running or the request / token budget is used up."""
+        now = time.monotonic()
+        return self._blocked_until > now or self.requests.wait(1, now) > 0 or self.tokens.wait(1, now) > 0
+
+    def settle(self, estimated: int, actual: int | None) -> None:
+        """Correct the token bucket once the real ``usage.total_tokens`` is known."""
+        if actual is None:
+            return
+        self.tokens.refill(time.monotonic())
+        self.tokens.level = min(self.tokens.capacity, self.tokens.level + estimated - actual)
+
+    # —— server feedback ——
+    def update(self, headers: Mapping[str, Any] | None) -> None:
+        """Re‑sync the buckets with ``x-ratelimit-*`` response headers."""
+        if not headers:
+            return
+        now = time.monotonic()
+        for bucket, kind, margin in (
+            (self.requests, "requests", self.min_remaining_requests),
+            (self.tokens, "tokens", self.min_remaining_tokens),
+        ):
+            try:
+                limit = headers.get(f"x-ratelimit-limit-{kind}")
+                if limit is not None and float(limit) * bucket.headroom != bucket.capacity:
+                    bucket.set_limit(float(limit))
+                remaining = headers.get(f"x-ratelimit-remaining-{kind}")
+                if remaining is not None:
+                    bucket.refill(now)
+                    bucket.level = min(bucket.level, float(remaining) - margin)
+            except (TypeError, ValueError):
+                continue
+
+    def backoff(self, attempt: int) -> float:
+        """Full‑jitter exponential backoff for *attempt* (1‑based)."""
+        return random.uniform(0, min(self.max_backoff, self.base_backoff * 2 ** attempt))
+
+    def penalize(self, headers: Mapping[str, Any] | None, attempt: int, reset: float = 0.0) -> float:
+        """Record a 429: drain the exhausted bucket and block admission until it resets.
+
+        *reset* is the server supplied wait in seconds (parsed from the headers
+        by the caller).  Returns the delay that was applied.
+        """
+        now = time.monotonic()
+        headers = headers or {}
+        for bucket, kind in ((self.requests, "requests"), (self.tokens, "tokens")):
+            try:
+                if float(headers.get(f"x-ratelimit-remaining-{kind}", 1)) <= 0:
+                    bucket.refill(now)
+                    bucket.level = 0.0
+            except (TypeError, ValueError):
+                pass
+        delay = max(reset, self.backoff(attempt))
+        self._blocked_until = max(self._blocked_until, now + delay)
+        return delay
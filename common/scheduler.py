@@ -0,0 +1,94 @@
+from __future__ import annotations
+
+"""Longest‑first file scheduler for the async ``all`` mode.
+
+Launching every file at once in directory order lets one huge scenario file
+start last and set the total runtime.  Instead, files are sorted by their
+estimated token cost and handed out largest‑first to a fixed number of
+workers (the classic LPT heuristic for minimising makespan); the small files
+then fill the gaps at the end.  Each worker's requests still go through the
+shared rate‑limit governor, so the worker count only has to be large enough
+to keep that budget busy.
+
+With a *group* function (e.g. the episode whose notes go into the prompt)
+the jobs of one group are handed out together, so requests sharing a
+prompt prefix run back to back while the provider still has it cached.
+Groups are ordered by their largest job and stay longest‑first inside.
+"""
+
+from typing import Awaitable, Callable, Dict, List, Tuple
+from collections import defaultdict
+import os, time, asyncio
+
+# Files translated at the same time in ``all`` mode.
+FILE_WORKERS = int(os.getenv("GPT_FILE_WORKERS", "8"))
+
+
+def longest_first(costs: Dict[str, int], group: Callable[[str], str] | None = None) -> List[Tuple[str, int]]:
+    """Jobs ordered by descending cost (ties by name for a stable order).
+
+    With *group*, jobs of the same group are kept together (see the module
+    docstring).
+    """
+    ordered = sorted(costs.items(), key=lambda kv: (-kv[1], kv[0]))
+    if group is None:
+        return ordered
+    groups: Dict[str, List[Tuple[str, int]]] = defaultdict(list)
+    for item in ordered:  # dicts keep insertion order: groups by their largest job
+        groups[group(item[0])].append(item)
+    return [item for items in groups.values() for item in items]
+
+
+class Throughput:
+    """Running ``cost units / second`` for the progress bar."""
+
+    def __init__(self) -> None:
+        self.t0 = time.perf_counter()
+        self.done = 0
+
+    def add(self, cost: int) -> None:
+        self.done += cost
+
+    @property
+    def rate(self) -> float:
+        elapsed = time.perf_counter() - self.t0
+        return self.done / elapsed if elapsed > 0 else 0.0
+
+
+async def run_longest_first(
+    costs: Dict[str, int],
+    worker: Callable[[str], Awaitable[None]],
+    *,
+    workers: int | None = None,
+    on_done: Callable[[str, int], None] | None = None,
+    group: Callable[[str], str] | None = None,
+) -> None:
+    """Run ``worker(job)`` for every job in *costs*, largest first, *workers* at a time.
+
+    ``on_done(job, cost)`` is called after each job (also when it raised; the
+    exception is re‑raised once every job has finished).  *group* keeps jobs
+    with the same prompt prefix together (see :func:`longest_first`).
+    """
+    queue: asyncio.Queue[Tuple[str, int]] = asyncio.Queue()
+    for item in longest_first(costs, group):
+        queue.put_nowait(item)
+    errors: List[BaseException] = []
+
+    async def loop() -> None:
+        while True:
+            try:
+                job, cost = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            try:
+                await worker(job)
+            except Exception as exc:
+                errors.append(exc)
+            finally:
+                if on_done is not None:
+                    on_done(job, cost)
+
+    n = max(1, min(workers or FILE_WORKERS, len(costs) or 1))
+    await asyncio.gather(*(loop() for _ in range(n)))
+    if errors:
+        raise errors[0]
@@ -0,0 +1,31 @@
+from __future__ import annotations
+
+"""Linear‑time span replacement for rewriting MSG bodies.
+
+Rebuilding a script with ``text[:start] + new + text[end:]`` once per block
+copies the whole script every time – quadratic in file size.  :func:`splice`
+takes all the edits at once and builds the result with a single ``join``.
+"""
+
+from typing import Iterable, List, Tuple
+
+Span = Tuple[int, int]
+Edit = Tuple[Span, str]  # ((start, end), replacement)
+
+
+def splice(text: str, edits: Iterable[Edit]) -> str:
+    """Return *text* with every ``(span, replacement)`` in *edits* applied.
+
+    Spans refer to the original *text*, must not overlap and may be given in
+    any order; untouched text between them is copied through unchanged.
+    """
+    buf: List[str] = []
+    last = 0
+    for (start, end), new in sorted(edits, key=lambda e: e[0]):
+        if start < last or end < start:
+            raise ValueError(f"overlapping or inverted span {(start, end)} (previous edit ended at {last})")
+        buf.append(text[last:start])
+        buf.append(new)
+        last = end
+    buf.append(text[last:])
+    return "".join(buf)
@@ -0,0 +1,299 @@
+from __future__ import annotations
+
+"""SQLite index of every MSG block of a game's export and its translations.
+
+``Export/``, ``Translated/`` and ``Combined/`` each hold hundreds of
+pretty‑printed JSON files; walking and re‑scanning them for every query is
+slow.  :class:`CorpusStore` ingests them once into one table with a row per
+``(file, block index)``::
+
+    store = CorpusStore("corpus.sqlite")
+    store.ingest(EXPORT_DIR, translated_dir=TRANSL_DIR, combined_dir=COMBINED_DIR)
+    store.untranslated()            # blocks still to do (or stale)
+    store.by_speaker("ミナト")
+    store.changed_since(run)        # blocks whose source changed after run N
+    store.export(out_dir)           # write the game JSON files back out
+
+Ingesting is incremental: a file is only re‑read when its size or mtime
+changed, so running it before every query costs a few ``stat`` calls.  Each
+ingest that finds a changed file is recorded as a numbered run, and every
+block remembers the run in which its source last changed.
+
+A block's ``status`` is ``"translated"`` when its translation was made from
+the current source, ``"stale"`` when the source changed since, and
+``"untranslated"`` otherwise.
+"""
+
+from typing import Callable, Dict, Iterable, List, NamedTuple, Sequence
+import json, logging, os, pathlib, sqlite3, time
+
+from common.io import read_file, write_file  # type: ignore
+from common.journal import source_hash  # type: ignore
+from common.luascan import scan  # type: ignore
+from common.splice import splice  # type: ignore
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT, started REAL NOT NULL, files INTEGER NOT NULL);
+CREATE TABLE IF NOT EXISTS files (
+    rel TEXT PRIMARY KEY, doc TEXT NOT NULL, stamps TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS blocks (
+    rel TEXT NOT NULL, idx INTEGER NOT NULL,
+    start INTEGER NOT NULL, end INTEGER NOT NULL,
+    speaker TEXT,
+    source TEXT NOT NULL, source_hash TEXT NOT NULL,
+    protected TEXT,
+    translation TEXT, translated_from TEXT,
+    combined TEXT,
+    status TEXT NOT NULL,
+    changed_run INTEGER NOT NULL,
+    PRIMARY KEY (rel, idx));
+CREATE INDEX IF NOT EXISTS blocks_status ON blocks(status);
+CREATE INDEX IF NOT EXISTS blocks_speaker ON blocks(speaker);
+CREATE INDEX IF NOT EXISTS blocks_changed ON blocks(changed_run);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+"""
+
+_COLUMNS = "rel, idx, speaker, source, protected, translation, combined, status, changed_run"
+
+
+class Block(NamedTuple):
+    rel: str
+    idx: int
+    speaker: str | None      # name inside the first 【…】 header
+    source: str
+    protected: str | None    # source as sent to the model (see ``protect``)
+    translation: str | None
+    combined: str | None
+    status: str              # "translated" | "stale" | "untranslated"
+    changed_run: int         # run in which the source last changed
+
+
+def _stamp(path: str) -> List[int] | None:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return [st.st_mtime_ns, st.st_size]
+
+
+def _bodies(path: str) -> List[str]:
+    return [m.body for m in scan(json.loads(read_file(path))["Text"])]
+
+
+def _status(source_hash: str, translation: str | None, translated_from: str | None) -> str:
+    if translation is None:
+        return "untranslated"
+    return "translated" if translated_from == source_hash else "stale"
+
+
+class CorpusStore:
+    """SQLite backed ``(file, block) → source / translation`` index."""
+
+    def __init__(self, path: str | os.PathLike, *, read_only: bool = False):
+        """With *read_only* the store works on an in-memory copy of *path*, so
+        ingesting refreshes the copy and the file is never created or written."""
+        self.path = os.fspath(path)
+        if read_only:
+            self._db = sqlite3.connect(":memory:")
+            if os.path.isfile(self.path):
+                src = sqlite3.connect(pathlib.Path(self.path).resolve().as_uri() + "?mode=ro", uri=True)
+                src.backup(self._db)
+                src.close()
+        else:
+            if os.path.dirname(self.path):
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._db = sqlite3.connect(self.path)
+        self._db.executescript(_SCHEMA)
+
+    # ── ingest ────────────────────────────────────────────────────
+    def ingest(
+        self,
+        export_dir: str,
+        *,
+        translated_dir: str | None = None,
+        combined_dir: str | None = None,
+        protect: Callable[[str], str] | None = None,
+        translated_from: Callable[[str], Sequence[str] | None] | None = None,
+        provenance: str = "",
+    ) -> int:
+        """Bring the store up to date with the files on disk; returns the latest run id.
+
+        *protect* maps a source block to the text actually sent to the model.
+        *translated_from* gives, per file, the source hash each translated
+        block was made from (e.g. from the manifest); ``None`` means the
+        translation is taken to match the current source.  When *provenance*
+        differs from the previous ingest, those hashes are re‑read for every
+        file.
+        """
+        known = {rel: json.loads(stamps) for rel, stamps in self._db.execute("SELECT rel, stamps FROM files")}
+        on_disk = sorted(
+            fn for fn in os.listdir(export_dir) if fn.lower().endswith(".json")
+        ) if os.path.isdir(export_dir) else []
+        refresh_all = provenance != self._meta("provenance")
+        run = 0
+        changed = 0
+        with self._db:
+            for rel in set(known) - set(on_disk):
+                self._db.execute("DELETE FROM files WHERE rel = ?", (rel,))
+                self._db.execute("DELETE FROM blocks WHERE rel = ?", (rel,))
+                changed += 1
+            for rel in on_disk:
+                stamps = {
+                    "source": _stamp(os.path.join(export_dir, rel)),
+                    "translated": translated_dir and _stamp(os.path.join(translated_dir, rel)),
+                    "combined": combined_dir and _stamp(os.path.join(combined_dir, rel)),
+                }
+                old = known.get(rel)
+                if old == stamps and not refresh_all:
+                    continue
+                if old is None or old.get("source") != stamps["source"]:
+                    run = run or self._new_run()
+                    self._ingest_source(rel, os.path.join(export_dir, rel), protect, run)
+                    changed += 1
+                    old = {}
+                if translated_dir and (old.get("translated") != stamps["translated"] or refresh_all):
+                    hashes = translated_from(rel) if translated_from else None
+                    self._ingest_output(rel, os.path.join(translated_dir, rel), "translation", hashes)
+                if combined_dir and old.get("combined") != stamps["combined"]:
+                    self._ingest_output(rel, os.path.join(combined_dir, rel), "combined")
+                self._db.execute("UPDATE files SET stamps = ? WHERE rel = ?", (json.dumps(stamps), rel))
+            self._set_meta("provenance", provenance)
+            if run:
+                self._db.execute("UPDATE runs SET files = ? WHERE id = ?", (changed, run))
+        return self.last_run
+
+    def _new_run(self) -> int:
+        return self._db.execute("INSERT INTO runs(started, files) VALUES (?, 0)", (time.time(),)).lastrowid
+
+    def _ingest_source(self, rel: str, path: str, protect: Callable[[str], str] | None, run: int) -> None:
+        doc = json.loads(read_file(path))
+        msgs = scan(doc["Text"])
+        old = {
+            idx: (h, translation, translated_from, run_)
+            for idx, h, translation, translated_from, run_ in self._db.execute(
+                "SELECT idx, source_hash, translation, translated_from, changed_run FROM blocks WHERE rel = ?", (rel,))
+        }
+        rows = []
+        for idx, msg in enumerate(msgs):
+            h = source_hash(msg.body)
+            prev_hash, translation, from_hash, prev_run = old.get(idx, (None, None, None, run))
+            speaker = msg.speaker
+            rows.append((
+                rel, idx, msg.start, msg.end,
+                speaker.text.strip().partition("】")[0].lstrip("【") if speaker else None,
+                msg.body, h, protect(msg.body) if protect else None,
+                translation, from_hash, None,
+                _status(h, translation, from_hash),
+                prev_run if prev_hash == h else run,
+            ))
+        self._db.execute("DELETE FROM blocks WHERE rel = ?", (rel,))
+        self._db.executemany(f"INSERT INTO blocks VALUES ({','.join('?' * 13)})", rows)
+        self._db.execute(
+            "INSERT OR REPLACE INTO files(rel, doc, stamps) VALUES (?, ?, '{}')",
+            (rel, json.dumps(doc, ensure_ascii=False)),
+        )
+
+    def _ingest_output(self, rel: str, path: str, column: str, hashes: Sequence[str] | None = None) -> None:
+        count, = self._db.execute("SELECT COUNT(*) FROM blocks WHERE rel = ?", (rel,)).fetchone()
+        bodies = _bodies(path) if os.path.isfile(path) else []
+        if bodies and len(bodies) != count:
+            logging.warning("Not indexing %s: %d blocks vs %d in its source", path, len(bodies), count)
+            bodies = []
+        if column == "combined":
+            self._db.execute("UPDATE blocks SET combined = NULL WHERE rel = ?", (rel,))
+            self._db.executemany("UPDATE blocks SET combined = ? WHERE rel = ? AND idx = ?",
+                                 ((b, rel, i) for i, b in enumerate(bodies)))
+            return
+        rows = []
+        for idx, h, prev, prev_from in self._db.execute(
+                "SELECT idx, source_hash, translation, translated_from FROM blocks WHERE rel = ?", (rel,)).fetchall():
+            translation = bodies[idx] if bodies else None
+            if translation is None:
+                from_hash = None
+            elif hashes is None:
+                # an unchanged translation still belongs to the source it was indexed with
+                from_hash = prev_from if translation == prev and prev_from is not None else h
+            else:
+                from_hash = hashes[idx] if idx < len(hashes) else ""
+            rows.append((translation, from_hash, _status(h, translation, from_hash), rel, idx))
+        self._db.executemany(
+            "UPDATE blocks SET translation = ?, translated_from = ?, status = ? WHERE rel = ? AND idx = ?", rows)
+
+    def _meta(self, key: str) -> str | None:
+        row = self._db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, key: str, value: str) -> None:
+        self._db.execute("INSERT OR REPLACE INTO meta(key, value) VALUES (?, ?)", (key, value))
+
+    # ── queries ───────────────────────────────────────────────────
+    @property
+    def last_run(self) -> int:
+        return self._db.execute("SELECT COALESCE(MAX(id), 0) FROM runs").fetchone()[0]
+
+    def files(self) -> List[str]:
+        return [rel for rel, in self._db.execute("SELECT rel FROM files ORDER BY rel")]
+
+    def _select(self, where: str = "1", params: Sequence = (), *, limit: int | None = None) -> List[Block]:
+        sql = f"SELECT {_COLUMNS} FROM blocks WHERE {where} ORDER BY rel, idx"
+        if limit is not None:
+            sql += f" LIMIT {int(limit)}"
+        return [Block(*row) for row in self._db.execute(sql, params)]
+
+    def blocks(self, rel: str) -> List[Block]:
+        return self._select("rel = ?", (rel,))
+
+    def untranslated(self, rel: str | None = None, *, include_stale: bool = True) -> List[Block]:
+        """Blocks without a current translation (optionally of one file only)."""
+        statuses = ("untranslated", "stale") if include_stale else ("untranslated",)
+        where = f"status IN ({','.join('?' * len(statuses))})"
+        params: List[str] = list(statuses)
+        if rel is not None:
+            where += " AND rel = ?"
+            params.append(rel)
+        return self._select(where, params)
+
+    def translated(self, limit: int | None = None) -> List[Block]:
+        """Blocks with a current translation (the first *limit* of them)."""
+        return self._select("status = 'translated'", limit=limit)
+
+    def by_speaker(self, name: str) -> List[Block]:
+        """Blocks whose speaker header names *name* (as in the source, e.g. ``ミナト``)."""
+        return self._select("speaker = ?", (name,))
+
+    def changed_since(self, run: int) -> List[Block]:
+        """Blocks whose source changed in a run after *run*."""
+        return self._select("changed_run > ?", (run,))
+
+    def stats(self) -> Dict[str, int]:
+        counts = dict(self._db.execute("SELECT status, COUNT(*) FROM blocks GROUP BY status"))
+        n_files, = self._db.execute("SELECT COUNT(*) FROM files").fetchone()
+        return {"files": n_files, "blocks": sum(counts.values()), "runs": self.last_run, **counts}
+
+    # ── export ────────────────────────────────────────────────────
+    def export(self, out_dir: str, *, column: str = "translation", rels: Iterable[str] | None = None) -> int:
+        """Write the game JSON files with *column* spliced in; returns the files written.
+
+        Blocks without a value in *column* keep their source text.
+        """
+        if column not in ("source", "protected", "translation", "combined"):
+            raise ValueError(f"unknown column {column!r}")
+        written = 0
+        for rel in (self.files() if rels is None else rels):
+            row = self._db.execute("SELECT doc FROM files WHERE rel = ?", (rel,)).fetchone()
+            if row is None:
+                continue
+            doc = json.loads(row[0])
+            edits = [
+                ((start, end), text)
+                for start, end, text in self._db.execute(
+                    f"SELECT start, end, {column} FROM blocks WHERE rel = ? AND {column} IS NOT NULL", (rel,))
+            ]
+            doc["Text"] = splice(doc["Text"], edits)
+            write_file(os.path.join(out_dir, rel), json.dumps(doc, ensure_ascii=False, indent=2))
+            written += 1
+        return written
+
+    def close(self) -> None:
+        self._db.close()
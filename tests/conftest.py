@@ -0,0 +1,7 @@
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))  # project root, for `common` and the game packages
+
+EXPORT_DIR = ROOT / "bokuhime" / "Export"
@@ -0,0 +1,45 @@
+import json
+
+import pytest
+
+from common.compact import check_markup, compact, expand
+from common.luascan import scan
+from conftest import EXPORT_DIR
+
+BLOCK = '\r\n【ミナト】笑顔\r\n　そうだね<sprite="a"><sprite="b">\r\n　行こう\r\n'
+
+
+def test_compact_shrinks_markup_and_headers():
+    safe, meta = compact(BLOCK)
+    assert safe == "【ミナト】そうだね<TAG0> 行こう"
+    assert meta.tags == ['<sprite="a"><sprite="b">']
+
+
+def test_expand_restores_a_translation():
+    safe, meta = compact(BLOCK)
+    assert expand("【Minato】Right<TAG0> let's go", meta) == (
+        '\r\n【Minato】笑顔\r\n　Right<sprite="a"><sprite="b"> let\'s go\r\n'
+    )
+
+
+def test_check_markup():
+    safe, _ = compact(BLOCK)
+    assert check_markup(safe, "【Minato】Right<TAG0> let's go") is None
+    assert "missing <TAG0>" in check_markup(safe, "【Minato】Right, let's go")
+    assert "speaker header" in check_markup(safe, "Right<TAG0> let's go")
+    assert "unexpected tag" in check_markup(safe, "【Minato】<b>Right</b><TAG0>")
+
+
+def test_placeholders_match_whole_numbers():
+    _, meta = compact("".join(f"a<t{i}>" for i in range(12)))
+    assert expand("<TAG1><TAG10>", meta) == "<t1><t10>"
+
+
+@pytest.mark.skipif(not EXPORT_DIR.is_dir(), reason="no Export/ corpus")
+def test_round_trip_over_the_corpus():
+    # inner line breaks come back as spaces, so compact(expand(...)) is the fixed point
+    for path in sorted(EXPORT_DIR.glob("*.json")):
+        for msg in scan(json.loads(path.read_text(encoding="utf-8"))["Text"]):
+            safe, meta = compact(msg.body)
+            assert compact(expand(safe, meta)) == (safe, meta), (path.name, msg.start)
+            assert check_markup(safe, safe) is None, (path.name, msg.start)
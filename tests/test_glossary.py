@@ -0,0 +1,48 @@
+from common.glossary import Glossary, name_aliases, parse_glossary, parse_people
+
+PROMPT = """
+     • 伊草ミナト   (♂ | 1st-year boys div.)     → Minato Ikusa
+     • 鬼灯リラ     (♀ | 2nd-year, Girls div.) → Lira Hoozuki
+     • ♂マスク先輩1/2/3 (♂ | upper-class)            → Mask Senpai #1 / #2 / #3
+     • 姫選挙                → Princess Election
+"""
+
+
+def glossary():
+    terms = parse_glossary(PROMPT)
+    terms.update(name_aliases(terms))
+    return Glossary(terms, parse_people(PROMPT))
+
+
+def test_parse_glossary():
+    assert parse_glossary(PROMPT) == {
+        "伊草ミナト": "Minato Ikusa",
+        "鬼灯リラ": "Lira Hoozuki",
+        "マスク先輩": "Mask Senpai",
+        "姫選挙": "Princess Election",
+    }
+
+
+def test_aliases_and_people():
+    terms = parse_glossary(PROMPT)
+    aliases = name_aliases(terms)
+    assert aliases["ミナト"] == "Minato" and aliases["伊草"] == "Ikusa"
+    assert parse_people(PROMPT)["ミナト"] == "♂"
+
+
+def test_find_is_leftmost_longest_and_respects_katakana_words():
+    g = glossary()
+    assert [h[2] for h in g.find("伊草ミナトとゴリラとリラ")] == ["伊草ミナト", "リラ"]
+
+
+def test_check_reports_missing_spellings():
+    g = glossary()
+    assert g.check("【ミナト】姫選挙だ", "【Minado】The Princess Election!") == [("ミナト", "Minato")]
+    assert g.check("姫選挙だ", "the princess election") == []
+
+
+def test_pronoun_stands_in_for_a_name_but_not_in_headers():
+    g = glossary()
+    assert g.check("リラが来た", "She came.") == []
+    assert g.check("リラが来た", "He came.") == [("リラ", "Lira")]
+    assert g.check("【リラ】来た", "【Erika】She came.") == [("リラ", "Lira")]
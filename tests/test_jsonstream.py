@@ -0,0 +1,25 @@
+import json
+
+from common.jsonstream import ObjectStream
+
+REPLY = json.dumps({"0": 'He said "hi"\\', "1": "【Erika】　ok", "2": ""}, ensure_ascii=False)
+
+
+def test_members_arrive_as_they_complete():
+    stream = ObjectStream()
+    got = []
+    for i in range(0, len(REPLY), 3):
+        got.extend(stream.feed(REPLY[i:i + 3]))
+    assert got == list(json.loads(REPLY).items())
+    assert not stream.broken
+
+
+def test_one_chunk_per_character():
+    stream = ObjectStream()
+    assert [m for c in REPLY for m in stream.feed(c)] == list(json.loads(REPLY).items())
+
+
+def test_non_string_value_breaks_the_stream():
+    stream = ObjectStream()
+    assert stream.feed('{"0": "a", "1": 2, "2": "b"}') == [("0", "a")]
+    assert stream.broken
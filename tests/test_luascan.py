@@ -0,0 +1,45 @@
+import time
+
+from common.luascan import scan, split_speaker_note, tokenize
+
+SCRIPT = (
+    'MSG([[\r\n【ミナト】笑顔\r\nこんにちは<sprite="Emoji" name="heart">]])\n'
+    "  --MSG([[<r=かんじ>漢字</r>の]])\n"
+    "MSG([[最後]])"
+)
+
+
+def test_finds_every_body_in_order():
+    blocks = scan(SCRIPT)
+    assert [b.body for b in blocks] == [
+        '\r\n【ミナト】笑顔\r\nこんにちは<sprite="Emoji" name="heart">',
+        "<r=かんじ>漢字</r>の",
+        "最後",
+    ]
+    assert all(SCRIPT[b.start:b.end] == b.body for b in blocks)
+    assert [b.commented for b in blocks] == [False, True, False]
+
+
+def test_unclosed_call_is_ignored():
+    assert [b.body for b in scan("MSG([[a]]) MSG([[b")] == ["a"]
+
+
+def test_tokens_cover_the_body():
+    body = scan(SCRIPT)[0].body
+    tokens = tokenize(body)
+    assert "".join(t.text for t in tokens) == body
+    assert [t.kind for t in tokens] == ["text", "speaker", "text", "tag"]
+
+
+def test_speaker_and_ruby():
+    first, second, _ = scan(SCRIPT)
+    assert split_speaker_note(first.speaker) == ("【ミナト】", "笑顔")
+    assert [t.text for t in second.ruby] == ["<r=かんじ>漢字</r>"]
+
+
+def test_unclosed_ruby_is_linear():
+    body = "<r=x>a" * 20000
+    t0 = time.perf_counter()
+    tokens = tokenize(body)
+    assert time.perf_counter() - t0 < 1.0
+    assert not any(t.kind == "ruby" for t in tokens)
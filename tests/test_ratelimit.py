@@ -0,0 +1,37 @@
+import asyncio
+
+from common.ratelimit import RateLimitGovernor, estimate_tokens
+
+
+def test_estimate_tokens():
+    assert estimate_tokens("abcd") == 1
+    assert estimate_tokens("漢字") == 2
+
+
+def test_acquire_is_immediate_within_budget():
+    gov = RateLimitGovernor(rpm=600, tpm=100_000)
+    assert asyncio.run(gov.acquire(100)) < 0.05
+    assert not gov.throttled
+
+
+def test_headers_resync_the_buckets():
+    gov = RateLimitGovernor(rpm=600, tpm=100_000, min_remaining_requests=0)
+    gov.update({"x-ratelimit-limit-requests": "1000", "x-ratelimit-remaining-requests": "0"})
+    assert gov.requests.capacity == 1000 * 0.95
+    assert gov.throttled
+
+
+def test_penalize_blocks_admission():
+    gov = RateLimitGovernor(base_backoff=0.0)
+    delay = gov.penalize({"x-ratelimit-remaining-tokens": "0"}, attempt=1, reset=5.0)
+    assert delay == 5.0
+    assert gov.tokens.level == 0.0
+    assert gov.throttled
+
+
+def test_settle_returns_overestimated_tokens():
+    gov = RateLimitGovernor(rpm=600, tpm=100_000)
+    before = gov.tokens.level
+    asyncio.run(gov.acquire(1000))
+    gov.settle(1000, 400)
+    assert abs(gov.tokens.level - (before - 400)) < 50
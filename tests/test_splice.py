@@ -0,0 +1,21 @@
+import pytest
+
+from common.splice import splice
+
+
+def test_applies_edits_in_any_order():
+    assert splice("abcdef", [((4, 5), "E"), ((0, 1), "A"), ((2, 2), "+")]) == "Ab+cdEf"
+
+
+def test_no_edits_returns_text():
+    assert splice("abc", []) == "abc"
+
+
+def test_rejects_overlapping_spans():
+    with pytest.raises(ValueError):
+        splice("abcdef", [((0, 3), "x"), ((2, 4), "y")])
+
+
+def test_rejects_inverted_span():
+    with pytest.raises(ValueError):
+        splice("abcdef", [((3, 1), "x")])
@@ -0,0 +1,34 @@
+from bokuhime.wordwrap import count_lines, game_text, word_wrap
+
+
+def test_short_text_is_one_line():
+    assert count_lines("") == 0
+    assert count_lines("Hello there.") == 1
+
+
+def test_ascii_words_are_not_split():
+    text = " ".join(["word"] * 30)
+    wrapped, _ = word_wrap(text, 20)
+    lines = wrapped.split("\n")
+    assert len(lines) > 1
+    assert all(part == "word" for line in lines for part in line.split())
+
+
+def test_kinsoku_keeps_closing_punctuation_on_the_line():
+    wrapped, _ = word_wrap("あ" * 10 + "。" + "い" * 5, 10)
+    assert not wrapped.split("\n")[1].startswith("。")
+
+
+def test_tags_take_no_width():
+    tag = '<sprite="Emoji" name="heart">'
+    assert count_lines("a " * 35) == count_lines("a " * 20 + tag + "a " * 15) == 1
+    assert count_lines("a " * 36) == count_lines("a " * 20 + tag + "a " * 16) == 2
+
+
+def test_overlong_ascii_word_is_split():
+    wrapped, _ = word_wrap("a" * 150, 70)
+    assert [len(line) for line in wrapped.split("\n")] == [71, 71, 8]
+
+
+def test_game_text_moves_the_speaker_to_the_name_plate():
+    assert game_text("\r\n【ミナト】笑顔\r\nこんにちは\r\nまたね") == "こんにちは\nまたね"
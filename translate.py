@@ -4,18 +4,18 @@ from __future__ import annotations
 
 Searches for game modules under the project root and hooks them up with the
 common helper library in ``/Translations/common``.
+
+Only the modes that talk to the API import ``openai``; the progress bar and
+prompt libraries are imported where they are used, so offline modes
+(``combine``, ``check``) start in tens of milliseconds.
 """
 
-import os, sys, importlib, asyncio, logging, time
+import os, sys, contextlib, importlib, logging, time
 from pathlib import Path
 
-from prompt_toolkit import prompt
-from prompt_toolkit.completion import WordCompleter
-from prompt_toolkit.shortcuts import CompleteStyle
-from alive_progress import alive_bar
-
 # ─────────────────────────  GAME REGISTRY  ─────────────────────────
-# Each key is the CLI name; value is the fully‑qualified module path
+# Each key is the CLI name; value is the fully‑qualified module path,
+# imported by ``load_game`` once a game has been chosen
 GAMES = {
     "bokuhime": "bokuhime.game",
 }
@@ -23,6 +23,11 @@ GAMES = {
 PROJECT_ROOT = Path(__file__).parent  # /Translations
 sys.path.insert(0, str(PROJECT_ROOT))  # ensure project root is importable
 
+
+def load_game(key: str):
+    """Import and return the game module registered as *key*."""
+    return importlib.import_module(GAMES[key])
+
 # ─────────────────────────  CLI HELPERS  ──────────────────────────
 
 def choose_game() -> tuple[str, str]:
@@ -37,7 +42,11 @@ def choose_game() -> tuple[str, str]:
     return key, GAMES[key]
 
 
-def complete_json_files(export_dir: os.PathLike):
+def complete_json_files(game_mod) -> list[str]:
+    """Export files offered by the filename prompt (from the corpus store when the game has one)."""
+    if hasattr(game_mod, "index_corpus"):
+        return game_mod.index_corpus().files()
+    export_dir = game_mod.EXPORT_DIR
     files: list[str] = []
     for root, _dirs, fnames in os.walk(export_dir):
         for fn in fnames:
@@ -47,21 +56,31 @@ def complete_json_files(export_dir: os.PathLike):
 
 
 def input_with_completion(text: str, choices: list[str]):
+    from prompt_toolkit import prompt
+    from prompt_toolkit.completion import WordCompleter
+    from prompt_toolkit.shortcuts import CompleteStyle
+
     return prompt(text, completer=WordCompleter(choices, ignore_case=True, match_middle=True), complete_style=CompleteStyle.READLINE_LIKE)
 
 # ─────────────────────────  COMBINE (orig+trans)  ──────────────────
 
-def combine_files(game_mod, fn: str | None = None):
-    import subprocess
+def combine_files(game_mod, fn: str | None = None, *, force: bool = False):
+    """Run the game's ``combine_json`` in‑process (a process pool for ``all``).
+
+    *force* recombines pairs that ``all`` would skip as unchanged.
+    """
     orig_dir, trans_dir = game_mod.EXPORT_DIR, game_mod.TRANSL_DIR
     out_dir = getattr(game_mod, "COMBINED_DIR", Path(game_mod.__file__).parent / "Combined")
     os.makedirs(out_dir, exist_ok=True)
-    combine_script = Path(game_mod.EXPORT_DIR).parent / "combine_json.py"
+    combiner = importlib.import_module(game_mod.__name__.rpartition(".")[0] + ".combine_json")
 
     if fn:
-        subprocess.run([sys.executable, combine_script, "--orig", f"{orig_dir}/{fn}", "--trans", f"{trans_dir}/{fn}", "--out", f"{out_dir}/{fn}"])
+        n = combiner.combine_json(os.path.join(orig_dir, fn), os.path.join(trans_dir, fn), os.path.join(out_dir, fn))
+        print(f"Combined: {fn} ({n} blocks)")
     else:
-        subprocess.run([sys.executable, combine_script, "--orig", orig_dir, "--trans", trans_dir, "--out", out_dir, "--all"])
+        t0 = time.perf_counter()
+        combiner.print_reports(combiner.combine_all(orig_dir, trans_dir, out_dir, force=force))
+        logging.info("🧩  Combined in %.2f s", time.perf_counter() - t0)
 
 # ────────────────────────────  MAIN  ──────────────────────────────
 
@@ -69,21 +88,33 @@ def main() -> None:
     args = sys.argv[1:]
 
     game_key: str | None = None
-    game_mod_path: str | None = None
     file_arg: str | None = None
     mode: str | None = None
     combine_mode = False
+    force = False
 
     # —— parse CLI —— 
     if args:
         if args[0] in GAMES:
-            game_key, game_mod_path = args[0], GAMES[args[0]]
+            game_key = args[0]
             if len(args) > 1:
                 if args[1] == "all":
                     mode = "all"
+                elif args[1] == "resume":
+                    mode = "resume"
+                elif args[1] == "batch":
+                    mode = "batch"
+                elif args[1] == "check":
+                    mode = "check-dry" if "--dry-run" in args[2:] else "check"
+                elif args[1] == "index":
+                    mode = "index"
+                elif args[1] == "plan":
+                    mode = "plan"
                 elif args[1] == "combine":
                     combine_mode = True
-                    file_arg = None if len(args) < 3 or args[2] == "all" else args[2]
+                    force = "--force" in args[2:]
+                    rest = [a for a in args[2:] if a != "--force"]
+                    file_arg = None if not rest or rest[0] == "all" else rest[0]
                 else:
                     file_arg, mode = args[1], "single"
         else:
@@ -91,39 +122,238 @@ def main() -> None:
 
     # —— interactive selection —— 
     if game_key is None:
-        game_key, game_mod_path = choose_game()
+        game_key, _ = choose_game()
+
+    # —— settings ——
+    # GPT_* settings are read when their modules are imported, so ``.env`` has
+    # to be loaded before the game is (offline modes skip it to start fast)
+    if not (combine_mode or mode in ("check", "check-dry", "index")):
+        from dotenv import load_dotenv
+        load_dotenv()
 
-    game_mod = importlib.import_module(game_mod_path)
+    game_mod = load_game(game_key)
 
     logging.basicConfig(level=logging.WARNING, format="%(asctime)s | %(levelname)-7s | %(message)s", datefmt="%H:%M:%S")
 
     # —— combine only —— 
     if combine_mode:
-        combine_files(game_mod, file_arg)
+        combine_files(game_mod, file_arg, force=force)
         return
 
-    # Helper for async‑all mode
-    async def process_all():
-        t0 = time.perf_counter()
-        files_to_process = []
-        for root, _dirs, files in os.walk(game_mod.EXPORT_DIR):
-            for fn in files:
+    def pending_files() -> list[str]:
+        """Export files without a translation, or whose translation is stale."""
+        files: list[str] = []
+        for root, _dirs, fnames in os.walk(game_mod.EXPORT_DIR):
+            for fn in fnames:
                 if not fn.lower().endswith(".json"):
                     continue
-                rel = os.path.relpath(os.path.join(root, fn), game_mod.EXPORT_DIR)
+                src = os.path.join(root, fn)
+                rel = os.path.relpath(src, game_mod.EXPORT_DIR)
                 dest = os.path.join(game_mod.TRANSL_DIR, rel)
-                if os.path.isfile(dest):
+                # existing output is only redone when its source / prompt changed
+                if os.path.isfile(dest) and not (hasattr(game_mod, "is_stale") and game_mod.is_stale(src)):
                     continue
-                files_to_process.append(rel)
+                files.append(rel)
+        return files
+
+    # Helper for async‑all mode (``only`` restricts it to the given files)
+    async def process_all(only: list[str] | None = None):
+        from alive_progress import alive_bar
+        from common.metrics import metrics
+        from common.scheduler import Throughput, run_longest_first
+
+        metrics.reset()
+        t0 = time.perf_counter()
+        if only is not None:
+            files_to_process = [rel for rel in only if os.path.isfile(os.path.join(game_mod.EXPORT_DIR, rel))]
+        else:
+            files_to_process = pending_files()
+
+        # —— longest‑first under a bounded worker pool ——
+        estimate = getattr(game_mod, "estimate_cost", None)
+        costs = {
+            rel: max(1, estimate(os.path.join(game_mod.EXPORT_DIR, rel))) if estimate else 1
+            for rel in files_to_process
+        }
+        rate = Throughput()
+        n_done = 0
+        progressed: dict[str, int] = {}  # cost already shown per file
+
+        try:
+            # the bar counts estimated tokens so its ETA is weighted by file size;
+            # it moves per block as blocks arrive and settles when a file is done
+            with alive_bar(sum(costs.values()), title="Translating", force_tty=True) as bar:
+                def advance(rel, cost):
+                    cost = min(cost, costs[rel] - progressed.get(rel, 0))
+                    if cost > 0:
+                        progressed[rel] = progressed.get(rel, 0) + cost
+                        rate.add(cost)
+                        bar(cost)
+
+                def on_done(rel, cost):
+                    nonlocal n_done
+                    n_done += 1
+                    advance(rel, cost)
+                    bar.text(f"{n_done}/{len(costs)} files · ≈{rate.rate:,.0f} tok/s")
 
-        async def process_with_bar(rel, bar):
-            await game_mod.process_file_async(os.path.join(game_mod.EXPORT_DIR, rel))
-            bar()
+                async def translate_one(rel):
+                    await game_mod.process_file_async(
+                        os.path.join(game_mod.EXPORT_DIR, rel), on_progress=lambda c: advance(rel, c),
+                    )
 
-        with alive_bar(len(files_to_process), title="Translating", force_tty=True) as bar:
-            await asyncio.gather(*(process_with_bar(rel, bar) for rel in files_to_process))
+                await run_longest_first(costs, translate_one, on_done=on_done,
+                                        group=getattr(game_mod, "prefix_group", None))
+        finally:
+            if hasattr(game_mod, "translation_manifest"):
+                game_mod.translation_manifest().save()
 
         logging.info("📦  Finished all files in %.2f s", time.perf_counter() - t0)
+        if hasattr(game_mod, "translation_memory"):
+            logging.info("🧠  Translation memory: %s", game_mod.translation_memory().stats())
+        if hasattr(game_mod, "compaction_savings"):
+            before, after = game_mod.compaction_savings()
+            logging.info("🗜  Prompt compaction: %d → %d est. tokens", before, after)
+        if hasattr(game_mod, "block_journal"):
+            game_mod.block_journal().compact()
+        report_run(metrics, files=len(costs), done=n_done)
+
+    def report_run(metrics, **extra):
+        """Print the stage summary and persist it (``RUNS_PATH``, ``METRICS_PROMETHEUS``)."""
+        if hasattr(game_mod, "translation_memory"):
+            extra["memory"] = game_mod.translation_memory().stats()
+        if hasattr(game_mod, "compaction_savings"):
+            extra["compaction"] = dict(zip(("before", "after"), game_mod.compaction_savings()))
+        print(metrics.table())
+        if len(metrics.models) > 1 or (metrics.models and getattr(game_mod, "MODEL", None) not in metrics.models):
+            from common.planner import usage_cost
+            print("Tokens and cost per model (fallbacks were used):")
+            for model, c in sorted(metrics.models.items()):
+                usd = usage_cost(model, c["prompt_tokens"], c["completion_tokens"], c["cached_tokens"])
+                print(f"  {model:<16} {c['requests']:>6} req {c['prompt_tokens']:>10,} in "
+                      f"{c['completion_tokens']:>10,} out  " + (f"${usd:,.4f}" if usd is not None else "price unknown"))
+        runs_path = getattr(game_mod, "RUNS_PATH", None)
+        if runs_path:
+            metrics.write_jsonl(runs_path, game=game_key, mode=mode or "menu", **extra)
+        prom_path = os.getenv("METRICS_PROMETHEUS")
+        if prom_path:
+            metrics.write_prometheus(prom_path, game=game_key)
+
+    def translate_all(only: list[str] | None = None):
+        import asyncio
+
+        asyncio.run(process_all(only))
+
+    def batch():
+        if not hasattr(game_mod, "process_batch"):
+            logging.error("%s does not support batch mode", game_key); return
+        files = pending_files()
+        if not files:
+            print("Nothing to translate."); return
+        print(f"Submitting {len(files)} file(s) as one batch – this can take up to 24 h")
+        game_mod.process_batch([os.path.join(game_mod.EXPORT_DIR, rel) for rel in files])
+
+    def resume():
+        if not hasattr(game_mod, "block_journal"):
+            logging.error("%s has no checkpoint journal", game_key); return
+        pending = game_mod.block_journal().pending_files()
+        if not pending:
+            print("Nothing to resume."); return
+        print(f"Resuming {len(pending)} interrupted file(s)")
+        translate_all(pending)
+
+    def check(queue: bool = True):
+        if not hasattr(game_mod, "check_glossary"):
+            logging.error("%s has no glossary", game_key); return
+        t0 = time.perf_counter()
+        flagged = game_mod.check_glossary(queue=queue)
+        for rel, hits in flagged.items():
+            for idx, missing in sorted(hits.items())[:3]:
+                print(f"{rel} #{idx}: " + ", ".join(f"{jp} → {en}" for jp, en in missing))
+            if len(hits) > 3:
+                print(f"{rel}: … {len(hits) - 3} more")
+        n = sum(len(h) for h in flagged.values())
+        print(f"{n} block(s) in {len(flagged)} file(s) miss a glossary term ({time.perf_counter() - t0:.2f} s)")
+        if queue and n:
+            print("Queued for re-translation – run `all` to redo them.")
+
+    def index(argv: list[str]):
+        if not hasattr(game_mod, "index_corpus"):
+            logging.error("%s has no corpus store", game_key); return
+        import argparse
+        parser = argparse.ArgumentParser(prog=f"translate.py {game_key} index",
+                                         description="Update the block index and query it.")
+        parser.add_argument("--untranslated", action="store_true", help="List blocks without a current translation")
+        parser.add_argument("--speaker", help="List blocks spoken by SPEAKER (source name, e.g. ミナト)")
+        parser.add_argument("--since", type=int, metavar="RUN", help="List blocks whose source changed after RUN")
+        parser.add_argument("--export", metavar="DIR", help="Write the indexed translations to DIR")
+        opts = parser.parse_args(argv)
+
+        t0 = time.perf_counter()
+        store = game_mod.index_corpus()
+        print(", ".join(f"{k}: {v}" for k, v in store.stats().items()) + f" ({time.perf_counter() - t0:.2f} s)")
+        if opts.untranslated:
+            rows = store.untranslated()
+        elif opts.speaker:
+            rows = store.by_speaker(opts.speaker)
+        elif opts.since is not None:
+            rows = store.changed_since(opts.since)
+        else:
+            rows = []
+        for b in rows:
+            print(f"{b.rel} #{b.idx} [{b.status}, run {b.changed_run}]: {b.source.strip()[:60]!r}")
+        if opts.export:
+            print(f"Wrote {store.export(opts.export)} file(s) to {opts.export}")
+
+    def plan(argv: list[str]):
+        if not hasattr(game_mod, "pending_blocks"):
+            logging.error("%s cannot plan runs", game_key); return
+        import argparse
+        from common import gpt, planner
+        from common.scheduler import FILE_WORKERS
+
+        def ints(s: str) -> list[int]:
+            return [int(x) for x in s.split(",") if x]
+
+        parser = argparse.ArgumentParser(prog=f"translate.py {game_key} plan",
+                                         description="Estimate tokens, cost and time of the next `all` run.")
+        parser.add_argument("--all", action="store_true", help="Plan every block, as for a fresh dump")
+        parser.add_argument("--rpm", type=int, default=int(os.getenv("OPENAI_RPM", "500")))
+        parser.add_argument("--tpm", type=int, default=int(os.getenv("OPENAI_TPM", "200000")))
+        parser.add_argument("--concurrency", type=ints, default=[4, 8, 16, 32, 64])
+        parser.add_argument("--batch-tokens", type=ints,
+                            default=sorted({1000, gpt.MAX_BATCH_TOKENS, 4000, 8000}))
+        parser.add_argument("--file-workers", type=int, default=FILE_WORKERS)
+        opts = parser.parse_args(argv)
+
+        # a dry run: nothing on disk (memory, journal, manifest, index) may change
+        with getattr(game_mod, "read_only", contextlib.nullcontext)():
+            t0 = time.perf_counter()
+            rels = sorted(complete_json_files(game_mod)) if opts.all else pending_files()
+            pending = game_mod.pending_blocks(rels, everything=opts.all)
+            n = sum(len(b) for b in pending.values())
+            print(f"{n} block(s) to translate in {len(pending)} file(s)")
+            if not n:
+                return
+            count, counter_name = planner.token_counter(game_mod.MODEL)
+            runs_path = getattr(game_mod, "RUNS_PATH", None)
+            scale = planner.estimator_scale(runs_path) if counter_name == "estimate" else 1.0
+            if scale != 1.0:
+                counter_name += f" × {scale:.2f} (calibrated on past runs)"
+            pairs = game_mod.translated_pairs() if hasattr(game_mod, "translated_pairs") else []
+            ratio = planner.output_ratio(pairs, count)
+            plans = [
+                planner.plan(pending, system_prompt=game_mod.SYSTEM_PROMPT, count=count,
+                             batch_tokens=b, ratio=ratio, scale=scale,
+                             context=getattr(game_mod, "prompt_context", None))
+                for b in opts.batch_tokens
+            ]
+            print(planner.report(
+                plans, model=game_mod.MODEL, counter_name=counter_name, ratio=ratio,
+                rpm=opts.rpm, tpm=opts.tpm, concurrency=opts.concurrency, file_workers=opts.file_workers,
+                latency=planner.latency_model(runs_path),
+            ))
+            print(f"(planned in {time.perf_counter() - t0:.1f} s; current settings: GPT_BATCH_TOKENS={gpt.MAX_BATCH_TOKENS}, "
+                  f"GPT_MAX_CONCURRENCY={gpt.MAX_CONCURRENCY}, GPT_FILE_WORKERS={opts.file_workers})")
 
     # —— execute chosen mode —— 
     if mode == "single":
@@ -132,28 +362,50 @@ def main() -> None:
             logging.error("File not found: %s", src); return
         game_mod.process_file(src, debug=True)
     elif mode == "all":
-        asyncio.run(process_all())
+        translate_all()
+    elif mode == "resume":
+        resume()
+    elif mode == "batch":
+        batch()
+    elif mode in ("check", "check-dry"):
+        check(queue=mode == "check")
+    elif mode == "index":
+        index(args[2:])
+    elif mode == "plan":
+        plan(args[2:])
     else:
         # —— interactive menu —— 
         print("1. Process a single file")
         print("2. Process all files (async)")
         print("3. Combine original+translated (single file)")
         print("4. Combine all original+translated")
-        choice = input("Choose (1 / 2 / 3 / 4): ").strip()
+        print("5. Resume interrupted files")
+        print("6. Translate all files via the Batch API")
+        print("7. Check translations against the glossary")
+        choice = input("Choose (1 / 2 / 3 / 4 / 5 / 6 / 7): ").strip()
         if choice == "1":
             logging.info("Processing a single file")
-            fn = input_with_completion("JSON filename: ", complete_json_files(game_mod.EXPORT_DIR)).strip()
+            fn = input_with_completion("JSON filename: ", complete_json_files(game_mod)).strip()
             game_mod.process_file(os.path.join(game_mod.EXPORT_DIR, fn), debug=True)
         elif choice == "2":
             logging.info("Processing all files asynchronously")
-            asyncio.run(process_all())
+            translate_all()
         elif choice == "3":
             logging.info("Combining original+translated (single file)")
-            fn = input_with_completion("JSON filename: ", complete_json_files(game_mod.EXPORT_DIR)).strip()
+            fn = input_with_completion("JSON filename: ", complete_json_files(game_mod)).strip()
             combine_files(game_mod, fn)
         elif choice == "4":
             logging.info("Combining all original+translated")
             combine_files(game_mod)
+        elif choice == "5":
+            logging.info("Resuming interrupted files")
+            resume()
+        elif choice == "6":
+            logging.info("Translating all files via the Batch API")
+            batch()
+        elif choice == "7":
+            logging.info("Checking translations against the glossary")
+            check()
         else:
             logging.error("Invalid choice: %s", choice)
             sys.exit(1)